@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+'''
+This module generates augmented training samples on the fly and condenses them into a compact prototype dataset.
+Augmented samples are small random rotations, scalings, shifts, stroke thickness changes and blurs of the dataset samples.
+They are produced lazily by generators, in batches, and are never stored all at once.
+The builder keeps only the samples which the prototypes collected so far misclassify (condensed nearest neighbour),
+so the resulting dataset stays small and does not increase the KNN classification cost per scan.
+The prototype dataset is saved as data/[DATASET_NAME]_augmented/.
+'''
+
+import numpy as np
+import cv2, os, sys, argparse
+from opencv_functions import prepKNN
+import trainingdata
+
+CELL_SIZE = 20
+KNN_K = 6 # should match sudokucapture.KNN_K, the condensed set is built for this k
+
+MAX_ROTATION = 8.0 # degrees
+MAX_SCALE = 0.1 # relative to sample size
+MAX_SHIFT = 2.0 # pixels
+MAX_THICKNESS_CHANGE = 1 # erode/dilate iterations
+BLUR_PROBABILITY = 0.3
+BATCH_SIZE = 64
+DEFAULT_PASSES = 5
+
+def augmentSample(sample, rng, cellSize=CELL_SIZE):
+	'''Returns a randomly rotated, scaled, shifted, thickened/thinned and possibly blurred copy of a sample image.'''
+	sample = np.float32(sample).reshape(cellSize, cellSize)
+	angle = rng.uniform(-MAX_ROTATION, MAX_ROTATION)
+	scale = 1.0 + rng.uniform(-MAX_SCALE, MAX_SCALE)
+	M = cv2.getRotationMatrix2D((cellSize/2.0, cellSize/2.0), angle, scale)
+	M[:,2] += rng.uniform(-MAX_SHIFT, MAX_SHIFT, 2)
+	sample = cv2.warpAffine(sample, M, (cellSize, cellSize), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_CONSTANT, borderValue=0)
+
+	thickness = rng.randint(-MAX_THICKNESS_CHANGE, MAX_THICKNESS_CHANGE + 1)
+	kernel = np.ones((2,2), np.uint8)
+	if thickness > 0:
+		sample = cv2.dilate(sample, kernel, iterations=thickness)
+	elif thickness < 0:
+		sample = cv2.erode(sample, kernel, iterations=-thickness)
+
+	if rng.uniform() < BLUR_PROBABILITY:
+		sample = cv2.GaussianBlur(sample, (3,3), 0)
+	return sample
+
+def augmentedSamples(samples, labels, rng, passes=DEFAULT_PASSES, includeOriginals=True):
+	'''
+	Generator which yields (sample, label) tuples.
+	Each pass goes through all samples in a random order and yields an augmented copy of each of them.
+	If includeOriginals is True, the original samples are yielded first, without augmentation.
+	If passes is None, the generator never ends.
+	'''
+	if includeOriginals:
+		for i in rng.permutation(len(samples)):
+			yield (np.float32(samples[i]), labels[i])
+	currentPass = 0
+	while (passes is None) or (currentPass < passes):
+		for i in rng.permutation(len(samples)):
+			yield (augmentSample(samples[i], rng), labels[i])
+		currentPass += 1
+
+def batches(iterable, batchSize=BATCH_SIZE):
+	'''Generator which groups (sample, label) tuples into (samples, labels) numpy arrays of up to batchSize items.'''
+	batchSamples = []
+	batchLabels = []
+	for sample, label in iterable:
+		batchSamples.append(sample)
+		batchLabels.append(label)
+		if len(batchSamples) == batchSize:
+			yield (np.float32(batchSamples), np.array(batchLabels, dtype=int))
+			batchSamples = []
+			batchLabels = []
+	if len(batchSamples) > 0:
+		yield (np.float32(batchSamples), np.array(batchLabels, dtype=int))
+
+def condense(batchIterator, limit, k=KNN_K, cellSize=CELL_SIZE):
+	'''
+	Condenses batches of samples into a prototype set: a sample is added to the prototypes only if the prototypes
+	collected so far misclassify it using k-NN. Stops when batchIterator is exhausted or when limit prototypes are collected.
+	Returns (samples, labels) of the prototypes, as raw sample images.
+	'''
+	prototypeSamples = []
+	prototypeFeatures = []
+	prototypeLabels = []
+	knn = None
+	for samples, labels in batchIterator:
+		features = prepKNN(samples, cellSize)
+		if knn is None:
+			keep = np.ones(len(labels), dtype=bool)
+		else:
+			retval, results, neighborResponses, dists = knn.find_nearest(features, min(k, len(prototypeLabels)))
+			keep = results.ravel().astype(int) != labels
+		keep = np.nonzero(keep)[0][:(limit - len(prototypeLabels))]
+		if len(keep) == 0:
+			continue
+		prototypeSamples += list(samples[keep])
+		prototypeFeatures += list(features[keep])
+		prototypeLabels += list(labels[keep])
+		if len(prototypeLabels) >= limit:
+			break
+		knn = trainingdata.trainKNN(np.float32(prototypeFeatures), np.array(prototypeLabels, dtype=int))
+	return (np.float32(prototypeSamples), np.array(prototypeLabels, dtype=int))
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Builds a condensed, augmented prototype dataset from a training dataset.')
+	parser.add_argument('dataset', nargs='?', default='sudoku_digits', choices=[dataset for dataset in trainingdata.DATASETS if not dataset.endswith('_augmented')])
+	parser.add_argument('--passes', type=int, default=DEFAULT_PASSES, help='number of augmented passes over the dataset')
+	parser.add_argument('--limit', type=int, default=None, help='maximum number of prototypes (default: dataset size)')
+	parser.add_argument('--seed', type=int, default=0)
+	args = parser.parse_args()
+
+	samples = np.load(trainingdata.datasetFile(args.dataset, 'samples.npy')).reshape(-1, CELL_SIZE, CELL_SIZE)
+	labels = np.load(trainingdata.datasetFile(args.dataset, 'labels.npy')).astype(int)
+	limit = args.limit if args.limit is not None else len(labels)
+	rng = np.random.RandomState(args.seed)
+
+	print 'Condensing ' + str(len(labels)*(args.passes + 1)) + ' samples from ' + args.dataset + '...'
+	prototypeSamples, prototypeLabels = condense(batches(augmentedSamples(samples, labels, rng, args.passes)), limit)
+
+	outputDataset = args.dataset + '_augmented'
+	outputDirectory = os.path.dirname(trainingdata.datasetFile(outputDataset, 'samples.npy'))
+	if not os.path.isdir(outputDirectory):
+		os.makedirs(outputDirectory)
+	np.save(trainingdata.datasetFile(outputDataset, 'samples.npy'), prototypeSamples)
+	np.save(trainingdata.datasetFile(outputDataset, 'labels.npy'), prototypeLabels)
+	trainingdata.saveFeatures(outputDataset, CELL_SIZE)
+	print str(len(prototypeLabels)) + ' prototypes saved to dataset ' + outputDataset
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+'''
+This module benchmarks the sudoku solver (see sudokusolver.py) on the test puzzle files of each grid size:
+data/testpuzzles.txt (9x9), data/testpuzzles16.txt (16x16) and data/testpuzzles25.txt (25x25).
+data/stresspuzzles25.txt holds near-minimal 25x25 puzzles which take tens of seconds to solve; it is only benchmarked
+when given on the command line.
+Each puzzle is solved (solve) and its solutions are counted up to 2 (countSolutions, as used to check that a puzzle is
+uniquely solvable) up to --repeat times (fewer for slow puzzles, see MAX_REPEAT_TIME), and the fastest time of each is
+reported. Solutions are checked against the puzzle.
+With --diagnose, sudokusolver.diagnose is also checked on copies of each puzzle with a misread given: one read as the
+digit of another given in its row, and one read out of range (size+1, like a misread 2-digit number). This is only
+checked for uniquely solvable puzzles.
+'''
+
+import os, sys, time, argparse
+import sudokusolver
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+DEFAULT_PUZZLE_FILES = [SCRIPT_DIRECTORY + '/data/' + name for name in ('testpuzzles.txt', 'testpuzzles16.txt', 'testpuzzles25.txt')]
+DEFAULT_REPEAT = 3
+MAX_REPEAT_TIME = 1.0 # seconds, a measurement is not repeated once it has taken this long in total
+
+def isSolution(solution, sudoku):
+	'''Returns True if solution is a complete, valid grid which agrees with the givens of sudoku.'''
+	layout = sudokusolver.getLayout(len(sudoku))
+	cells = [value for row in solution for value in row]
+	if any(sorted(cells[i] for i in unit) != layout.digits for unit in layout.units):
+		return False
+	return all(sudoku[r][c] in (0, solution[r][c]) for r in range(layout.size) for c in range(layout.size))
+
+def bestTime(function, sudoku, repeat):
+	'''Returns (fastest time in seconds, result) of up to repeat calls of function(sudoku).'''
+	times = []
+	while (len(times) < repeat) and (sum(times) < MAX_REPEAT_TIME):
+		start = time.time()
+		result = function(sudoku)
+		times.append(time.time() - start)
+	return (min(times), result)
+
+def misreadCopies(sudoku):
+	'''
+	Returns copies of sudoku with one misread given: the first given which shares its row with another given, read as
+	that other digit, then read as size+1.
+	'''
+	size = len(sudoku)
+	for r in range(size):
+		givens = [c for c in range(size) if sudoku[r][c] != 0]
+		if len(givens) >= 2:
+			copies = []
+			for digit in (sudoku[r][givens[1]], size + 1):
+				copy = [list(row) for row in sudoku]
+				copy[r][givens[0]] = digit
+				copies.append(copy)
+			return copies
+	return []
+
+def checkDiagnose(sudoku, solution):
+	'''Returns (total time in seconds, whether diagnose found solution for every misread copy of sudoku).'''
+	start = time.time()
+	found = all(any(fix == solution for changes, fix in sudokusolver.diagnose(copy, timeLimit=None)) for copy in misreadCopies(sudoku))
+	return (time.time() - start, found)
+
+def benchmark(sudoku, repeat=DEFAULT_REPEAT):
+	'''Returns (solve time, countSolutions time, number of solutions up to 2, whether the solution is valid).'''
+	solveTime, (res, solution) = bestTime(sudokusolver.solve, sudoku, repeat)
+	countTime, (count, countSolution) = bestTime(sudokusolver.countSolutions, sudoku, repeat)
+	valid = res and isSolution(solution, sudoku) and (count > 0)
+	return (solveTime, countTime, count, valid, solution)
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Benchmarks the sudoku solver on test puzzle files.')
+	parser.add_argument('files', nargs='*', default=DEFAULT_PUZZLE_FILES, help='puzzle files (see sudokusolver.loadPuzzles)')
+	parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+	parser.add_argument('--diagnose', action='store_true', help='also check that diagnose corrects misread givens')
+	args = parser.parse_args()
+
+	failed = False
+	print 'file\tpuzzle\tsize\tgivens\tsolveMs\tcountMs\tsolutions\tvalid' + ('\tdiagnoseMs\tdiagnosed' if args.diagnose else '')
+	for path in args.files:
+		solveTimes = []
+		for i, sudoku in enumerate(sudokusolver.loadPuzzles(path)):
+			givens = sum(1 for row in sudoku for value in row if value != 0)
+			solveTime, countTime, count, valid, solution = benchmark(sudoku, args.repeat)
+			solveTimes.append(solveTime)
+			failed = failed or not valid
+			row = '%s\t%d\t%d\t%d\t%.1f\t%.1f\t%s\t%s' % (os.path.basename(path), i, len(sudoku), givens, solveTime*1000, countTime*1000, '2+' if count >= 2 else count, valid)
+			if args.diagnose:
+				if valid and (count == 1):
+					diagnoseTime, diagnosed = checkDiagnose(sudoku, solution)
+					failed = failed or not diagnosed
+					row += '\t%.1f\t%s' % (diagnoseTime*1000, diagnosed)
+				else:
+					row += '\t-\t-' # diagnose only finds fixes with a unique solution
+			print row
+			sys.stdout.flush()
+		if len(solveTimes) > 0:
+			print '%s: %d puzzles, total solve time %.1f ms, slowest %.1f ms' % (os.path.basename(path), len(solveTimes), sum(solveTimes)*1000, max(solveTimes)*1000)
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+'''
+This module keeps a webcam capture session open for the lifetime of the process.
+Opening a UVC camera takes seconds, and its first frames are dark while auto exposure settles, so the camera is
+opened and warmed up once (CAMERA_WARMUP_FRAMES frames are discarded), and released when the process exits.
+The camera driver buffers frames, so a frame read from an idle camera can be seconds old:
+latestFrame(fresh=True) discards the buffered frames first, or, while the background grabber is running
+(see startGrabber), waits for a frame which was captured after the call.
+'''
+
+import cv2, sys, time, atexit, threading
+
+CAMERA_WARMUP_FRAMES = 5 # frames read and discarded after opening the camera, while its exposure settles
+CAMERA_BUFFERED_FRAMES = 4 # frames buffered by the camera driver, discarded before reading a fresh frame
+GRABBER_TIMEOUT = 2.0 # seconds to wait for the background grabber to capture a frame
+
+class CameraSession(object):
+	'''A capture session of one camera, which is opened on first use and reopened after a failed read.'''
+
+	def __init__(self, deviceNumber=0):
+		self.deviceNumber = deviceNumber
+		self._capture = None
+		self._lock = threading.Lock() # held while the capture is used
+		self._frameReady = threading.Condition()
+		self._frame = (False, None)
+		self._frameNumber = 0 # number of frames read by the grabber
+		self._grabber = None
+		self._grabbing = False
+		atexit.register(self.release)
+
+	def open(self):
+		'''Opens and warms up the camera if it is not open yet. Returns True if the camera can be read.'''
+		with self._lock:
+			return self._open()
+
+	def _open(self):
+		if self._capture is not None:
+			return True
+		capture = cv2.VideoCapture(self.deviceNumber)
+		for i in range(CAMERA_WARMUP_FRAMES):
+			if not capture.read()[0]:
+				capture.release()
+				return False
+		self._capture = capture
+		return True
+
+	def _close(self):
+		if self._capture is not None:
+			self._capture.release()
+			self._capture = None
+
+	def release(self):
+		'''Stops the grabber and releases the camera. The camera is opened again on the next request.'''
+		self.stopGrabber()
+		with self._lock:
+			self._close()
+
+	def latestFrame(self, fresh=True):
+		'''
+		Returns (retval, image) of the newest frame. If fresh is True, the frame is captured after this call.
+		If the grabber is running and fresh is False, the last frame it captured is returned without waiting.
+		If the camera cannot be read, it is released (and reopened on the next request).
+		'''
+		if self._grabbing:
+			with self._frameReady:
+				# the frame being read when this was called may have been captured before, wait for the one after it
+				target = self._frameNumber + (2 if fresh else 0)
+				deadline = time.time() + GRABBER_TIMEOUT
+				while self._grabbing and (self._frameNumber < target) and (time.time() < deadline):
+					self._frameReady.wait(deadline - time.time())
+				if self._frameNumber >= max(target, 1):
+					return self._frame
+			return (False, None)
+
+		with self._lock:
+			if not self._open():
+				return (False, None)
+			if fresh:
+				for i in range(CAMERA_BUFFERED_FRAMES):
+					self._capture.grab()
+			retval, image = self._capture.read()
+			if not retval:
+				self._close()
+			return (retval, image)
+
+	def startGrabber(self):
+		'''Starts reading frames continuously in a background thread, so that the newest frame is always available.'''
+		if self._grabbing:
+			return
+		self._grabbing = True
+		self._grabber = threading.Thread(target=self._grab)
+		self._grabber.daemon = True
+		self._grabber.start()
+
+	def stopGrabber(self):
+		'''Stops the background grabber, if it is running.'''
+		self._grabbing = False
+		if self._grabber is not None:
+			with self._frameReady:
+				self._frameReady.notify_all()
+			self._grabber.join()
+			self._grabber = None
+
+	def _grab(self):
+		with self._lock:
+			while self._grabbing:
+				if not self._open():
+					break
+				frame = self._capture.read()
+				if not frame[0]:
+					self._close()
+					break
+				with self._frameReady:
+					self._frame = frame
+					self._frameNumber += 1
+					self._frameReady.notify_all()
+		self._grabbing = False
+		with self._frameReady:
+			self._frameReady.notify_all()
+
+
+if __name__ == '__main__':
+
+	# show the newest camera frames, with and without the background grabber
+	deviceNumber = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+	session = CameraSession(deviceNumber)
+	start = time.time()
+	if not session.open():
+		print 'Failed to access camera #' + str(deviceNumber)
+		sys.exit(1)
+	print 'Camera opened in %.2f s' % (time.time() - start)
+	for grabber in (False, True):
+		if grabber:
+			session.startGrabber()
+		for i in range(5):
+			start = time.time()
+			retval, image = session.latestFrame()
+			print '%s frame read in %.3f s' % ('Grabbed' if grabber else 'Flushed', time.time() - start)
+			if retval:
+				cv2.imshow('camera', image)
+				cv2.waitKey(500)
+	session.release()
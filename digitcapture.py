@@ -7,6 +7,7 @@ Scans free-standing digits.
 import numpy as np
 import cv2, sys, os
 from opencv_functions import mosaic, prepKNN
+import trainingdata
 
 SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)) # needed because ev3's brickman messes with relative paths - see https://github.com/ev3dev/ev3dev/issues/263
 
@@ -16,61 +17,72 @@ CELL_SPACING = 2
 DIGIT_MIN_SIZE = 20
 KNN_K = 6
 
+def cropSquare(image, x, y, size):
+	'''Returns the size x size region of image with top-left corner (x, y). Parts outside of image are filled with 0.'''
+	imageHeight, imageWidth = image.shape[:2]
+	crop = np.zeros((size, size), dtype=image.dtype)
+	left, top = max(x, 0), max(y, 0)
+	right, bottom = min(x+size, imageWidth), min(y+size, imageHeight)
+	if (right > left) and (bottom > top):
+		crop[(top-y):(bottom-y), (left-x):(right-x)] = image[top:bottom, left:right]
+	return crop
+
+def readingOrder(boxes):
+	'''
+	Returns the indices of bounding boxes (x, y, width, height) sorted in reading order:
+	boxes are grouped into lines (a box belongs to a line if its vertical center is within the line's first box),
+	lines are sorted from top to bottom and boxes in a line from left to right.
+	'''
+	lines = []
+	for i in sorted(range(len(boxes)), key=lambda i: boxes[i][1]):
+		x, y, width, height = boxes[i]
+		centerY = y + height/2.0
+		if (len(lines) > 0) and (centerY <= lines[-1][0]):
+			lines[-1][1].append(i)
+		else:
+			lines.append((y + height, [i]))
+	order = []
+	for lineBottom, line in lines:
+		order += sorted(line, key=lambda i: boxes[i][0])
+	return order
+
 def read(inputImage, dataset='handwritten_digits'):
 	'''
 	Processes inputImage to find digits.
 	Returns (retval, digits, digitImages).
 	retval will be True if digit(s) are found, False otherwise.
-	digits will be returned as a list of integers.
+	digits will be returned as a list of integers, in reading order (left to right, then top to bottom).
 	digitsImage will contain a list of images of each found digit, each CELL_SIZE x CELL_SIZE pixels large,
 	in numpy float32 array format.
 	'''
-	assert (dataset=='sudoku_digits') or (dataset=='handwritten_digits') # safety check - dataset parameter will be used in file paths
-	samplesFile = SCRIPT_DIRECTORY + '/data/' + dataset + '/samples.npy'
-	labelsFile = SCRIPT_DIRECTORY + '/data/' + dataset + '/labels.npy'
-
 	# pre-process image
 	processedImage = cv2.cvtColor(inputImage, cv2.COLOR_BGR2GRAY)
 	processedImage = cv2.GaussianBlur(processedImage, (GAUSSIAN_BLUR_RADIUS,GAUSSIAN_BLUR_RADIUS), 0)
 	processedImage = cv2.adaptiveThreshold(processedImage, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 1)
 
-	# find contours in image
-	contours, hierarchy = cv2.findContours(processedImage.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+	# find outer contours in image (holes in digits such as 0, 6, 8 and 9 are not separate digits)
+	contours, hierarchy = cv2.findContours(processedImage.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+	boxes = [box for box in map(cv2.boundingRect, contours) if (box[2] > DIGIT_MIN_SIZE) and (box[3] > DIGIT_MIN_SIZE)]
 
-	# separate digits
-	cells = []
-	for contour in contours:
-		x, y, width, height = cv2.boundingRect(contour)
-		if (width > DIGIT_MIN_SIZE) and (height > DIGIT_MIN_SIZE):
-			if width > height:
-				y -= (width-height)//2
-				height = width
-			else:
-				x -= (height-width)//2
-				width = height
-			x -= CELL_SPACING
-			y -= CELL_SPACING
-			height += CELL_SPACING*2
-			width += CELL_SPACING*2
-			perspectiveMatrix = cv2.getPerspectiveTransform(np.float32([[x,y], [x,y+height], [x+width,y+height], [x+width,y]]), np.float32([[0,0], [0,CELL_SIZE], [CELL_SIZE,CELL_SIZE], [CELL_SIZE,0]]))
-			cell = cv2.warpPerspective(processedImage, perspectiveMatrix, (CELL_SIZE,CELL_SIZE))
-			cells.append(cell)
-
-	if len(cells) == 0:
+	if len(boxes) == 0:
 		return (False, [], [])
 
-	# prepare and train KNN
-	samples = np.load(samplesFile)
-	samples = prepKNN(samples, CELL_SIZE)
-	labels = np.load(labelsFile).astype(int)
-	knn = cv2.KNearest()
-	knn.train(samples, labels)
-
-	# process each cell - if the cell has a digit (largest contour area exceeds threshold area), then apply knn to cell
-	digits = [0 for i in range(len(cells))]
-	for i in range(len(cells)):
-		retval, results, neighborResponses, dists = knn.find_nearest(prepKNN([cells[i]], CELL_SIZE), KNN_K)
-		digits[i] = int(results.ravel()[0])
+	# separate digits: crop a square around each digit and scale it down to CELL_SIZE x CELL_SIZE
+	cells = []
+	for i in readingOrder(boxes):
+		x, y, width, height = boxes[i]
+		size = max(width, height)
+		x -= (size-width)//2 + CELL_SPACING
+		y -= (size-height)//2 + CELL_SPACING
+		size += CELL_SPACING*2
+		cells.append(cv2.resize(cropSquare(processedImage, x, y, size), (CELL_SIZE,CELL_SIZE), interpolation=cv2.INTER_AREA))
+
+	# get trained KNN (uses precomputed features if available)
+	knn = trainingdata.getKNN(dataset, CELL_SIZE)
+
+	# classify all cells at once
+	retval, results, neighborResponses, dists = knn.find_nearest(prepKNN(cells, CELL_SIZE), KNN_K)
+	digits = [int(result) for result in results.ravel()]
 
 	return (True, digits, cells)
 
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+
+'''
+This module evaluates digit classifier settings using k-fold cross-validation on the training datasets.
+For each combination of settings, it measures accuracy, per-sample inference latency (preprocessing + KNN query)
+and model memory (KNN training matrix), writes the results as a tab-separated table and prints the Pareto-optimal settings,
+i.e. those for which no other setting is at least as accurate, as fast and as small.
+
+Evaluated settings (see sudokucapture.py):
+- preprocess: prepKNN preprocessing method (simple, hog, none)
+- cellSize: CELL_SIZE, samples are resized to cellSize x cellSize pixels
+- crop: CROP_PIXELS, border pixels removed from each side of a 20 px cell. Dataset samples are stored already cropped
+  (see DATASET_CROP_PIXELS), so only crops at least as large as the stored one can be evaluated.
+- minArea: DIGIT_MIN_AREA, samples whose largest contour is smaller are read as blank cells and count as errors.
+  The datasets contain no blank cells, so blank cells misread as digits are not measured.
+- k: KNN_K, number of nearest neighbours
+- quantization: KNN_QUANTIZATION, storage of the training features (none for float32, uint8 or float16, see quantizedknn.py)
+'''
+
+import numpy as np
+import cv2, sys, time, argparse, itertools
+from opencv_functions import prepKNN
+import trainingdata, quantizedknn
+
+STORED_CELL_SIZE = 20
+DATASET_CROP_PIXELS = {'sudoku_digits': 4, 'handwritten_digits': 0, 'sudoku_digits_augmented': 4, 'handwritten_digits_augmented': 0}
+
+DEFAULT_PREPROCESS_METHODS = ['simple', 'hog', 'none']
+DEFAULT_CELL_SIZES = [16, 20, 24]
+DEFAULT_CROPS = [0, 4, 6]
+DEFAULT_MIN_AREA_DIVISORS = [10, 20, 40] # DIGIT_MIN_AREA = (CELL_SIZE*CELL_SIZE)//divisor
+DEFAULT_K = [1, 3, 6, 9]
+DEFAULT_QUANTIZATIONS = ['none'] # add uint8 and float16 to check quantized classifiers against the float one
+DEFAULT_FOLDS = 5
+DEFAULT_OUTPUT_FILE = 'classifier_evaluation.tsv'
+
+COLUMNS = ['dataset', 'preprocess', 'cellSize', 'crop', 'minArea', 'k', 'quantization', 'accuracy', 'latencyMs', 'memoryKB', 'pareto']
+
+def loadSamples(dataset):
+	'''Returns (samples, labels) of a dataset, without preprocessing.'''
+	samples = np.load(trainingdata.datasetFile(dataset, 'samples.npy')).reshape(-1, STORED_CELL_SIZE, STORED_CELL_SIZE)
+	labels = np.load(trainingdata.datasetFile(dataset, 'labels.npy')).astype(int)
+	return (samples, labels)
+
+def resizeSamples(samples, extraCrop, cellSize):
+	'''Removes extraCrop border pixels from each side of each sample, then resizes them to cellSize x cellSize.'''
+	resized = []
+	for sample in samples:
+		sample = np.float32(sample[extraCrop:(STORED_CELL_SIZE - extraCrop), extraCrop:(STORED_CELL_SIZE - extraCrop)])
+		resized.append(cv2.resize(sample, (cellSize, cellSize), interpolation=cv2.INTER_AREA))
+	return np.float32(resized)
+
+def largestContourAreas(cells):
+	'''Returns the area of the largest contour of each cell, as used by sudokucapture.read to detect digits.'''
+	areas = np.zeros(len(cells))
+	for i in range(len(cells)):
+		contours, hierarchy = cv2.findContours(np.uint8(cells[i] > 0), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+		if len(contours) > 0:
+			areas[i] = max(map(cv2.contourArea, contours))
+	return areas
+
+def kFold(count, folds, seed=0):
+	'''Returns a list of folds, each an array of sample indices. Samples are shuffled using the specified seed.'''
+	return np.array_split(np.random.RandomState(seed).permutation(count), folds)
+
+def crossValidate(features, labels, folds, kValues, quantization=None):
+	'''
+	Runs k-fold cross-validation of a KNN classifier (with quantized features if quantization is not None).
+	Returns (predictions, queryTimes), where predictions[k] contains the predicted label of each sample when it was in
+	the test fold, and queryTimes[k] contains the total KNN query time in seconds.
+	'''
+	predictions = dict((k, np.zeros(len(labels), dtype=int)) for k in kValues)
+	queryTimes = dict((k, 0.0) for k in kValues)
+	for i in range(len(folds)):
+		testIndices = folds[i]
+		trainIndices = np.concatenate(folds[:i] + folds[(i+1):])
+		knn = trainingdata.trainKNN(features[trainIndices], labels[trainIndices], quantization)
+		for k in kValues:
+			start = time.time()
+			retval, results, neighborResponses, dists = knn.find_nearest(features[testIndices], k)
+			queryTimes[k] += time.time() - start
+			predictions[k][testIndices] = results.ravel().astype(int)
+	return (predictions, queryTimes)
+
+def markPareto(rows):
+	'''Sets the pareto column of each row: True if no other row of the same dataset dominates it.'''
+	for row in rows:
+		row['pareto'] = True
+		for other in rows:
+			if (other is row) or (other['dataset'] != row['dataset']):
+				continue
+			if (other['accuracy'] >= row['accuracy']) and (other['latencyMs'] <= row['latencyMs']) and (other['memoryKB'] <= row['memoryKB']):
+				if (other['accuracy'] > row['accuracy']) or (other['latencyMs'] < row['latencyMs']) or (other['memoryKB'] < row['memoryKB']):
+					row['pareto'] = False
+					break
+
+def evaluate(dataset, preprocessMethods, cellSizes, crops, minAreaDivisors, kValues, quantizations=DEFAULT_QUANTIZATIONS, foldCount=DEFAULT_FOLDS, seed=0):
+	'''Evaluates all combinations of the specified settings on a dataset. Returns a list of result rows (dicts).'''
+	samples, labels = loadSamples(dataset)
+	folds = kFold(len(labels), foldCount, seed)
+	rows = []
+	for crop, cellSize in itertools.product(crops, cellSizes):
+		extraCrop = crop - DATASET_CROP_PIXELS[dataset]
+		if (extraCrop < 0) or (2*extraCrop >= STORED_CELL_SIZE):
+			continue
+		cells = resizeSamples(samples, extraCrop, cellSize)
+		areas = largestContourAreas(cells)
+		for preprocessMethod in preprocessMethods:
+			start = time.time()
+			features = np.float32(prepKNN(cells, cellSize, preprocessMethod)).reshape(len(cells), -1)
+			prepTime = time.time() - start
+			for quantization in quantizations:
+				quantization = None if quantization == 'none' else quantization
+				if quantization is None:
+					memory = features.nbytes + labels.size*np.dtype(np.float32).itemsize
+				else:
+					memory = quantizedknn.QuantizedKNN.train(features, labels, quantization).nbytes
+				predictions, queryTimes = crossValidate(features, labels, folds, kValues, quantization)
+				for divisor, k in itertools.product(minAreaDivisors, kValues):
+					minArea = (cellSize*cellSize)//divisor
+					correct = (predictions[k] == labels) & (areas >= minArea)
+					rows.append({
+						'dataset': dataset,
+						'preprocess': preprocessMethod,
+						'cellSize': cellSize,
+						'crop': crop,
+						'minArea': minArea,
+						'k': k,
+						'quantization': quantization or 'none',
+						'accuracy': float(np.mean(correct)),
+						'latencyMs': 1000.0*(prepTime + queryTimes[k])/len(labels),
+						'memoryKB': memory/1024.0
+					})
+	return rows
+
+def formatRow(row):
+	'''Formats a result row as a tab-separated line.'''
+	values = []
+	for column in COLUMNS:
+		value = row[column]
+		if isinstance(value, float):
+			value = '%.4f' % value
+		values.append(str(value))
+	return '\t'.join(values)
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Cross-validates digit classifier settings on the training datasets.')
+	parser.add_argument('--datasets', nargs='+', default=list(trainingdata.DATASETS), choices=trainingdata.DATASETS)
+	parser.add_argument('--preprocess', nargs='+', default=DEFAULT_PREPROCESS_METHODS, choices=DEFAULT_PREPROCESS_METHODS)
+	parser.add_argument('--cell-sizes', nargs='+', type=int, default=DEFAULT_CELL_SIZES)
+	parser.add_argument('--crops', nargs='+', type=int, default=DEFAULT_CROPS)
+	parser.add_argument('--min-area-divisors', nargs='+', type=int, default=DEFAULT_MIN_AREA_DIVISORS)
+	parser.add_argument('--k', nargs='+', type=int, default=DEFAULT_K)
+	parser.add_argument('--quantizations', nargs='+', default=DEFAULT_QUANTIZATIONS, choices=['none'] + list(quantizedknn.QUANTIZATIONS))
+	parser.add_argument('--folds', type=int, default=DEFAULT_FOLDS)
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE)
+	args = parser.parse_args()
+
+	rows = []
+	for dataset in args.datasets:
+		try:
+			print 'Evaluating ' + dataset + '...'
+			rows += evaluate(dataset, args.preprocess, args.cell_sizes, args.crops, args.min_area_divisors, args.k, args.quantizations, args.folds, args.seed)
+		except IOError:
+			print 'Skipping ' + dataset + ': dataset files not found, run its trainer program first.'
+	markPareto(rows)
+
+	with open(args.output, 'w') as f:
+		f.write('\t'.join(COLUMNS) + '\n')
+		for row in rows:
+			f.write(formatRow(row) + '\n')
+	print str(len(rows)) + ' results saved to ' + args.output
+
+	print 'Pareto-optimal settings:'
+	print '\t'.join(COLUMNS[:-1])
+	for row in sorted(rows, key=lambda row: (row['dataset'], -row['accuracy'])):
+		if row['pareto']:
+			print formatRow(row).rsplit('\t', 1)[0]
@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+
+'''
+This module selects the hardware backend used by plotter.py.
+By default the EV3 motors, sensors, screen, buttons and speaker are used (ev3dev).
+If the SUDOKUSCANNER_BACKEND environment variable is set to 'sim', the simulated plotter in plottersim.py is used instead,
+so that plotter functions can be run and timed on any computer.
+sleep and clock should be used instead of time.sleep and time.time in code that waits for the hardware,
+so that the simulator can advance its own clock. The simulated clock is shared by all threads, so background threads
+which do not drive the hardware (e.g. sudokuscanner.Job.speculate) should wait with time.sleep.
+'''
+
+import os, time
+
+BACKEND = os.environ.get('SUDOKUSCANNER_BACKEND', 'ev3')
+assert (BACKEND=='ev3') or (BACKEND=='sim')
+
+if BACKEND == 'sim':
+	from plottersim import LargeMotor, MediumMotor, TouchSensor, ColorSensor, Screen, Button, Sound, sleep, clock
+else:
+	from ev3dev.ev3 import LargeMotor, MediumMotor, TouchSensor, ColorSensor, Screen, Button, Sound
+	sleep = time.sleep
+	clock = time.time
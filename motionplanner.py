@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+'''
+This module converts drawings into strokes and orders them to minimize plotter travel time.
+A stroke is a list of (x, y) points in plotter coordinates, drawn with the plotter head down.
+Between strokes the plotter head is lifted and moved to the start of the next stroke.
+
+Strokes are ordered with a nearest-neighbour tour followed by 2-opt improvement. Strokes may be drawn in reverse.
+Travel cost is the time needed to move between strokes: both axes move at the same time, the roller is much slower
+than the rail for the same distance on paper, and an axis which reverses direction also has to travel its backlash.
+Backlash is compensated by BacklashModel, which tracks the last direction of travel of an axis. The backlash of each
+axis must be measured on the plotter (see RAIL_BACKLASH).
+This module does not depend on the EV3 hardware, so it can be used and tested on any computer.
+'''
+
+import json
+
+RAIL_SPEED = 250.0 # degrees/second, plotter rail at duty cycle 30
+ROLLER_SPEED = 900.0 # degrees/second, roller at duty cycle 100 (1 roller degree is about 1/19 of a rail degree on paper)
+# degrees the rail (roller) motor turns after a direction change before the plotter head (paper) follows: uncalibrated
+# defaults, the same as plottersim.BACKLASH; run plotter.py to measure them on the plotter (see plotter.calibrateBacklash)
+RAIL_BACKLASH = 20.0
+ROLLER_BACKLASH = 200.0
+PLANNER_MAX_PASSES = 10 # maximum number of 2-opt improvement passes
+
+# digit glyphs as strokes in unit coordinates: (0,0) is the top-left and (1,1) the bottom-right corner of the glyph
+DIGIT_STROKES = {
+	0: [[(0,0), (0,1), (1,1), (1,0), (0,0)]],
+	1: [[(0.5,0), (0.5,1)]],
+	2: [[(0,0), (1,0), (1,0.5), (0,0.5), (0,1), (1,1)]],
+	3: [[(0,0), (1,0), (1,0.5), (0,0.5)], [(1,0.5), (1,1), (0,1)]],
+	4: [[(0,0), (0,0.5), (1,0.5)], [(1,0), (1,1)]],
+	5: [[(1,0), (0,0), (0,0.5), (1,0.5), (1,1), (0,1)]],
+	6: [[(1,0), (0,0), (0,1), (1,1), (1,0.5), (0,0.5)]],
+	7: [[(0,0), (1,0), (1,1)]],
+	8: [[(0,0), (0,1), (1,1), (1,0), (0,0)], [(0,0.5), (1,0.5)]],
+	9: [[(1,0.5), (0,0.5), (0,0), (1,0), (1,1), (0,1)]]
+}
+
+def loadGlyphs(path):
+	'''
+	Loads a glyph table from a JSON file, in the same format as DIGIT_STROKES:
+	an object mapping each digit (as a string) to a list of strokes, each a list of [x, y] points in unit coordinates.
+	Digits missing from the file use the DIGIT_STROKES glyph.
+	'''
+	with open(path) as f:
+		table = json.load(f)
+	glyphs = dict(DIGIT_STROKES)
+	for digit, strokes in table.items():
+		glyphs[int(digit)] = [[tuple(point) for point in stroke] for stroke in strokes]
+	return glyphs
+
+def digitStrokes(digit, x, y, width, height, glyphs=DIGIT_STROKES):
+	'''Returns the strokes of a digit glyph scaled to the specified position and size.'''
+	return [[(x + px*width, y + py*height) for px, py in stroke] for stroke in glyphs[digit]]
+
+def gridSegments(grid):
+	'''
+	Returns the horizontal segments (runs of 1s) of a 0-1 grid as (rows, starts, ends) arrays, row by row, from left to right.
+	ends are exclusive. All rows are processed at once from the differences of the zero-padded grid.
+	'''
+	import numpy as np # imported here, so that importing this module (and plotter.py) stays fast on the EV3
+	grid = np.asarray(grid, np.int8)
+	padded = np.zeros((grid.shape[0], grid.shape[1] + 2), np.int8)
+	padded[:, 1:-1] = grid
+	changes = np.diff(padded, axis=1)
+	rows, starts = np.nonzero(changes == 1)
+	ends = np.nonzero(changes == -1)[1]
+	return (rows, starts, ends)
+
+def gridStrokes(grid, x, y, width, height):
+	'''Returns the horizontal segments of a 0-1 grid (see plotter.printGrid) as strokes, row by row, from left to right.'''
+	rows, starts, ends = gridSegments(grid)
+	dx = int(width/len(grid[0]))
+	dy = int(height/len(grid))
+	return [[(x + start*dx, y + row*dy), (x + end*dx, y + row*dy)] for row, start, end in zip(rows.tolist(), starts.tolist(), ends.tolist())]
+
+class BacklashModel(object):
+	'''
+	Backlash of one plotter axis: after a direction change, the motor turns backlash degrees before the output follows.
+	The model tracks the last direction of travel, and offsets motor targets by half the backlash in that direction,
+	so the extra backlash travel is only added when the direction actually reverses.
+	Positions are in motor degrees. The output position is where the plotter head (or paper) actually is.
+	'''
+
+	def __init__(self, backlash, direction=0, tolerance=1):
+		self.backlash = backlash
+		self.direction = direction
+		self.tolerance = tolerance # moves shorter than this (e.g. encoder jitter) do not change the direction
+
+	def reset(self, direction=0):
+		'''Sets the last direction of travel (-1, 1, or 0 if unknown), e.g. after the motor position has been reset.'''
+		self.direction = direction
+
+	def offset(self):
+		'''Returns the difference between the motor position and the output position.'''
+		return self.direction*self.backlash/2.0
+
+	def output(self, position):
+		'''Returns the output position for a motor position.'''
+		return position - self.offset()
+
+	def target(self, position, output):
+		'''
+		Returns the motor target for moving the output to the specified position, from the motor position,
+		and updates the direction of travel.
+		'''
+		current = self.output(position)
+		if output - current > self.tolerance:
+			self.direction = 1
+		elif current - output > self.tolerance:
+			self.direction = -1
+		return output + self.offset()
+
+def travelTime(a, b):
+	'''Returns the time needed to move the plotter head from point a to point b, without backlash.'''
+	return max(abs(b[0] - a[0])/RAIL_SPEED, abs(b[1] - a[1])/ROLLER_SPEED)
+
+def moveDirections(a, b, previous=(0, 0)):
+	'''Returns the (rail, roller) directions (-1, 0 or 1) when moving from a to b. An axis which does not move keeps its previous direction.'''
+	directions = list(previous)
+	for axis in range(2):
+		if b[axis] > a[axis]:
+			directions[axis] = 1
+		elif b[axis] < a[axis]:
+			directions[axis] = -1
+	return tuple(directions)
+
+def moveCost(a, b, directions=(0, 0)):
+	'''
+	Returns (time, newDirections) for moving the plotter head from a to b, where directions are the last (rail, roller)
+	directions of travel. An axis which reverses direction travels its backlash in addition to the distance.
+	'''
+	newDirections = moveDirections(a, b, directions)
+	distances = [abs(b[0] - a[0]), abs(b[1] - a[1])]
+	for axis, backlash in enumerate((RAIL_BACKLASH, ROLLER_BACKLASH)):
+		if (directions[axis] != 0) and (newDirections[axis] != directions[axis]):
+			distances[axis] += backlash
+	return (max(distances[0]/RAIL_SPEED, distances[1]/ROLLER_SPEED), newDirections)
+
+def pathCost(strokes, start=(0,0)):
+	'''Returns the estimated time needed to draw strokes in order, starting at start (travel and backlash, including pen-down moves).'''
+	cost = 0.0
+	directions = (0, 0)
+	position = start
+	for stroke in strokes:
+		for point in stroke:
+			time, directions = moveCost(position, point, directions)
+			cost += time
+			position = point
+	return cost
+
+def nearestNeighbourTour(strokes, start, allowReverse):
+	'''Orders strokes greedily: the next stroke is the one whose start (or end, if allowReverse) is the cheapest to reach.'''
+	remaining = list(strokes)
+	tour = []
+	position = start
+	directions = (0, 0)
+	while len(remaining) > 0:
+		bestCost, bestIndex, bestReversed = (None, 0, False)
+		for i in range(len(remaining)):
+			for reverse in ((False, True) if allowReverse else (False,)):
+				stroke = remaining[i][::-1] if reverse else remaining[i]
+				cost, entryDirections = moveCost(position, stroke[0], directions)
+				if len(stroke) > 1: # backlash taken up when starting to draw the stroke
+					cost += moveCost(stroke[0], stroke[1], entryDirections)[0] - travelTime(stroke[0], stroke[1])
+				if (bestCost is None) or (cost < bestCost):
+					bestCost, bestIndex, bestReversed = (cost, i, reverse)
+		stroke = remaining.pop(bestIndex)
+		if bestReversed:
+			stroke = stroke[::-1]
+		for point in stroke:
+			directions = moveDirections(position, point, directions)
+			position = point
+		tour.append(stroke)
+	return tour
+
+def twoOpt(tour, start, maxPasses=PLANNER_MAX_PASSES):
+	'''
+	Improves a tour by reversing sub-sequences of strokes (including the direction of each stroke) while this reduces
+	pen-up travel time. Stops when no improvement is found or after maxPasses passes. Modifies and returns tour.
+	'''
+	n = len(tour)
+	for p in range(maxPasses):
+		improved = False
+		for i in range(n - 1):
+			before = tour[i-1][-1] if i > 0 else start
+			for j in range(i + 1, n):
+				currentCost = travelTime(before, tour[i][0])
+				newCost = travelTime(before, tour[j][-1])
+				if j + 1 < n:
+					currentCost += travelTime(tour[j][-1], tour[j+1][0])
+					newCost += travelTime(tour[i][0], tour[j+1][0])
+				if newCost < currentCost - 1e-9:
+					tour[i:(j+1)] = [stroke[::-1] for stroke in reversed(tour[i:(j+1)])]
+					improved = True
+		if not improved:
+			break
+	return tour
+
+def planStrokes(strokes, start=(0,0), allowReverse=True, maxPasses=PLANNER_MAX_PASSES):
+	'''
+	Orders strokes to minimize the time spent moving between them, starting from the start position.
+	If allowReverse is False, strokes are always drawn in their original direction (and 2-opt is not applied).
+	Returns a new list of strokes. The original order is kept if it is estimated to be faster.
+	'''
+	if len(strokes) < 2:
+		return list(strokes)
+	candidates = [list(strokes), nearestNeighbourTour(strokes, start, allowReverse)]
+	if allowReverse:
+		candidates.append(twoOpt(list(candidates[-1]), start, maxPasses))
+	return min(candidates, key=lambda tour: pathCost(tour, start))
+
+
+if __name__ == '__main__':
+
+	# compare a row-by-row order with a planned order for some random digits
+	import random
+	random.seed(0)
+	strokes = []
+	for i in range(40):
+		strokes += digitStrokes(random.randint(0, 9), random.randint(0, 8)*35, random.randint(0, 8)*1200, 20, 800)
+	strokes.sort(key=lambda stroke: (stroke[0][1], stroke[0][0]))
+	print 'Row-by-row order: %.1f s' % pathCost(strokes)
+	print 'Planned order: %.1f s' % pathCost(planStrokes(strokes))
@@ -50,9 +50,10 @@ def preprocess_hog(digits, cellSize):
         gy = cv2.Sobel(img, cv2.CV_32F, 0, 1)
         mag, ang = cv2.cartToPolar(gx, gy)
         bin_n = 16
-        bin = np.int32(bin_n*ang/(2*np.pi))
-        bin_cells = bin[:10,:10], bin[10:,:10], bin[:10,10:], bin[10:,10:]
-        mag_cells = mag[:10,:10], mag[10:,:10], mag[:10,10:], mag[10:,10:]
+        bin = np.int32(bin_n*ang/(2*np.pi)) % bin_n # ang can be rounded up to 2*pi
+        h = cellSize//2
+        bin_cells = bin[:h,:h], bin[h:,:h], bin[:h,h:], bin[h:,h:]
+        mag_cells = mag[:h,:h], mag[h:,:h], mag[:h,h:], mag[h:,h:]
         hists = [np.bincount(b.ravel(), m.ravel(), bin_n) for b, m in zip(bin_cells, mag_cells)]
         hist = np.hstack(hists)
 
@@ -10,30 +10,64 @@ I/O ports:
 - 1: Touch sensor, plotter rail reset sensor
 - 2: Color sensor, paper feed detector
 - /dev/video0: USB webcam
+
+The motors, sensors, screen, buttons and speaker are provided by hardware.py (EV3 or simulated, see plottersim.py).
+numpy is only imported by the functions which need it, because importing it is slow on the EV3 (see sudokuscanner.py startup).
 '''
 
-import ev3dev.ev3 as ev3
-import time
+import hardware
+import motionplanner, waiting, sudokugrid
 
 # hardware configuration
 
-PLOTTER_RAIL_MOTOR = ev3.LargeMotor('A')
-PLOTTER_HEAD_MOTOR = ev3.MediumMotor('B')
-ROLLER_MOTOR = ev3.LargeMotor('D')
+PLOTTER_RAIL_MOTOR = hardware.LargeMotor('A')
+PLOTTER_HEAD_MOTOR = hardware.MediumMotor('B')
+ROLLER_MOTOR = hardware.LargeMotor('D')
+
+PLOTTER_RAIL_SENSOR = hardware.TouchSensor('1')
+PAPER_FEED_SENSOR = hardware.ColorSensor('2')
+
+RAIL_BACKLASH_MODEL = motionplanner.BacklashModel(motionplanner.RAIL_BACKLASH)
+ROLLER_BACKLASH_MODEL = motionplanner.BacklashModel(motionplanner.ROLLER_BACKLASH)
 
-PLOTTER_RAIL_SENSOR = ev3.TouchSensor('1')
-PAPER_FEED_SENSOR = ev3.ColorSensor('2')
+SCREEN = hardware.Screen()
+BUTTON = hardware.Button()
+SPEAKER = hardware.Sound
 
-SCREEN = ev3.Screen()
-BUTTON = ev3.Button()
-SPEAKER = ev3.Sound
+COUNTERS = {'moves': 0, 'penLifts': 0} # head moves (gotoXY) and lifts (plotterHeadUp) since startup, see telemetry.py
 
 WEBCAM_NUMBER = 0 # USB webcam
 
 PAPER_FEED_EMPTY_COLOR = 1 # black
 MAX_X = 350
 MAX_Y = 16000
-PLOTTER_HEAD_DOWN_DELAY = 0.450
+PLOTTER_HEAD_DOWN_DELAY = 0.450 # maximum time for the plotter head to settle after moving
+MOVE_SETTLE_DELAY = 0.5 # maximum time for the rail and roller to settle after moving
+SETTLE_WINDOW = 0.05 # a motor has settled when its position has not changed for this long (seconds)
+SETTLE_TOLERANCE = 1 # degrees
+RAIL_DUTY_CYCLE = 30
+ROLLER_DUTY_CYCLE = 100
+MIN_DUTY_CYCLE = 10 # slowest duty cycle used to synchronize the rail and roller
+CALIBRATION_DUTY_CYCLE = 15 # duty cycle of the backlash measurement moves, slow so that sensor edges are found precisely
+GLYPH_SCALE = 0.5 # size of digits drawn in vector mode, relative to the cell size
+RASTER_GLYPH_SCALE = 1 # raster mode: grid pixels per font pixel (both directions)
+RASTER_CELL_SPACING = (2, 1) # raster mode: empty font pixels (rows, columns) between the glyphs of neighbouring cells
+
+# raster mode font, '#' is a pixel drawn by the plotter; 0 is only printed in 2-digit numbers of grids larger than 9x9
+RASTER_FONT = {
+	0: ['.##.', '#..#', '#..#', '#..#', '.##.'],
+	1: ['.#..', '.#..', '.#..', '.#..', '.#..'],
+	2: ['###.', '...#', '###.', '#...', '###.'],
+	3: ['###.', '...#', '###.', '...#', '###.'],
+	4: ['#.#.', '#.#.', '###.', '..#.', '..#.'],
+	5: ['###.', '#...', '###.', '...#', '###.'],
+	6: ['###.', '#...', '###.', '#..#', '###.'],
+	7: ['###.', '..#.', '..#.', '.#..', '.#..'],
+	8: ['###.', '#..#', '###.', '#..#', '###.'],
+	9: ['###.', '#..#', '###.', '...#', '###.']
+}
+RASTER_BLANK = 10 # index of the blank glyph in fontAtlas()
+_fontAtlas = [] # built by fontAtlas on first use
 
 # color sensor values:
 # - 0: No color
@@ -46,101 +80,68 @@ PLOTTER_HEAD_DOWN_DELAY = 0.450
 # - 7: Brown
 
 
-def waitMotor(motor, breakOnStall=False, stallSpeed=0):
+def waitMotor(motor, breakOnStall=False, stallSpeed=0, timeout=None):
 	'''
 	Wait until the specified motor stops running.
 	If breakOnStall is True, this procedure will also end if the motor is stalled.
 	Note: motor.state should have contained 'stalled' if the motor stalled, but this had not been implemented yet,
 	so we use a speed-based stall detection system.
 	in the December 2015 release of ev3dev.
+	Returns False if the motor is still running after timeout seconds (None to wait forever), True otherwise.
 	'''
-	while 'running' in motor.state:
-		if breakOnStall and (abs(motor.speed) <= abs(stallSpeed)):
-			break
-		pass
+	if breakOnStall:
+		return waiting.waitUntil(lambda: ('running' not in motor.state) or (abs(motor.speed) <= abs(stallSpeed)), timeout)
+	return waiting.waitMotorState(motor, lambda state: 'running' not in state, timeout)
 
-def waitSensor(sensor, value, negate=False):
+def waitSensor(sensor, value, negate=False, timeout=None):
 	'''
 	Wait until the specified sensor's value equals to the specified value.
 	If negate is True, wait until the values are not equal.
+	Returns False if the condition is not met after timeout seconds (None to wait forever), True otherwise.
 	'''
 	if negate:
-		while sensor.value() == value:
-			pass
-	else:
-		while sensor.value() != value:
-			pass
+		return waiting.waitUntil(lambda: sensor.value() != value, timeout)
+	return waiting.waitUntil(lambda: sensor.value() == value, timeout)
+
+def isButtonDown(buttonType='any'):
+	'''Returns True if the specified button is down. Possible buttonTypes: any, backspace, enter, up, down, left, right'''
+	if buttonType == 'any':
+		return BUTTON.any()
+	assert buttonType in ('backspace', 'enter', 'up', 'down', 'left', 'right')
+	return getattr(BUTTON, buttonType)
 
-def waitButton(buttonType='any', mode='pressed'):
+def waitButton(buttonType='any', mode='pressed', timeout=None):
 	'''
 	Wait until the specified button is up/down/pressed (down then up).
 	Possible modes: up, down, pressed
 	Possible buttonTypes: any, backspace, enter, up, down, left, right
+	Returns False if the button is not up/down/pressed after timeout seconds (None to wait forever), True otherwise.
 	'''
-	if buttonType == 'any':
-		if (mode == 'down') or (mode == 'pressed'):
-			while not BUTTON.any():
-				pass
-		if (mode == 'up') or (mode == 'pressed'):
-			while BUTTON.any():
-				pass
-	elif buttonType == 'backspace':
-		if (mode == 'down') or (mode == 'pressed'):
-			while not BUTTON.backspace:
-				pass
-		if (mode == 'up') or (mode == 'pressed'):
-			while BUTTON.backspace:
-				pass
-	elif buttonType == 'enter':
-		if (mode == 'down') or (mode == 'pressed'):
-			while not BUTTON.enter:
-				pass
-		if (mode == 'up') or (mode == 'pressed'):
-			while BUTTON.enter:
-				pass
-	elif buttonType == 'up':
-		if (mode == 'down') or (mode == 'pressed'):
-			while not BUTTON.up:
-				pass
-		if (mode == 'up') or (mode == 'pressed'):
-			while BUTTON.up:
-				pass
-	elif buttonType == 'down':
-		if (mode == 'down') or (mode == 'pressed'):
-			while not BUTTON.down:
-				pass
-		if (mode == 'up') or (mode == 'pressed'):
-			while BUTTON.down:
-				pass
-	elif buttonType == 'left':
-		if (mode == 'down') or (mode == 'pressed'):
-			while not BUTTON.left:
-				pass
-		if (mode == 'up') or (mode == 'pressed'):
-			while BUTTON.left:
-				pass
-	elif buttonType == 'right':
-		if (mode == 'down') or (mode == 'pressed'):
-			while not BUTTON.right:
-				pass
-		if (mode == 'up') or (mode == 'pressed'):
-			while BUTTON.right:
-				pass
+	start = hardware.clock()
+	if (mode == 'down') or (mode == 'pressed'):
+		if not waiting.waitUntil(lambda: isButtonDown(buttonType), timeout):
+			return False
+	if (mode == 'up') or (mode == 'pressed'):
+		remaining = None if timeout is None else max(timeout - (hardware.clock() - start), 0)
+		if not waiting.waitUntil(lambda: not isButtonDown(buttonType), remaining):
+			return False
+	return True
 
 def plotterHeadUp(halfRaise=True):
 	'''Raises the plotter head. If halfRaise is True, the plotter head will only be lifted a bit to reduce time needed.'''
+	COUNTERS['penLifts'] += 1
 	if halfRaise:
 		PLOTTER_HEAD_MOTOR.run_timed(time_sp=400, duty_cycle_sp=-50)
 	else:
 		PLOTTER_HEAD_MOTOR.run_timed(time_sp=800, duty_cycle_sp=-50)
 	waitMotor(PLOTTER_HEAD_MOTOR, breakOnStall=True, stallSpeed=30)
-	time.sleep(PLOTTER_HEAD_DOWN_DELAY)
+	waiting.waitSettled([PLOTTER_HEAD_MOTOR], SETTLE_TOLERANCE, SETTLE_WINDOW, timeout=PLOTTER_HEAD_DOWN_DELAY)
 
 def plotterHeadDown():
 	'''Presses the plotter head down.'''
 	PLOTTER_HEAD_MOTOR.run_timed(time_sp=800, duty_cycle_sp=50)
 	waitMotor(PLOTTER_HEAD_MOTOR, breakOnStall=True, stallSpeed=30)
-	time.sleep(PLOTTER_HEAD_DOWN_DELAY)
+	waiting.waitSettled([PLOTTER_HEAD_MOTOR], SETTLE_TOLERANCE, SETTLE_WINDOW, timeout=PLOTTER_HEAD_DOWN_DELAY)
 
 def reset():
 	'''Resets plotter rail, head and roller positions.'''
@@ -155,6 +156,7 @@ def reset():
 	PLOTTER_RAIL_MOTOR.stop(stop_command='coast')
 	PLOTTER_RAIL_MOTOR.reset()
 	PLOTTER_RAIL_MOTOR.stop_command = 'brake'
+	RAIL_BACKLASH_MODEL.reset(-1)
 
 	ROLLER_MOTOR.stop_command = 'brake'
 	PAPER_FEED_SENSOR.mode = 'COL-COLOR'
@@ -183,6 +185,7 @@ def feedPaper():
 
 	ROLLER_MOTOR.reset()
 	ROLLER_MOTOR.stop_command = 'brake'
+	ROLLER_BACKLASH_MODEL.reset(1)
 
 	SCREEN.clear()
 	SCREEN.draw.text((35, 60), 'Paper in position')
@@ -195,6 +198,40 @@ def unfeedPaper():
 	ROLLER_MOTOR.run_to_rel_pos(position_sp=3500, duty_cycle_sp=100)
 	waitMotor(ROLLER_MOTOR)
 
+def measureBacklash(motor, sensor, value, dutyCycle=CALIBRATION_DUTY_CYCLE):
+	'''
+	Measures the backlash of an axis, in motor degrees, with a sensor which reads value at the start.
+	The axis is moved with dutyCycle until the sensor changes, which takes up the backlash in that direction, then back
+	until the sensor reads value again. Between the two sensor edges, the output has moved back by the distance it
+	overshot the first edge, and the motor by this distance plus the backlash. The result is larger than the backlash by
+	the distance moved while the sensor is polled (about 1-2 degrees at CALIBRATION_DUTY_CYCLE).
+	'''
+	motor.run_forever(duty_cycle_sp=dutyCycle)
+	waitSensor(sensor, value, negate=True)
+	edgePosition = motor.position
+	motor.run_forever(duty_cycle_sp=-dutyCycle)
+	waitSensor(sensor, value)
+	backlash = abs(edgePosition - motor.position)
+	motor.stop()
+	waitMotor(motor)
+	return backlash
+
+def calibrateBacklash():
+	'''
+	Measures the backlash of the rail (with the rail reset sensor) and of the roller (with the paper feed sensor), and
+	uses it to compensate backlash (see gotoXY) until the program exits.
+	The plotter must have been reset, and a paper must be inserted in the feeder; it is returned at the end.
+	Returns (railBacklash, rollerBacklash), to be set as motionplanner.RAIL_BACKLASH and ROLLER_BACKLASH.
+	'''
+	railBacklash = measureBacklash(PLOTTER_RAIL_MOTOR, PLOTTER_RAIL_SENSOR, 1)
+	RAIL_BACKLASH_MODEL.backlash = railBacklash
+	RAIL_BACKLASH_MODEL.reset(-1)
+	rollerBacklash = measureBacklash(ROLLER_MOTOR, PAPER_FEED_SENSOR, PAPER_FEED_EMPTY_COLOR, -CALIBRATION_DUTY_CYCLE)
+	ROLLER_BACKLASH_MODEL.backlash = rollerBacklash
+	ROLLER_BACKLASH_MODEL.reset(1)
+	unfeedPaper()
+	return (railBacklash, rollerBacklash)
+
 def beep(beepType='ok'):
 	'''Emit sounds according to beepType: ok, starting, ready, warning, error, done.'''
 	if beepType == 'ok':
@@ -210,11 +247,27 @@ def beep(beepType='ok'):
 	elif beepType == 'done':
 		SPEAKER.tone([(2000, 70, 30), (3000, 70, 30), (4000, 200, 0)]).wait()
 
-def gotoXY(x, y, bcm=True):
+def syncDutyCycles(dx, dy):
 	'''
-	Positions the plotter head at the specified coordinate.
+	Returns (railDutyCycle, rollerDutyCycle) for moving the rail by dx and the roller by dy degrees,
+	so that both motors finish at the same time (the head moves in a straight line).
+	The slower axis runs at its normal duty cycle, the other one is slowed down (but not below MIN_DUTY_CYCLE).
+	'''
+	railTime = dx / (motionplanner.RAIL_SPEED * RAIL_DUTY_CYCLE/30.0)
+	rollerTime = dy / (motionplanner.ROLLER_SPEED * ROLLER_DUTY_CYCLE/100.0)
+	moveTime = max(railTime, rollerTime)
+	if moveTime == 0:
+		return (RAIL_DUTY_CYCLE, ROLLER_DUTY_CYCLE)
+	railDutyCycle = max(int(round(RAIL_DUTY_CYCLE * railTime/moveTime)), MIN_DUTY_CYCLE)
+	rollerDutyCycle = max(int(round(ROLLER_DUTY_CYCLE * rollerTime/moveTime)), MIN_DUTY_CYCLE)
+	return (railDutyCycle, rollerDutyCycle)
+
+def gotoXY(x, y):
+	'''
+	Positions the plotter head at the specified coordinate, moving in a straight line.
 	(0,0) is at the top-left corner of the paper.
 	Paper is fed bottom-first.
+	Backlash is compensated when an axis reverses direction (see motionplanner.BacklashModel).
 	'''
 	x = MAX_X - x
 	y = MAX_Y - y
@@ -227,25 +280,23 @@ def gotoXY(x, y, bcm=True):
 	if y > MAX_Y:
 		y = MAX_Y
 
-	dx = abs(x - PLOTTER_RAIL_MOTOR.position)
-	dy = abs(y + ROLLER_MOTOR.position)
-
-	if bcm:
-		if(y > -ROLLER_MOTOR.position):
-			bcmy = 200
-		else:
-			bcmy = -200
-		ROLLER_MOTOR.position += bcmy
+	railTarget = int(round(RAIL_BACKLASH_MODEL.target(PLOTTER_RAIL_MOTOR.position, x)))
+	rollerTarget = int(round(ROLLER_BACKLASH_MODEL.target(ROLLER_MOTOR.position, -y)))
+	dx = abs(railTarget - PLOTTER_RAIL_MOTOR.position)
+	dy = abs(rollerTarget - ROLLER_MOTOR.position)
 
+	if (dx > 0) or (dy > 0):
+		COUNTERS['moves'] += 1
+	railDutyCycle, rollerDutyCycle = syncDutyCycles(dx, dy)
 	if dy > 0:
-		ROLLER_MOTOR.run_to_abs_pos(position_sp=-y, duty_cycle_sp=100)
+		ROLLER_MOTOR.run_to_abs_pos(position_sp=rollerTarget, duty_cycle_sp=rollerDutyCycle)
 	if dx > 0:
-		PLOTTER_RAIL_MOTOR.run_to_abs_pos(position_sp=x, duty_cycle_sp=30)
+		PLOTTER_RAIL_MOTOR.run_to_abs_pos(position_sp=railTarget, duty_cycle_sp=railDutyCycle)
 	if dy > 0:
 		waitMotor(ROLLER_MOTOR)
 	if dx > 0:
 		waitMotor(PLOTTER_RAIL_MOTOR)
-	time.sleep(0.5)
+	waiting.waitSettled([PLOTTER_RAIL_MOTOR, ROLLER_MOTOR], SETTLE_TOLERANCE, SETTLE_WINDOW, timeout=MOVE_SETTLE_DELAY)
 
 def convertCameraCoordinates(cameraX, cameraY):
 	'''Converts camera coordinates (in pixels) to plotter coordinates (in degrees).'''
@@ -253,196 +304,137 @@ def convertCameraCoordinates(cameraX, cameraY):
 	pcy = round(((cameraY - 30) * 16.560) + 1400)
 	return (pcx, pcy)
 
-def drawDigit(digit, x, y, width, height):
-	'''Draws a digit in the specified position, with the specified size.'''
+def currentXY():
+	'''Returns the current position of the plotter head, in the coordinate system used by gotoXY.'''
+	railPosition = RAIL_BACKLASH_MODEL.output(PLOTTER_RAIL_MOTOR.position)
+	rollerPosition = ROLLER_BACKLASH_MODEL.output(ROLLER_MOTOR.position)
+	return (MAX_X - railPosition, MAX_Y + rollerPosition)
+
+def drawStrokes(strokes):
+	'''
+	Draws strokes (lists of (x, y) points, see motionplanner.py) in order.
+	The plotter head is only lifted between strokes which are not connected.
+	'''
 	plotterHeadUp()
-	if digit == 0:
-		gotoXY(x, y)
-		plotterHeadDown()
-		gotoXY(x, y+height)
-		gotoXY(x+width, y+height)
-		gotoXY(x+width, y)
-		gotoXY(x, y)
-	elif digit == 1:
-		gotoXY(x+width/2, y)
-		plotterHeadDown()
-		gotoXY(x+width/2, y+height)
-	elif digit == 2:
-		gotoXY(x, y)
-		plotterHeadDown()
-		gotoXY(x+width, y)
-		gotoXY(x+width, y+height/2)
-		gotoXY(x, y+height/2)
-		gotoXY(x, y+height)
-		gotoXY(x+width, y+height)
-	elif digit == 3:
-		gotoXY(x, y)
-		plotterHeadDown()
-		gotoXY(x+width, y)
-		gotoXY(x+width, y+height/2)
-		gotoXY(x, y+height/2)
-		plotterHeadUp()
-		gotoXY(x+width, y+height/2)
-		plotterHeadDown()
-		gotoXY(x+width, y+height)
-		gotoXY(x, y+height)
-	elif digit == 4:
-		gotoXY(x, y)
-		plotterHeadDown()
-		gotoXY(x, y+height/2)
-		gotoXY(x+width, y+height/2)
-		plotterHeadUp()
-		gotoXY(x+width, y)
-		plotterHeadDown()
-		gotoXY(x+width, y+height)
-	elif digit == 5:
-		gotoXY(x+width, y)
-		plotterHeadDown()
-		gotoXY(x, y)
-		gotoXY(x, y+height/2)
-		gotoXY(x+width, y+height/2)
-		gotoXY(x+width, y+height)
-		gotoXY(x, y+height)
-	elif digit == 6:
-		gotoXY(x+width, y)
-		plotterHeadDown()
-		gotoXY(x, y)
-		gotoXY(x, y+height)
-		gotoXY(x+width, y+height)
-		gotoXY(x+width, y+height/2)
-		gotoXY(x, y+height/2)
-	elif digit == 7:
-		gotoXY(x, y)
-		plotterHeadDown()
-		gotoXY(x+width, y)
-		gotoXY(x+width, y+height)
-	elif digit == 8:
-		gotoXY(x, y)
-		plotterHeadDown()
-		gotoXY(x, y+height)
-		gotoXY(x+width, y+height)
-		gotoXY(x+width, y)
-		gotoXY(x, y)
+	headDown = False
+	position = None
+	for stroke in strokes:
+		if headDown and (stroke[0] != position):
+			plotterHeadUp()
+			headDown = False
+		if not headDown:
+			gotoXY(stroke[0][0], stroke[0][1])
+			plotterHeadDown()
+			headDown = True
+		for point in stroke[1:]:
+			gotoXY(point[0], point[1])
+		position = stroke[-1]
+	if headDown:
 		plotterHeadUp()
-		gotoXY(x, y+height/2)
-		plotterHeadDown()
-		gotoXY(x+width, y+height/2)
-	elif digit == 9:
-		gotoXY(x+width, y+height/2)
-		plotterHeadDown()
-		gotoXY(x, y+height/2)
-		gotoXY(x, y)
-		gotoXY(x+width, y)
-		gotoXY(x+width, y+height)
-		gotoXY(x, y+height)
-	plotterHeadUp()
+
+def drawDigit(digit, x, y, width, height):
+	'''Draws a digit in the specified position, with the specified size.'''
+	drawStrokes(motionplanner.digitStrokes(digit, x, y, width, height))
+
+def drawDigits(digits, glyphs=motionplanner.DIGIT_STROKES):
+	'''
+	Draws digits, a list of (digit, x, y, width, height) tuples, in the order which minimizes plotter travel.
+	glyphs is the glyph table used to draw each digit (see motionplanner.DIGIT_STROKES).
+	'''
+	strokes = []
+	for digit, x, y, width, height in digits:
+		strokes += motionplanner.digitStrokes(digit, x, y, width, height, glyphs)
+	drawStrokes(motionplanner.planStrokes(strokes, currentXY()))
 
 def printGrid(grid, x, y, width, height):
 	'''Prints an image as contained on the 0-1 grid.'''
-	row = len(grid)
-	if row > 0:
-		col = len(grid[0])
-
-	dx = int(width/col)
-	dy = int(height/row)
+	# draw the horizontal segments of each row, in the order (and direction) which minimizes plotter travel
+	strokes = motionplanner.gridStrokes(grid, x, y, width, height)
+	drawStrokes(motionplanner.planStrokes(strokes, currentXY()))
 
-	plotterHeadUp()
-	gotoXY(x-20, y-100) # backlash compensation
-	gotoXY(x, y)
-
-	for i in range(row):
-		gotoXY(x-20, y+i*dy, bcm=False)
-		segments = []
-		cstart = 0
-		prev = 0
-		for j in range(col):
-			if (prev == 0) and (grid[i][j] == 1): # start of a segment
-				cstart = j
-			elif (prev == 1) and (grid[i][j] == 0): # end of a segment
-				segments.append([cstart, j])
-			prev = grid[i][j]
-		if (prev == 1):
-			segments.append([cstart, col])
-		for j in range(len(segments)):
-			segStartX = x+segments[j][0]*dx
-			segEndX = x+segments[j][1]*dx
-			gotoXY(segStartX, y+i*dy, bcm=False)
-			plotterHeadDown()
-			gotoXY(segEndX, y+i*dy, bcm=False)
-			plotterHeadUp()
-		gotoXY(x+width+10, y+i*dy, bcm=False)
-		gotoXY(x+width+10, y+(i+1)*dy, bcm=False)
-
-def sudokuToGrid(sudoku, mask):
-	'''Converts a sudoku puzzle to grid format. Only convert digits which corresponding mask is 0.'''
-	grid = [[0 for j in range(44)] for i in range(61)]
-	for i in range(9):
-		for j in range(9):
-			if mask[i][j] == 0:
-				cr = i*7
-				cc = j*5
-
-				if sudoku[i][j] == 1:
-					for k in range(5):
-						grid[cr+k][cc+1] = 1
-				elif sudoku[i][j] == 2:
-					for k in range(3):
-						grid[cr][cc+k] = 1
-						grid[cr+2][cc+k] = 1
-						grid[cr+4][cc+k] = 1
-					grid[cr+3][cc] = 1
-					grid[cr+1][cc+3] = 1
-				elif sudoku[i][j] == 3:
-					for k in range(3):
-						grid[cr][cc+k] = 1
-						grid[cr+2][cc+k] = 1
-						grid[cr+4][cc+k] = 1
-					grid[cr+3][cc+3] = 1
-					grid[cr+1][cc+3] = 1
-				elif sudoku[i][j] == 4:
-					for k in range(3):
-						grid[cr+k][cc] = 1
-					for k in range(5):
-						grid[cr+k][cc+2] = 1
-					grid[cr+2][cc+1] = 1
-				elif sudoku[i][j] == 5:
-					for k in range(3):
-						grid[cr][cc+k] = 1
-						grid[cr+2][cc+k] = 1
-						grid[cr+4][cc+k] = 1
-					grid[cr+3][cc+3] = 1
-					grid[cr+1][cc] = 1
-				elif sudoku[i][j] == 6:
-					for k in range(3):
-						grid[cr][cc+k] = 1
-						grid[cr+2][cc+k] = 1
-						grid[cr+4][cc+k] = 1
-					grid[cr+3][cc] = 1
-					grid[cr+3][cc+3] = 1
-					grid[cr+1][cc] = 1
-				elif sudoku[i][j] == 7:
-					for k in range(3):
-						grid[cr+k][cc+2] = 1
-					grid[cr+3][cc+1] = 1
-					grid[cr+4][cc+1] = 1
-					grid[cr][cc] = 1
-					grid[cr][cc+1] = 1
-				elif sudoku[i][j] == 8:
-					for k in range(3):
-						grid[cr][cc+k] = 1
-						grid[cr+2][cc+k] = 1
-						grid[cr+4][cc+k] = 1
-					grid[cr+3][cc] = 1
-					grid[cr+1][cc] = 1
-					grid[cr+3][cc+3] = 1
-					grid[cr+1][cc+3] = 1
-				elif sudoku[i][j] == 9:
-					for k in range(3):
-						grid[cr][cc+k] = 1
-						grid[cr+2][cc+k] = 1
-						grid[cr+4][cc+k] = 1
-					grid[cr+1][cc] = 1
-					grid[cr+3][cc+3] = 1
-					grid[cr+1][cc+3] = 1
-
-	return grid
+def fontAtlas():
+	'''
+	Returns the raster font as a numpy array: fontAtlas()[digit] is the glyph bitmap of the digit,
+	and fontAtlas()[RASTER_BLANK] is a blank glyph.
+	'''
+	if len(_fontAtlas) == 0:
+		import numpy as np
+		glyphs = [[[1 if pixel == '#' else 0 for pixel in line] for line in RASTER_FONT[digit]] for digit in range(10)]
+		glyphs.append(np.zeros_like(glyphs[0]))
+		_fontAtlas.append(np.array(glyphs, np.uint8))
+	return _fontAtlas[0]
+
+def sudokuToGrid(sudoku, mask, glyphScale=RASTER_GLYPH_SCALE, spacing=RASTER_CELL_SPACING):
+	'''
+	Converts a sudoku puzzle (of any size) to grid format (see printGrid). Only convert digits which corresponding mask is 0.
+	sudoku and mask are sudokugrid.SudokuGrids or lists of lists.
+	Each font pixel becomes glyphScale x glyphScale grid pixels, and neighbouring glyphs are separated by spacing (rows, columns) font pixels.
+	Cells of grids larger than 9x9 are 2 glyphs wide, and 1-digit numbers are aligned right.
+	'''
+	import numpy as np
+	atlas = fontAtlas()
+	if glyphScale != 1:
+		atlas = np.kron(atlas, np.ones((1, glyphScale, glyphScale), np.uint8))
+	glyphHeight, glyphWidth = atlas.shape[1:]
+	size = len(sudoku)
+	places = len(str(size)) # glyphs per cell
+	glyphPitch = glyphWidth + spacing[1]*glyphScale
+	pitchY = glyphHeight + spacing[0]*glyphScale
+	pitchX = places*glyphPitch
+
+	values = np.where(np.asarray(mask) == 0, np.asarray(sudoku, np.int32), 0)
+	cells = np.zeros((size, size, pitchY, pitchX), np.uint8)
+	for k in range(places):
+		place = 10**(places - k - 1)
+		glyphs = np.where(values >= place, (values // place) % 10, RASTER_BLANK)
+		cells[:, :, :glyphHeight, k*glyphPitch:k*glyphPitch + glyphWidth] = atlas[glyphs]
+	grid = cells.transpose(0, 2, 1, 3).reshape(size*pitchY, size*pitchX)
+	return grid[:(size*pitchY - spacing[0]*glyphScale), :(size*pitchX - spacing[1]*glyphScale)]
+
+def sudokuToDigits(sudoku, mask, corners, glyphScale=GLYPH_SCALE):
+	'''
+	Converts a sudoku puzzle (of any size) to a list of (digit, x, y, width, height) tuples for drawDigits.
+	Only converts digits which corresponding mask is 0. sudoku and mask are sudokugrid.SudokuGrids or lists of lists.
+	corners are the plotter coordinates of the sudoku grid corners (top-left, bottom-left, bottom-right, top-right).
+	Cell positions are interpolated between the corners, and each number is centered in its cell.
+	The digits of a 2-digit number share the width of a single digit.
+	'''
+	topLeft, bottomLeft, bottomRight, topRight = corners
+	size = len(sudoku)
+	values = sudokugrid.asGrid(sudoku).cells
+	maskValues = sudokugrid.asGrid(mask).cells
+	digits = []
+	for i in range(size):
+		for j in range(size):
+			if maskValues[i*size + j] == 0:
+				u = (j + 0.5) / size
+				v = (i + 0.5) / size
+				cx = (1-u)*(1-v)*topLeft[0] + u*(1-v)*topRight[0] + (1-u)*v*bottomLeft[0] + u*v*bottomRight[0]
+				cy = (1-u)*(1-v)*topLeft[1] + u*(1-v)*topRight[1] + (1-u)*v*bottomLeft[1] + u*v*bottomRight[1]
+				cellWidth = ((1-v)*(topRight[0] - topLeft[0]) + v*(bottomRight[0] - bottomLeft[0])) / size
+				cellHeight = ((1-u)*(bottomLeft[1] - topLeft[1]) + u*(bottomRight[1] - topRight[1])) / size
+				width = cellWidth*glyphScale
+				height = cellHeight*glyphScale
+				number = str(values[i*size + j])
+				for k in range(len(number)):
+					digits.append((int(number[k]), cx - width/2.0 + k*width/len(number), cy - height/2.0, width/len(number), height))
+	return digits
+
+
+if __name__ == '__main__':
+
+	# measure the backlash of the rail and roller
+	reset()
+	SCREEN.clear()
+	SCREEN.draw.text((5, 50), 'Insert paper and press enter')
+	SCREEN.draw.text((20, 70), 'to measure the backlash')
+	SCREEN.update()
+	waitButton(buttonType='enter')
+	railBacklash, rollerBacklash = calibrateBacklash()
+	print 'RAIL_BACKLASH = %.1f' % railBacklash
+	print 'ROLLER_BACKLASH = %.1f' % rollerBacklash
+	SCREEN.clear()
+	SCREEN.draw.text((20, 50), 'Rail backlash: %d' % railBacklash)
+	SCREEN.draw.text((20, 70), 'Roller backlash: %d' % rollerBacklash)
+	SCREEN.update()
+	waitButton(buttonType='any')
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+
+'''
+This module simulates the EV3 plotter hardware, so that plotter.py can be run, timed and tested without a brick.
+It is used by hardware.py when the SUDOKUSCANNER_BACKEND environment variable is set to 'sim'.
+
+The simulation runs on its own clock: sleep advances it, and so does every read of a motor, sensor or button attribute
+(SIM_POLL_TIME, the cost of a sysfs read), so busy-waiting loops finish in simulated time.
+Motors move at a constant speed proportional to their duty cycle, stop at their target positions and stall at mechanical
+limits. Gear backlash is modeled per motor: after a direction change, the encoder moves by BACKLASH degrees before the
+output (plotter head or paper) follows. Every motor command is recorded in MOTION_LOG.
+
+Devices are linked as in plotter.py (see its I/O ports):
+- TouchSensor('1') is pressed when the rail motor ('A') reaches its home position
+- ColorSensor('2') sees the paper (PAPER_COLOR) when the roller ('D') has pulled it past PAPER_EDGE_POSITION,
+  and PAPER_FEED_EMPTY_COLOR otherwise
+
+Run this module directly to estimate the duration of a print job for a puzzle from data/testpuzzles.txt.
+'''
+
+import os, sys
+
+SIM_POLL_TIME = 0.002 # seconds per attribute read
+LARGE_MOTOR_MAX_SPEED = 1050.0 # degrees/second at duty cycle 100, without load
+MEDIUM_MOTOR_MAX_SPEED = 1560.0
+LOAD_FACTOR = {'A': 0.8, 'B': 1.0, 'D': 0.85} # fraction of the maximum speed reached under load
+BACKLASH = {'A': 20.0, 'B': 0.0, 'D': 200.0} # degrees
+MOTOR_LIMITS = {'A': (-10.0, 400.0), 'B': (-60.0, 60.0)} # mechanical limits (absolute degrees)
+INITIAL_POSITIONS = {'A': 150.0, 'B': 0.0, 'D': 0.0}
+RAIL_HOME_POSITION = 0.0 # rail position at which the rail reset sensor is pressed
+PAPER_EDGE_POSITION = -2000.0 # roller position at which the paper edge reaches the paper feed sensor
+PAPER_COLOR = 6 # white
+PAPER_FEED_EMPTY_COLOR = 1 # black
+BUTTON_HOLD_TIME = 0.1 # seconds a simulated button press lasts, unless specified
+BUTTON_IDLE_TIMEOUT = 60.0 # seconds of waiting for a button press that was not scripted before giving up
+
+class SimulationError(Exception):
+	'''Raised when the simulation cannot continue, e.g. when waiting for a button press that was never scripted.'''
+	pass
+
+class _Clock(object):
+	'''Simulated clock, in seconds.'''
+	def __init__(self):
+		self.now = 0.0
+
+CLOCK = _Clock()
+MOTION_LOG = [] # (time, port, command, outputPosition, targetPosition) for each motor command
+MOTORS = {}
+
+def sleep(seconds):
+	'''Advances the simulated clock.'''
+	if seconds > 0:
+		CLOCK.now += seconds
+
+def clock():
+	'''Returns the simulated time, in seconds.'''
+	return CLOCK.now
+
+def _poll():
+	'''Advances the simulated clock by the time needed to read a device attribute.'''
+	CLOCK.now += SIM_POLL_TIME
+
+def resetLog():
+	'''Clears the motion log and the travel and command counters of all motors.'''
+	del MOTION_LOG[:]
+	for motor in MOTORS.values():
+		motor.travel = 0.0
+		motor.commands = 0
+
+def summary():
+	'''Returns a dict with the number of commands and output travel (degrees) of each motor since the last resetLog.'''
+	result = {}
+	for port, motor in MOTORS.items():
+		result[port] = {'commands': motor.commands, 'travel': motor.travel}
+	return result
+
+def estimate(function, *args, **kwargs):
+	'''Runs function with the specified arguments and returns (simulated duration in seconds, return value).'''
+	start = CLOCK.now
+	result = function(*args, **kwargs)
+	return (CLOCK.now - start, result)
+
+
+class _Motor(object):
+	'''Simulated ev3dev tacho motor.'''
+
+	MAX_SPEED = LARGE_MOTOR_MAX_SPEED
+
+	def __init__(self, port):
+		self.port = port
+		self.stop_command = 'coast'
+		self.duty_cycle_sp = 0
+		self.position_sp = 0
+		self.time_sp = 0
+		self.travel = 0.0
+		self.commands = 0
+		self._absolute = INITIAL_POSITIONS.get(port, 0.0) # encoder position, never reset
+		self._output = self._absolute # position of the driven part, lags the encoder by up to the backlash
+		self._offset = 0.0
+		self._running = False
+		self._stalled = False
+		self._velocity = 0.0
+		self._target = None
+		self._endTime = None
+		self._lastUpdate = CLOCK.now
+		MOTORS[port] = self
+
+	def _update(self):
+		'''Moves the motor to its position at the current simulated time.'''
+		now = CLOCK.now
+		if self._running:
+			end = now if self._endTime is None else min(now, self._endTime)
+			absolute = self._absolute + self._velocity*max(end - self._lastUpdate, 0.0)
+			if (self._target is not None) and ((absolute - self._target)*self._velocity >= 0):
+				absolute = self._target
+				self._running = False
+			self._stalled = False
+			if self.port in MOTOR_LIMITS:
+				low, high = MOTOR_LIMITS[self.port]
+				if absolute <= low or absolute >= high:
+					absolute = min(max(absolute, low), high)
+					self._stalled = True
+			if (self._endTime is not None) and (now >= self._endTime):
+				self._running = False
+			self._moveTo(absolute)
+			if not self._running:
+				self._velocity = 0.0
+				self._stalled = False
+		self._lastUpdate = now
+
+	def _moveTo(self, absolute):
+		'''Sets the encoder position and moves the output, taking up backlash first.'''
+		self._absolute = absolute
+		halfBacklash = BACKLASH.get(self.port, 0.0)/2.0
+		output = self._output
+		if absolute - output > halfBacklash:
+			output = absolute - halfBacklash
+		elif output - absolute > halfBacklash:
+			output = absolute + halfBacklash
+		self.travel += abs(output - self._output)
+		self._output = output
+
+	def _start(self, command, dutyCycle, target=None, duration=None, **kwargs):
+		self._update()
+		for name, value in kwargs.items():
+			setattr(self, name, value)
+		if dutyCycle is not None:
+			self.duty_cycle_sp = dutyCycle
+		speed = abs(self.duty_cycle_sp)/100.0*self.MAX_SPEED*LOAD_FACTOR.get(self.port, 1.0)
+		if target is not None:
+			self._velocity = speed if target >= self._absolute else -speed
+		else:
+			self._velocity = speed if self.duty_cycle_sp >= 0 else -speed
+		self._target = target
+		self._endTime = (CLOCK.now + duration) if duration is not None else None
+		self._running = (self._velocity != 0) and ((target is None) or (target != self._absolute))
+		self.commands += 1
+		MOTION_LOG.append((CLOCK.now, self.port, command, self._output - self._offset, None if target is None else target - self._offset))
+
+	def run_forever(self, duty_cycle_sp=None, **kwargs):
+		self._start('run-forever', duty_cycle_sp, **kwargs)
+
+	def run_to_abs_pos(self, position_sp=None, duty_cycle_sp=None, **kwargs):
+		if position_sp is not None:
+			self.position_sp = position_sp
+		self._start('run-to-abs-pos', duty_cycle_sp, target=self.position_sp + self._offset, **kwargs)
+
+	def run_to_rel_pos(self, position_sp=None, duty_cycle_sp=None, **kwargs):
+		if position_sp is not None:
+			self.position_sp = position_sp
+		self._update()
+		self._start('run-to-rel-pos', duty_cycle_sp, target=self._absolute + self.position_sp, **kwargs)
+
+	def run_timed(self, time_sp=None, duty_cycle_sp=None, **kwargs):
+		if time_sp is not None:
+			self.time_sp = time_sp
+		self._start('run-timed', duty_cycle_sp, duration=self.time_sp/1000.0, **kwargs)
+
+	def stop(self, stop_command=None):
+		self._update()
+		if stop_command is not None:
+			self.stop_command = stop_command
+		self._running = False
+		self._velocity = 0.0
+		self._stalled = False
+		MOTION_LOG.append((CLOCK.now, self.port, 'stop', self._output - self._offset, None))
+
+	def reset(self):
+		self.stop()
+		self._offset = self._absolute
+		self.stop_command = 'coast'
+
+	@property
+	def position(self):
+		_poll()
+		self._update()
+		return int(round(self._absolute - self._offset))
+
+	@position.setter
+	def position(self, value):
+		self._update()
+		self._offset = self._absolute - value
+
+	@property
+	def speed(self):
+		_poll()
+		self._update()
+		if self._stalled:
+			return 0
+		return int(round(self._velocity))
+
+	@property
+	def state(self):
+		_poll()
+		self._update()
+		state = []
+		if self._running:
+			state.append('running')
+		if self._stalled:
+			state.append('stalled')
+		return state
+
+class LargeMotor(_Motor):
+	'''Simulated EV3 large motor.'''
+	MAX_SPEED = LARGE_MOTOR_MAX_SPEED
+
+class MediumMotor(_Motor):
+	'''Simulated EV3 medium motor.'''
+	MAX_SPEED = MEDIUM_MOTOR_MAX_SPEED
+
+
+class TouchSensor(object):
+	'''Simulated touch sensor, pressed when the rail motor is at its home position.'''
+
+	def __init__(self, port):
+		self.port = port
+		self.mode = 'TOUCH'
+
+	def value(self, n=0):
+		_poll()
+		rail = MOTORS['A']
+		rail._update()
+		return 1 if rail._output <= RAIL_HOME_POSITION else 0
+
+class ColorSensor(object):
+	'''Simulated color sensor, which sees the paper when the roller has pulled it past the sensor.'''
+
+	def __init__(self, port):
+		self.port = port
+		self.mode = 'COL-COLOR'
+
+	def value(self, n=0):
+		_poll()
+		roller = MOTORS['D']
+		roller._update()
+		return PAPER_COLOR if roller._output < PAPER_EDGE_POSITION else PAPER_FEED_EMPTY_COLOR
+
+
+class _Draw(object):
+	'''Records text drawn on the simulated screen. Other drawing operations are ignored.'''
+
+	def __init__(self, screen):
+		self._screen = screen
+
+	def text(self, xy, text, **kwargs):
+		self._screen.lines.append(text)
+
+	def __getattr__(self, name):
+		return lambda *args, **kwargs: None
+
+class Screen(object):
+	'''Simulated EV3 screen. lines contains the text drawn since the last clear.'''
+
+	def __init__(self):
+		self.lines = []
+		self.draw = _Draw(self)
+
+	def clear(self):
+		self.lines = []
+
+	def update(self):
+		pass
+
+
+_buttonPresses = [] # [name, holdTime, startTime] for each scripted button press
+_buttonIdleSince = [None]
+
+def pressButtons(*presses):
+	'''
+	Scripts button presses, in order. Each press is a button name (backspace, enter, up, down, left, right),
+	or a (name, holdTime) tuple. A press starts when the buttons are next read, and lasts BUTTON_HOLD_TIME unless specified.
+	'''
+	for press in presses:
+		if isinstance(press, tuple):
+			_buttonPresses.append([press[0], press[1], None])
+		else:
+			_buttonPresses.append([press, BUTTON_HOLD_TIME, None])
+
+def _pressedButton():
+	'''Returns the name of the button which is currently pressed, or None.'''
+	_poll()
+	while len(_buttonPresses) > 0:
+		name, holdTime, startTime = _buttonPresses[0]
+		if startTime is None:
+			_buttonPresses[0][2] = CLOCK.now
+			_buttonIdleSince[0] = None
+			return name
+		if CLOCK.now < startTime + holdTime:
+			return name
+		_buttonPresses.pop(0)
+		return None
+	if _buttonIdleSince[0] is None:
+		_buttonIdleSince[0] = CLOCK.now
+	elif CLOCK.now - _buttonIdleSince[0] > BUTTON_IDLE_TIMEOUT:
+		_buttonIdleSince[0] = None
+		raise SimulationError('Waited for a button press which was not scripted (see plottersim.pressButtons)')
+	return None
+
+class Button(object):
+	'''Simulated EV3 buttons, pressed according to the presses scripted with pressButtons.'''
+
+	def any(self):
+		return _pressedButton() is not None
+
+	backspace = property(lambda self: _pressedButton() == 'backspace')
+	enter = property(lambda self: _pressedButton() == 'enter')
+	up = property(lambda self: _pressedButton() == 'up')
+	down = property(lambda self: _pressedButton() == 'down')
+	left = property(lambda self: _pressedButton() == 'left')
+	right = property(lambda self: _pressedButton() == 'right')
+
+
+class _SoundProcess(object):
+	def __init__(self, duration):
+		self._duration = duration
+
+	def wait(self):
+		sleep(self._duration)
+
+class Sound(object):
+	'''Simulated EV3 speaker. Tones only take time.'''
+
+	@staticmethod
+	def tone(sequence):
+		return _SoundProcess(sum(duration + delay for frequency, duration, delay in sequence)/1000.0)
+
+	@staticmethod
+	def beep(args=''):
+		return _SoundProcess(0.1)
+
+
+if __name__ == '__main__':
+
+	# estimate the duration of a print job: reset, feed paper, plot a solved puzzle, return paper
+	os.environ['SUDOKUSCANNER_BACKEND'] = 'sim'
+	import plottersim, plotter, sudokusolver, sudokuscanner
+	from copy import deepcopy
+
+	SUDOKU_POSITION = [[150, 80], [150, 380], [450, 380], [450, 80]] # camera coordinates of a typical grid
+	OFFSET_Y = 1000
+
+	puzzleIndex = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+	modes = sys.argv[2:] if len(sys.argv) > 2 else ['raster', 'vector']
+	puzzle = sudokusolver.loadPuzzles(os.path.dirname(os.path.realpath(__file__)) + '/data/testpuzzles.txt')[puzzleIndex]
+	res, solution = sudokusolver.solve(deepcopy(puzzle))
+	if not res:
+		print 'Puzzle #' + str(puzzleIndex) + ' has no solution.'
+		sys.exit(1)
+
+	for mode in modes:
+		sudokuscanner.PRINT_MODE = mode
+		plottersim.resetLog()
+		total = 0.0
+		print 'Print job for puzzle #' + str(puzzleIndex) + ', ' + mode + ' mode:'
+		for name, function, args in [
+				('reset', plotter.reset, ()),
+				('feed paper', plotter.feedPaper, ()),
+				('position', plotter.gotoXY, (plotter.MAX_X, 300)),
+				('plot', sudokuscanner.plotSudoku, (solution, puzzle, SUDOKU_POSITION, OFFSET_Y)),
+				('unfeed paper', plotter.unfeedPaper, ()),
+				('reset', plotter.reset, ())]:
+			duration, result = plottersim.estimate(function, *args)
+			total += duration
+			print '  %-14s %8.1f s' % (name, duration)
+		print '  %-14s %8.1f s' % ('total', total)
+		for port, stats in sorted(plottersim.summary().items()):
+			print '  motor %s: %d commands, %.0f degrees travel' % (port, stats['commands'], stats['travel'])
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+'''
+This module contains a KNN classifier with quantized training features, a smaller (and on the EV3, faster) alternative
+to cv2.KNearest, which keeps the full float32 training matrix. It has the same find_nearest interface.
+
+Quantizations:
+- uint8: each feature dimension is mapped linearly from the range of the training features to 0-255, with a per-dimension
+  offset and scale (4x smaller than float32). Query features are quantized with the same offsets and scales (values out
+  of range are clipped). Squared distances are computed with integer arithmetic, weighting each dimension by its squared
+  scale rounded to DISTANCE_WEIGHT_LEVELS levels, so that distances approximate those between the float features.
+  The EV3 CPU has no floating point unit, so integer distances are cheaper there.
+- float16: features are stored as float16 (2x smaller), which needs no scales, and distances are computed in float32.
+
+Run this module directly to compare the quantized classifiers with the float classifier on a dataset (agreement of
+their predictions, accuracy on held-out samples, model memory and query time); see also evaluateclassifier.py.
+'''
+
+import numpy as np
+import sys, time
+
+QUANTIZATIONS = ('uint8', 'float16')
+DISTANCE_WEIGHT_LEVELS = 255 # the dimension with the largest scale has this integer distance weight
+DISTANCE_CHUNK_SIZE = 1024 # training samples converted to the distance dtype at a time
+
+def quantize(features, quantization):
+	'''
+	Quantizes training features (a 2D float array, one row per sample).
+	Returns (values, offsets, scales): features are approximately values*scales + offsets.
+	'''
+	assert quantization in QUANTIZATIONS
+	features = np.float32(features).reshape(len(features), -1)
+	if quantization == 'float16':
+		return (np.float16(features), np.zeros(features.shape[1], dtype=np.float32), np.ones(features.shape[1], dtype=np.float32))
+	offsets = features.min(axis=0)
+	scales = (features.max(axis=0) - offsets) / 255.0
+	scales[scales == 0] = 1.0 # constant dimension, all values are quantized to 0
+	return (quantizeQuery(features, offsets, scales), offsets, np.float32(scales))
+
+def quantizeQuery(features, offsets, scales):
+	'''Returns features quantized to uint8 with the per-dimension offsets and scales of the training features.'''
+	return np.uint8(np.clip(np.round((features - offsets) / scales), 0, 255))
+
+class QuantizedKNN(object):
+	'''
+	KNN classifier with quantized training features (see the module description). Like cv2.KNearest, samples are
+	classified by a majority vote of their k nearest neighbours, ties going to the smallest label.
+	'''
+
+	def __init__(self, values, offsets, scales, labels):
+		self.values = values
+		self.offsets = offsets
+		self.scales = scales
+		self.labels = np.float32(labels).ravel()
+		self.quantization = 'uint8' if values.dtype == np.uint8 else 'float16'
+		if self.quantization == 'uint8':
+			# squared distance = sum(weights*(a - b)**2) * distanceUnit, with integer weights
+			squaredScales = np.float64(scales)**2
+			self.weights = np.round(squaredScales / squaredScales.max() * DISTANCE_WEIGHT_LEVELS).astype(int)
+			self.distanceUnit = squaredScales.max() / DISTANCE_WEIGHT_LEVELS
+			# int32 is enough for all partial sums if a dot product of weighted values cannot exceed its range
+			bound = values.shape[1] * 255*255 * max(self.weights.max(), 1)
+			self.distanceType = np.int32 if bound < 2**31 else np.int64
+		else:
+			self.weights = None
+			self.distanceUnit = 1.0
+			self.distanceType = np.float32
+		self._norms = self._squaredNorms(values)
+
+	@classmethod
+	def train(cls, samples, labels, quantization='uint8'):
+		'''Returns a classifier trained on the specified (preprocessed) samples and labels.'''
+		values, offsets, scales = quantize(samples, quantization)
+		return cls(values, offsets, scales, labels)
+
+	@property
+	def nbytes(self):
+		'''Memory used by the model, in bytes.'''
+		return self.values.nbytes + self.offsets.nbytes + self.scales.nbytes + self.labels.nbytes + self._norms.nbytes
+
+	def _squaredNorms(self, values):
+		'''Returns the (weighted) squared norm of each row of quantized values, in the distance dtype.'''
+		values = values.astype(self.distanceType)
+		if self.weights is not None:
+			return np.dot(values*values, self.weights.astype(self.distanceType))
+		return np.sum(values*values, axis=1)
+
+	def distances(self, samples):
+		'''Returns the squared distances (in quantized units) between each sample and each training sample.'''
+		samples = np.float32(samples).reshape(len(samples), -1)
+		if self.quantization == 'uint8':
+			queries = quantizeQuery(samples, self.offsets, self.scales).astype(self.distanceType)
+			weighted = queries * self.weights.astype(self.distanceType)
+		else:
+			queries = np.float32(np.float16(samples))
+			weighted = queries
+		distances = np.empty((len(samples), len(self.values)), dtype=self.distanceType)
+		for start in range(0, len(self.values), DISTANCE_CHUNK_SIZE):
+			chunk = self.values[start:start+DISTANCE_CHUNK_SIZE].astype(self.distanceType)
+			distances[:, start:start+DISTANCE_CHUNK_SIZE] = np.dot(weighted, chunk.T)
+		distances *= -2
+		distances += self._squaredNorms(queries).reshape(-1, 1)
+		distances += self._norms
+		return distances
+
+	def find_nearest(self, samples, k):
+		'''
+		Finds the k nearest neighbours of each sample, like cv2.KNearest.find_nearest.
+		Returns (retval, results, neighborResponses, dists): results contains the predicted label of each sample,
+		neighborResponses the labels of its neighbours and dists their squared distances (nearest first), as float32 arrays.
+		'''
+		k = min(k, len(self.labels))
+		distances = self.distances(samples)
+		rows = np.arange(len(distances)).reshape(-1, 1)
+		nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+		nearest = nearest[rows, np.argsort(distances[rows, nearest], axis=1, kind='mergesort')]
+		neighborResponses = self.labels[nearest]
+		classes = np.unique(self.labels)
+		votes = np.sum(neighborResponses[:, :, np.newaxis] == classes, axis=1)
+		results = classes[np.argmax(votes, axis=1)].reshape(-1, 1) # argmax returns the first (smallest) label of a tie
+		dists = np.float32(distances[rows, nearest] * self.distanceUnit)
+		retval = float(results[-1, 0]) if len(results) > 0 else 0.0
+		return (retval, np.float32(results), np.float32(neighborResponses), dists)
+
+
+if __name__ == '__main__':
+
+	import trainingdata
+
+	CELL_SIZE = 20
+	KNN_K = 6
+	TEST_FRACTION = 0.2 # samples held out to measure accuracy
+
+	datasets = sys.argv[1:] if len(sys.argv) > 1 else trainingdata.DATASETS
+	for dataset in datasets:
+		try:
+			samples, labels = trainingdata.loadTrainingSet(dataset, CELL_SIZE)
+		except IOError:
+			print 'Skipping ' + dataset + ': dataset files not found, run its trainer program first.'
+			continue
+		samples = np.float32(samples).reshape(len(samples), -1)
+		indices = np.random.RandomState(0).permutation(len(labels))
+		testCount = int(len(labels) * TEST_FRACTION)
+		test, train = indices[:testCount], indices[testCount:]
+
+		reference = trainingdata.trainKNN(samples[train], labels[train])
+		retval, referenceResults, neighborResponses, dists = reference.find_nearest(samples[test], KNN_K)
+		referenceMemory = samples[train].nbytes + labels[train].size*np.dtype(np.float32).itemsize
+		print '%s: %d training samples, %d test samples, %d dimensions' % (dataset, len(train), len(test), samples.shape[1])
+		print 'model\taccuracy\tagreement\tmemoryKB\tqueryMs'
+		for quantization in (None,) + QUANTIZATIONS:
+			knn = reference if quantization is None else QuantizedKNN.train(samples[train], labels[train], quantization)
+			start = time.time()
+			retval, results, neighborResponses, dists = knn.find_nearest(samples[test], KNN_K)
+			queryTime = time.time() - start
+			memory = referenceMemory if quantization is None else knn.nbytes
+			accuracy = np.mean(results.ravel() == labels[test])
+			agreement = np.mean(results.ravel() == referenceResults.ravel())
+			print '%s\t%.4f\t%.4f\t%.1f\t%.2f' % (quantization or 'float32', accuracy, agreement, memory/1024.0, 1000.0*queryTime)
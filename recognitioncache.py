@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+'''
+This module caches digit recognition results, so that scanning the same sheet again does not classify its cells again.
+Cells are identified by a perceptual hash of their deskewed binary image (see cellHash): the cell is shrunk to
+HASH_SIZE x HASH_SIZE pixels and thresholded, so that the hash does not change with pixel noise between scans.
+Results are cached per cell, and per grid (the hashes of all its cells), in bounded caches which evict the least
+recently used entries.
+'''
+
+import numpy as np
+import cv2, threading
+from collections import OrderedDict
+
+HASH_SIZE = 10 # cells are shrunk to HASH_SIZE x HASH_SIZE pixels for hashing
+CELL_CACHE_SIZE = 4096 # maximum number of cached cells
+GRID_CACHE_SIZE = 64 # maximum number of cached grids
+
+def cellHash(cell):
+	'''Returns the perceptual hash of a binary cell image (0 or 255 pixels), as a string of packed bits.'''
+	small = cv2.resize(cell, (HASH_SIZE, HASH_SIZE), interpolation=cv2.INTER_AREA)
+	return np.packbits(small > 127).tostring()
+
+class LRUCache(object):
+	'''A dictionary with at most maxSize entries, which evicts the least recently used entry when it is full.'''
+
+	def __init__(self, maxSize):
+		self.maxSize = maxSize
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self._entries)
+
+	def get(self, key, default=None):
+		'''Returns the value of key (and marks it as recently used), or default if key is not cached.'''
+		with self._lock:
+			if key not in self._entries:
+				self.misses += 1
+				return default
+			self.hits += 1
+			value = self._entries.pop(key)
+			self._entries[key] = value
+			return value
+
+	def put(self, key, value):
+		'''Caches value for key, evicting the least recently used entry if the cache is full.'''
+		with self._lock:
+			self._entries.pop(key, None)
+			self._entries[key] = value
+			while len(self._entries) > self.maxSize:
+				self._entries.popitem(last=False)
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+
+class RecognitionCache(object):
+	'''
+	Caches the classification of cells (digit and confidence, see sudokucapture.classifyGrids) and of whole grids.
+	Keys include the dataset, since the same cell can be read differently by different classifiers.
+	'''
+
+	def __init__(self, cellCacheSize=CELL_CACHE_SIZE, gridCacheSize=GRID_CACHE_SIZE):
+		self.cells = LRUCache(cellCacheSize)
+		self.grids = LRUCache(gridCacheSize)
+
+	def gridKey(self, dataset, hashes):
+		'''Returns the key of a grid from the hashes of its cells.'''
+		return (dataset, ''.join(hashes))
+
+	def getGrid(self, dataset, hashes):
+		'''Returns the cached (sudoku, confidences) of a grid (a sudokugrid.SudokuGrid and a flat array), or None.'''
+		return self.grids.get(self.gridKey(dataset, hashes))
+
+	def putGrid(self, dataset, hashes, sudoku, confidences):
+		self.grids.put(self.gridKey(dataset, hashes), (sudoku.copy(), np.copy(confidences)))
+
+	def getCell(self, dataset, cellHash):
+		'''Returns the cached (digit, confidence) of a cell (digit 0 for a blank cell), or None.'''
+		return self.cells.get((dataset, cellHash))
+
+	def putCell(self, dataset, cellHash, digit, confidence):
+		self.cells.put((dataset, cellHash), (digit, confidence))
+
+	def clear(self):
+		self.cells.clear()
+		self.grids.clear()
@@ -2,106 +2,288 @@
 
 '''
 This module captures images from a webcam and processes them to find sudoku puzzles.
-The sudoku grid format used by this module is a list of list (9x9) of integer.
+The sudoku grid format used by this module is a list of list (9x9, or size x size for larger variants) of integer.
 A blank cell is denoted by 0.
+Cells of grids larger than 9x9 can have 2-digit numbers, which are split into digits before classification (see
+splitDigits), so the dataset used to read them must contain the digit 0 (e.g. handwritten_digits).
+Recognition results are cached (see recognitioncache.py), so that scanning the same grid again only costs grid detection.
 '''
 
 import numpy as np
 import cv2, sys, os
 from opencv_functions import prepKNN
+import trainingdata, recognitioncache
+from sudokugrid import SudokuGrid
 
 SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)) # needed because ev3's brickman messes with relative paths - see https://github.com/ev3dev/ev3dev/issues/263
 
 GAUSSIAN_BLUR_RADIUS = 5 # must be odd
 CROP_PIXELS = 4
 CELL_SIZE = 20
-PROCESS_SQUARE_SIZE = (CELL_SIZE + 2*CROP_PIXELS)*9
+PROCESS_SQUARE_SIZE = (CELL_SIZE + 2*CROP_PIXELS)*9 # side of the deskewed image of a 9x9 grid, see processSquareSize
 DIGIT_MIN_AREA = (CELL_SIZE*CELL_SIZE)//20
+DIGIT_MIN_HEIGHT = CELL_SIZE//4 # blobs lower than this are ignored when splitting a cell into digits
 KNN_K = 6
+KNN_QUANTIZATION = None # None to keep float32 training features, or uint8/float16 to quantize them (see quantizedknn.py)
+GRID_MIN_AREA = 100
+MULTI_GRID_MIN_AREA_RATIO = 0.25 # in multi-grid mode, ignore grids smaller than this fraction of the largest grid
+NESTED_GRID_TOLERANCE = 0.25 # fraction of a box by which the corners of a box may be off the lattice of its grid
 
-def read(inputImage, dataset='sudoku_digits', returnSplitImages=False):
-	'''
-	Processes inputImage to find a sudoku puzzle.
-	If returnSplitImages is True, it will return an array of cell images, otherwise it will return the whole sudoku image.
-	Returns (retval, sudoku, processedImage, sudokuPoints).
-	retval will be True if a sudoku puzzle is found, and False otherwise.
-	sudokuPoints will be an array of 4 points (top-left to top-right, counter-clockwise) of the coordinates of the sudoku grid
-	found in the image. Each point will be an array of 2 floats.
-	The sudoku grid format used by this module is a list of list (9x9) of integer.
-	A blank cell is denoted by 0.
-	A processedImage with size PROCESS_SQUARE_SIZE x PROCESS_SQUARE_SIZE will be returned.
-	'''
-	assert (dataset=='sudoku_digits') or (dataset=='handwritten_digits') # safety check - dataset parameter will be used in file paths
-	samplesFile = SCRIPT_DIRECTORY + '/data/' + dataset + '/samples.npy'
-	labelsFile = SCRIPT_DIRECTORY + '/data/' + dataset + '/labels.npy'
+RECOGNITION_CACHE = recognitioncache.RecognitionCache() # default cache used by classifyGrids
 
-	# pre-process image
+def preprocessImage(inputImage):
+	'''Converts inputImage to a binary (thresholded, inverted) grayscale image.'''
 	processedImage = cv2.cvtColor(inputImage, cv2.COLOR_BGR2GRAY)
 	processedImage = cv2.GaussianBlur(processedImage, (GAUSSIAN_BLUR_RADIUS,GAUSSIAN_BLUR_RADIUS), 0)
 	processedImage = cv2.adaptiveThreshold(processedImage, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV, 11, 1)
+	return processedImage
 
-	# find contours in image
+def orderCorners(square):
+	'''Orders the 4 points of a square from top-left corner to top-right corner, counter-clockwise.'''
+	square = np.squeeze(square)
+	orderedSquare = np.zeros((4,2), dtype='float32')
+	xySum = square.sum(axis=1)
+	xyDiff = np.diff(square, axis=1)
+	orderedSquare[0] = square[np.argmin(xySum)]
+	orderedSquare[1] = square[np.argmax(xyDiff)]
+	orderedSquare[2] = square[np.argmax(xySum)]
+	orderedSquare[3] = square[np.argmin(xyDiff)]
+	return orderedSquare
+
+def isGridPart(square, grid, size=9):
+	'''
+	Returns True if square, a 4-sided polygon inside the size x size sudoku grid (4 points, see orderCorners), is part
+	of the grid: one of its boxes (with its corners on the box lattice of the grid), or no larger than one of its cells
+	(a cell, or a digit in a cell). Any other square inside grid is a separate grid, e.g. grid is the border of a page.
+	'''
+	unitSquare = np.float32([[0,0], [0,1], [1,1], [1,0]])
+	transform = cv2.getPerspectiveTransform(np.float32(grid), unitSquare)
+	corners = cv2.perspectiveTransform(np.float32(square).reshape(-1, 1, 2), transform).reshape(-1, 2)
+	extent = corners.max(axis=0) - corners.min(axis=0)
+	if np.all(extent <= (1 + NESTED_GRID_TOLERANCE)/size):
+		return True
+	boxes = int(round(np.sqrt(size)))
+	lattice = corners*boxes
+	return np.all(np.abs(lattice - np.round(lattice)) <= NESTED_GRID_TOLERANCE) and np.all(np.abs(extent*boxes - 1) <= NESTED_GRID_TOLERANCE)
+
+def findGrids(processedImage, multiGrid=False, size=9):
+	'''
+	Finds size x size sudoku grids (4-sided polygons) in processedImage.
+	If multiGrid is False, only the largest grid is returned. Otherwise all grids at least MULTI_GRID_MIN_AREA_RATIO times
+	as large as the largest grid are returned, excluding the boxes and cells of each grid (see isGridPart), and squares
+	which contain other grids (such as the border of a page with several puzzles).
+	Returns a list of grids, largest first, each an array of 4 points (see orderCorners).
+	'''
 	contours, hierarchy = cv2.findContours(processedImage.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
 
-	# find largest square (sudoku grid)
-	sudokuSquare = None
-	maxArea = 0
+	squares = []
 	for i in contours:
 		area = cv2.contourArea(i)
-		if area > 100:
+		if area > GRID_MIN_AREA:
 			perimeter = cv2.arcLength(i, True) # arcLength(img, closed) finds the perimeter of a closed/open contour
 			contourPolygon = cv2.approxPolyDP(i, 0.02*perimeter, True) # approxPolyDP(img, accuracy, closed) generates a simple polygon from a contour according to the accuracy parameter
-			if (len(contourPolygon) == 4) and (area > maxArea):
-				sudokuSquare = contourPolygon
-				maxArea = area
-
-	if sudokuSquare is None:
-		return (False, [], processedImage, [])
-
-	# order sudoku square points from top-left corner to top-right corner, counter-clockwise
-	sudokuSquare = np.squeeze(sudokuSquare)
-	orderedSudokuSquare = np.zeros((4,2), dtype='float32')
-	xySum = sudokuSquare.sum(axis=1)
-	xyDiff = np.diff(sudokuSquare, axis=1)
-	orderedSudokuSquare[0] = sudokuSquare[np.argmin(xySum)]
-	orderedSudokuSquare[1] = sudokuSquare[np.argmax(xyDiff)]
-	orderedSudokuSquare[2] = sudokuSquare[np.argmax(xySum)]
-	orderedSudokuSquare[3] = sudokuSquare[np.argmin(xyDiff)]
-
-	# deskew and straighten processedImage
-	perspectiveMatrix = cv2.getPerspectiveTransform(np.float32(orderedSudokuSquare), np.float32([[0,0], [0,PROCESS_SQUARE_SIZE], [PROCESS_SQUARE_SIZE,PROCESS_SQUARE_SIZE], [PROCESS_SQUARE_SIZE,0]]))
-	deskewedImage = cv2.warpPerspective(processedImage, perspectiveMatrix, (PROCESS_SQUARE_SIZE,PROCESS_SQUARE_SIZE))
-
-	# slice image into 81 blocks, crop borders
-	cells = np.array([np.hsplit(row, 9) for row in np.vsplit(deskewedImage, 9)])
-	cells = cells.reshape(81, PROCESS_SQUARE_SIZE//9, PROCESS_SQUARE_SIZE//9)
-	cells = [cell[CROP_PIXELS:(PROCESS_SQUARE_SIZE//9 - CROP_PIXELS), CROP_PIXELS:(PROCESS_SQUARE_SIZE//9 - CROP_PIXELS)] for cell in cells]
-
-	# prepare and train KNN
-	samples = np.load(samplesFile)
-	samples = prepKNN(samples, CELL_SIZE)
-	labels = np.load(labelsFile).astype(int)
-	knn = cv2.KNearest()
-	knn.train(samples, labels)
-
-	# process each cell - if the cell has a digit (largest contour area exceeds threshold area), then apply knn to cell
-	sudoku = [0 for i in range(81)]
-	for i in range(81):
-		cell = cells[i]
-		contours, hierarchy = cv2.findContours(cell.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-		if len(contours) > 0:
-			largestContour = contours[np.argmax(map(cv2.contourArea, contours))]
-			if cv2.contourArea(largestContour) >= DIGIT_MIN_AREA:
-				# this cell has a digit, apply knn
-				retval, results, neighborResponses, dists = knn.find_nearest(prepKNN([cell], CELL_SIZE), KNN_K)
-				sudoku[i] = int(results.ravel()[0])
-
-	sudoku = np.array(sudoku)
-	sudoku = sudoku.reshape(9,9)
-	if returnSplitImages:
-		return (True, sudoku, samples, orderedSudokuSquare.tolist())
-	else:
-		return (True, sudoku, deskewedImage, orderedSudokuSquare.tolist())
+			if len(contourPolygon) == 4:
+				squares.append((area, contourPolygon))
+	if len(squares) == 0:
+		return []
+	squares.sort(key=lambda square: square[0], reverse=True)
+	if not multiGrid:
+		return [orderCorners(squares[0][1])]
+
+	# non-maximum suppression: drop the parts of larger grids, and the squares which contain a grid
+	grids = [] # (area, corners)
+	containers = set() # indices in grids of squares found to contain another grid
+	for area, square in squares:
+		square = orderCorners(square)
+		center = tuple(map(float, square.mean(axis=0)))
+		outer = [k for k in range(len(grids)) if cv2.pointPolygonTest(grids[k][1], center, False) >= 0]
+		if any(isGridPart(square, grids[k][1], size) for k in outer):
+			continue
+		containers.update(outer)
+		grids.append((area, square))
+	grids = [grids[k] for k in range(len(grids)) if k not in containers]
+	return [square for area, square in grids if area >= MULTI_GRID_MIN_AREA_RATIO*grids[0][0]]
+
+def processSquareSize(size=9):
+	'''Returns the side (in pixels) of the deskewed image of a size x size grid.'''
+	return (CELL_SIZE + 2*CROP_PIXELS)*size
+
+def splitCells(processedImage, corners, size=9):
+	'''
+	Deskews and straightens the size x size grid with the specified corners in processedImage.
+	Returns (deskewedImage, cells), where cells is a list of the size*size cell images (row by row) with their borders cropped.
+	'''
+	squareSize = processSquareSize(size)
+	perspectiveMatrix = cv2.getPerspectiveTransform(np.float32(corners), np.float32([[0,0], [0,squareSize], [squareSize,squareSize], [squareSize,0]]))
+	deskewedImage = cv2.warpPerspective(processedImage, perspectiveMatrix, (squareSize,squareSize))
+
+	# slice image into size*size blocks, crop borders
+	cells = np.array([np.hsplit(row, size) for row in np.vsplit(deskewedImage, size)])
+	cells = cells.reshape(size*size, squareSize//size, squareSize//size)
+	cells = [cell[CROP_PIXELS:(squareSize//size - CROP_PIXELS), CROP_PIXELS:(squareSize//size - CROP_PIXELS)] for cell in cells]
+	return (deskewedImage, cells)
+
+def hasDigit(cell):
+	'''Returns True if the cell has a digit (largest contour area exceeds DIGIT_MIN_AREA).'''
+	contours, hierarchy = cv2.findContours(cell.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+	if len(contours) > 0:
+		largestContour = contours[np.argmax(map(cv2.contourArea, contours))]
+		return cv2.contourArea(largestContour) >= DIGIT_MIN_AREA
+	return False
+
+def splitDigits(cell):
+	'''
+	Splits a cell which has a 2-digit number (see hasDigit) into one image per digit, from left to right.
+	Each digit is centered in a blank image of the cell's size at its original scale, so that it looks like the digit
+	of a single-digit cell. Returns [cell] if the cell does not contain exactly 2 digits.
+	'''
+	contours, hierarchy = cv2.findContours(cell.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+	boxes = sorted(cv2.boundingRect(contour) for contour in contours)
+	boxes = [box for box in boxes if box[3] >= DIGIT_MIN_HEIGHT]
+	# merge the pieces of broken digits, which overlap horizontally
+	digits = []
+	for x, y, w, h in boxes:
+		if (len(digits) > 0) and (x < digits[-1][0] + digits[-1][2]):
+			x0, y0, w0, h0 = digits[-1]
+			x1, y1 = (max(x0 + w0, x + w), max(y0 + h0, y + h))
+			digits[-1] = (x0, min(y0, y), x1 - x0, y1 - min(y0, y))
+		else:
+			digits.append((x, y, w, h))
+	if len(digits) != 2:
+		return [cell]
+	images = []
+	height, width = cell.shape
+	for x, y, w, h in digits:
+		image = np.zeros_like(cell)
+		left = (width - w)//2
+		image[y:y+h, left:left+w] = cell[y:y+h, x:x+w]
+		images.append(image)
+	return images
+
+def loadClassifier(dataset='sudoku_digits'):
+	'''Loads and trains the classifier used to read digits from dataset in advance, so that the first read is faster.'''
+	return trainingdata.getKNN(dataset, CELL_SIZE, quantization=KNN_QUANTIZATION)
+
+def checkDataset(dataset, size):
+	'''
+	Raises ValueError if the numbers of size x size grids cannot be read with dataset: the 2-digit numbers of grids larger
+	than 9x9 need a dataset with the digit 0 (e.g. handwritten_digits), which sudoku_digits does not have.
+	'''
+	if (size > 9) and (0 not in trainingdata.datasetLabels(dataset)):
+		raise ValueError('%dx%d grids need a dataset with the digit 0, %s has none' % (size, size, dataset))
+
+def classifyGrids(cellLists, dataset='sudoku_digits', returnConfidences=False, cache=RECOGNITION_CACHE):
+	'''
+	Classifies the cells of one or more grids, using a single KNN query for all cells which have a digit.
+	Returns a list of sudoku grids (sudokugrid.SudokuGrid), one for each list of size*size cells in cellLists.
+	The cells of grids larger than 9x9 are split into digits first (see splitDigits).
+	If returnConfidences is True, returns (sudokus, confidences) instead, where confidences is a list of numpy float
+	arrays (size x size) with the fraction of the KNN_K nearest neighbours which agree with each digit (1 for blank cells,
+	the lowest fraction of its digits for a 2-digit number). A digit read above size is clamped to size with confidence 0.
+	Grids and cells found in cache (a recognitioncache.RecognitionCache, None to disable caching) are not classified again.
+	'''
+	sudokus = [SudokuGrid(None, gridShape(len(cells))[0]) for cells in cellLists]
+	confidences = [np.ones(len(cells)) for cells in cellLists]
+	digitCells = []
+	digitIndices = [] # (grid, cell, place value) of each digit image in digitCells
+	hashLists = []
+	for g in range(len(cellLists)):
+		if cache is not None:
+			hashes = [recognitioncache.cellHash(cell) for cell in cellLists[g]]
+			hashLists.append(hashes)
+			cachedGrid = cache.getGrid(dataset, hashes)
+			if cachedGrid is not None:
+				sudokus[g] = cachedGrid[0].copy()
+				confidences[g][:] = cachedGrid[1]
+				continue
+		for i in range(len(cellLists[g])):
+			cachedCell = cache.getCell(dataset, hashes[i]) if cache is not None else None
+			if cachedCell is not None:
+				sudokus[g].cells[i], confidences[g][i] = cachedCell
+			elif hasDigit(cellLists[g][i]):
+				digits = splitDigits(cellLists[g][i]) if len(cellLists[g]) > 81 else [cellLists[g][i]]
+				for k in range(len(digits)):
+					digitCells.append(digits[k])
+					digitIndices.append((g, i, 10**(len(digits) - k - 1)))
+			elif cache is not None:
+				cache.putCell(dataset, hashes[i], 0, 1.0)
+
+	if len(digitCells) > 0:
+		# get trained KNN (uses precomputed features if available)
+		knn = loadClassifier(dataset)
+		retval, results, neighborResponses, dists = knn.find_nearest(prepKNN(digitCells, CELL_SIZE), KNN_K)
+		agreement = np.mean(neighborResponses == results.reshape(-1, 1), axis=1)
+		for (g, i, place), result, confidence in zip(digitIndices, results.ravel(), agreement):
+			sudokus[g].cells[i] += int(result)*place
+			confidences[g][i] = min(confidences[g][i], confidence)
+		for g, i in sorted(set((g, i) for g, i, place in digitIndices)):
+			if sudokus[g].cells[i] > sudokus[g].size:
+				# failed read (e.g. 17 in a 16x16 grid): keep the cell as a given, but the least confident one
+				sudokus[g].cells[i] = sudokus[g].size
+				confidences[g][i] = 0.0
+		if cache is not None:
+			for g, i in sorted(set((g, i) for g, i, place in digitIndices)):
+				cache.putCell(dataset, hashLists[g][i], sudokus[g].cells[i], float(confidences[g][i]))
+
+	if cache is not None:
+		for g in range(len(cellLists)):
+			cache.putGrid(dataset, hashLists[g], sudokus[g], confidences[g])
+
+	if returnConfidences:
+		return (sudokus, [confidence.reshape(gridShape(len(confidence))) for confidence in confidences])
+	return sudokus
+
+def gridShape(cellCount):
+	'''Returns the (size, size) shape of a grid of cellCount cells.'''
+	size = int(round(np.sqrt(cellCount)))
+	return (size, size)
+
+def read(inputImage, dataset='sudoku_digits', returnSplitImages=False, size=9, returnConfidences=False):
+	'''
+	Processes inputImage to find a size x size sudoku puzzle.
+	If returnSplitImages is True, it will return an array of cell images, otherwise it will return the whole sudoku image.
+	Returns (retval, sudoku, processedImage, sudokuPoints).
+	retval will be True if a sudoku puzzle is found, and False otherwise.
+	sudokuPoints will be an array of 4 points (top-left to top-right, counter-clockwise) of the coordinates of the sudoku grid
+	found in the image. Each point will be an array of 2 floats.
+	sudoku is a sudokugrid.SudokuGrid (size x size digits, a blank cell is denoted by 0).
+	A processedImage with size processSquareSize(size) x processSquareSize(size) will be returned.
+	If returnConfidences is True, the confidences of the digits of sudoku (see classifyGrids) are returned as a fifth value.
+	'''
+	processedImage = preprocessImage(inputImage)
+
+	# find largest square (sudoku grid)
+	grids = findGrids(processedImage)
+	if len(grids) == 0:
+		return (False, [], processedImage, [], []) if returnConfidences else (False, [], processedImage, [])
+
+	deskewedImage, cells = splitCells(processedImage, grids[0], size)
+	sudokus, confidences = classifyGrids([cells], dataset, returnConfidences=True)
+	result = (True, sudokus[0], cells if returnSplitImages else deskewedImage, grids[0].tolist())
+	return result + (confidences[0],) if returnConfidences else result
+
+def readAll(inputImage, dataset='sudoku_digits', size=9, returnConfidences=False):
+	'''
+	Processes inputImage to find all size x size sudoku puzzles in it (see findGrids).
+	Returns (retval, sudokus, processedImages, sudokuPointsList), with one item in each list per puzzle found,
+	in the same format as the corresponding return values of read. Puzzles are ordered from largest to smallest.
+	retval will be True if at least one sudoku puzzle is found, and False otherwise.
+	If returnConfidences is True, the list of the confidences of each puzzle is returned as a fifth value.
+	'''
+	processedImage = preprocessImage(inputImage)
+	grids = findGrids(processedImage, multiGrid=True, size=size)
+	if len(grids) == 0:
+		return (False, [], [], [], []) if returnConfidences else (False, [], [], [])
+
+	deskewedImages = []
+	cellLists = []
+	for grid in grids:
+		deskewedImage, cells = splitCells(processedImage, grid, size)
+		deskewedImages.append(deskewedImage)
+		cellLists.append(cells)
+	sudokus, confidences = classifyGrids(cellLists, dataset, returnConfidences=True)
+	result = (True, sudokus, deskewedImages, [grid.tolist() for grid in grids])
+	return result + (confidences,) if returnConfidences else result
 
 
 if __name__ == '__main__':
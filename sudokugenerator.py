@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+
+'''
+This module generates sudoku puzzles with a unique solution, e.g. to build large test corpora for the solver.
+A puzzle is made from a random complete grid (see randomGrid) by removing givens in random order, keeping only the
+removals after which the solution is still unique, until the target number of givens is reached or no more givens can be
+removed. If a target difficulty level is given (see sudokusolver.rate), removals which make the puzzle harder than the
+target are also undone, and puzzles which end up easier than the target, or which need fewer search nodes than the
+minimum search effort, are discarded and generated again.
+
+Puzzles are generated in parallel (one worker process per CPU core by default) and written as soon as they are
+generated, in the format of data/testpuzzles.txt (see sudokusolver.parsePuzzle), with a progress line for each puzzle
+on stderr. Each puzzle is generated from its own random seed, so a corpus can be generated again with the same --seed.
+'''
+
+import sys, time, random, argparse, multiprocessing
+import sudokusolver
+
+GENERATOR_MAX_ATTEMPTS = 20 # puzzles generated for each requested puzzle before giving up on a difficulty target
+
+def shuffleGrid(grid, rng):
+	'''
+	Returns a random grid equivalent to grid: rows within bands, bands, columns within stacks and stacks are reordered,
+	digits are relabelled and the grid is transposed with probability 1/2.
+	'''
+	size = len(grid)
+	boxSize = sudokusolver.getLayout(size).boxSize
+	rows = [band*boxSize + r for band in rng.sample(range(boxSize), boxSize) for r in rng.sample(range(boxSize), boxSize)]
+	cols = [stack*boxSize + c for stack in rng.sample(range(boxSize), boxSize) for c in rng.sample(range(boxSize), boxSize)]
+	digits = [0] + rng.sample(range(1, size+1), size)
+	grid = [[digits[grid[r][c]] for c in cols] for r in rows]
+	if rng.random() < 0.5:
+		grid = [list(col) for col in zip(*grid)]
+	return grid
+
+def randomGrid(size, rng):
+	'''
+	Returns a random complete size x size grid: the boxes on the diagonal, which share no row or column, are filled with
+	random permutations of the digits, the rest of the grid is solved, and the solution is shuffled (see shuffleGrid).
+	'''
+	boxSize = sudokusolver.getLayout(size).boxSize
+	grid = [[0]*size for r in range(size)]
+	for b in range(boxSize):
+		digits = rng.sample(range(1, size+1), size)
+		for (r, c), digit in zip(sudokusolver.getBoxCells(b*(boxSize+1), size), digits):
+			grid[r][c] = digit
+	res, solution = sudokusolver.solve(grid)
+	return shuffleGrid(solution, rng)
+
+def removeGivens(grid, rng, givens=0, level=None, symmetric=False):
+	'''
+	Removes givens from a complete grid in random order while its solution stays unique (see the module description),
+	down to givens givens. If symmetric is True, givens are removed in pairs of cells symmetric about the center.
+	If level is not None, removals which make the puzzle harder than level (see sudokusolver.rate) are undone.
+	Returns the puzzle.
+	'''
+	size = len(grid)
+	puzzle = [list(row) for row in grid]
+	cells = [(r, c) for r in range(size) for c in range(size)]
+	if symmetric:
+		cells = [cell for cell in cells if cell <= (size-1 - cell[0], size-1 - cell[1])]
+	rng.shuffle(cells)
+	remaining = size*size
+	for r, c in cells:
+		group = set([(r, c), (size-1 - r, size-1 - c)]) if symmetric else [(r, c)]
+		if remaining - len(group) < givens:
+			continue
+		for i, j in group:
+			puzzle[i][j] = 0
+		count, solution = sudokusolver.countSolutions(puzzle)
+		if (count == 1) and ((level is None) or (sudokusolver.rate(puzzle)[0] <= level)):
+			remaining -= len(group)
+		else:
+			for i, j in group:
+				puzzle[i][j] = grid[i][j]
+	return puzzle
+
+def generatePuzzle(size=9, givens=0, level=None, minNodes=0, symmetric=False, seed=None):
+	'''
+	Generates a puzzle with a unique solution (see the module description), from random seed seed.
+	Returns (puzzle, (level, nodes)) with the rating of the puzzle (see sudokusolver.rate), or None if no puzzle of the
+	target level and with at least minNodes search nodes was found in GENERATOR_MAX_ATTEMPTS attempts.
+	'''
+	rng = random.Random(seed)
+	for attempt in range(GENERATOR_MAX_ATTEMPTS):
+		puzzle = removeGivens(randomGrid(size, rng), rng, givens, level, symmetric)
+		rating = sudokusolver.rate(puzzle)
+		if ((level is None) or (rating[0] == level)) and (rating[1] >= minNodes):
+			return (puzzle, rating)
+	return None
+
+def generateTask(args):
+	'''Worker task: generatePuzzle(*args), timed. Returns (seed, result, seconds).'''
+	start = time.time()
+	return (args[-1], generatePuzzle(*args), time.time() - start)
+
+def generatePuzzles(count, size=9, givens=0, level=None, minNodes=0, symmetric=False, seed=0, processes=None):
+	'''
+	Generates count puzzles in parallel, from seeds seed to seed+count-1, using one worker process per CPU core if
+	processes is None. Yields (seed, result, seconds) for each puzzle as soon as it is generated (see generatePuzzle).
+	'''
+	tasks = [(size, givens, level, minNodes, symmetric, seed + k) for k in range(count)]
+	if processes == 1:
+		for task in tasks:
+			yield generateTask(task)
+		return
+	pool = multiprocessing.Pool(processes)
+	try:
+		for result in pool.imap_unordered(generateTask, tasks):
+			yield result
+		pool.close()
+	finally:
+		pool.terminate()
+		pool.join()
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Generates sudoku puzzles with a unique solution.')
+	parser.add_argument('count', type=int, help='number of puzzles to generate')
+	parser.add_argument('--size', type=int, default=9, choices=sudokusolver.PUZZLE_SIZES, help='rows of the grid (default: 9)')
+	parser.add_argument('--givens', type=int, default=0, help='target number of givens (default: as few as possible)')
+	parser.add_argument('--difficulty', choices=sudokusolver.DIFFICULTIES, help='target difficulty (see sudokusolver.rate)')
+	parser.add_argument('--min-nodes', type=int, default=0, help='minimum search nodes needed to solve each puzzle (see sudokusolver.rate)')
+	parser.add_argument('--symmetric', action='store_true', help='remove givens in pairs symmetric about the center')
+	parser.add_argument('--seed', type=int, default=0, help='random seed of the first puzzle')
+	parser.add_argument('--processes', type=int, default=None, help='worker processes (default: one per CPU core)')
+	parser.add_argument('--output', default=None, help='puzzle file (default: stdout)')
+	args = parser.parse_args()
+
+	level = sudokusolver.DIFFICULTIES.index(args.difficulty) if args.difficulty is not None else None
+	output = open(args.output, 'w') if args.output is not None else sys.stdout
+	generated = 0
+	start = time.time()
+	try:
+		for seed, result, seconds in generatePuzzles(args.count, args.size, args.givens, level, args.min_nodes, args.symmetric, args.seed, args.processes):
+			if result is None:
+				sys.stderr.write('seed %d: no puzzle found with the target difficulty\n' % seed)
+				continue
+			puzzle, (puzzleLevel, nodes) = result
+			output.write(('\n' if generated > 0 else '') + sudokusolver.formatPuzzle(puzzle) + '\n')
+			output.flush()
+			generated += 1
+			givens = sum(1 for row in puzzle for value in row if value != 0)
+			sys.stderr.write('seed %d: %d givens, %s, %d search nodes, %.2f s\n' % (seed, givens, sudokusolver.DIFFICULTIES[puzzleLevel], nodes, seconds))
+	finally:
+		if output is not sys.stdout:
+			output.close()
+	sys.stderr.write('%d puzzles generated in %.1f s\n' % (generated, time.time() - start))
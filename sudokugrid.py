@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+
+'''
+This module contains SudokuGrid, the compact sudoku grid passed from sudokucapture to sudokusolver, the plotter and the
+scanner screen. A size x size grid is stored as a flat bytearray of size*size digits (cell index row*size + col, 0 for
+a blank cell), e.g. 81 bytes for a 9x9 grid, so copying a grid is a single buffer copy, digits are read and written as
+plain ints (grid[row, col], or grid.cells[i]) and a grid is (de)serialized without parsing.
+
+Grids also support the list of list interface of the other modules for reading: len(grid) is the number of rows,
+grid[row] returns a copy of a row as a list, and iterating over a grid yields its rows. Digits are written with
+grid[row, col] = digit, since writes to a row copy are lost.
+
+numpy is only imported by the functions which need it, because importing it is slow on the EV3 (see plotter.py).
+'''
+
+class SudokuGrid(object):
+	'''
+	A size x size sudoku grid stored as a flat bytearray (see the module description).
+	cells is a bytearray or string of size*size bytes (copied), a flat sequence of size*size ints, or None for a blank grid.
+	'''
+
+	__hash__ = None # grids are mutable
+
+	def __init__(self, cells=None, size=9):
+		self.size = size
+		if cells is None:
+			self.cells = bytearray(size*size)
+		else:
+			self.cells = bytearray(cells)
+		if len(self.cells) != size*size:
+			raise ValueError('A %dx%d grid needs %d cells, got %d' % (size, size, size*size, len(self.cells)))
+
+	@classmethod
+	def fromRows(cls, rows):
+		'''Returns a grid with the digits of rows, a list of list (or any 2D sequence) of ints.'''
+		return cls([int(value) for row in rows for value in row], len(rows))
+
+	@classmethod
+	def fromArray(cls, array):
+		'''Returns a grid with the digits of a size x size (or flat) numpy array. The digits are copied in one buffer copy.'''
+		import numpy as np
+		array = np.ascontiguousarray(array, dtype=np.uint8)
+		return cls(array.tostring(), _gridSize(array.size))
+
+	@classmethod
+	def fromBytes(cls, data):
+		'''Returns the grid serialized by toBytes.'''
+		return cls(data, _gridSize(len(data)))
+
+	@classmethod
+	def fromString(cls, text):
+		'''Returns the grid formatted by toString: one character per cell, or space-separated cells, with '.' for blanks.'''
+		tokens = text.split() if ' ' in text.strip() else list(text.strip())
+		return cls([0 if token == '.' else int(token) for token in tokens], _gridSize(len(tokens)))
+
+	def array(self):
+		'''Returns a size x size numpy uint8 array which shares the buffer of the grid (writes to either show in both).'''
+		import numpy as np
+		return np.frombuffer(self.cells, dtype=np.uint8).reshape(self.size, self.size)
+
+	def __array__(self, dtype=None):
+		'''Lets numpy.asarray(grid) use the buffer of the grid, see array.'''
+		array = self.array()
+		return array if dtype is None else array.astype(dtype)
+
+	def rows(self):
+		'''Returns the grid as a list of list of ints, e.g. to serialize it as JSON.'''
+		return [list(self.cells[r*self.size:(r+1)*self.size]) for r in range(self.size)]
+
+	def toBytes(self):
+		'''Returns the digits of the grid as a string of size*size bytes.'''
+		return str(self.cells)
+
+	def toString(self):
+		'''Returns the grid as a single line of text, with '.' for blanks and spaces between the cells of grids larger than 9x9.'''
+		separator = ' ' if self.size > 9 else ''
+		return separator.join(str(value) if value != 0 else '.' for value in self.cells)
+
+	def copy(self):
+		return SudokuGrid(self.cells, self.size)
+
+	__copy__ = copy
+
+	def __deepcopy__(self, memo):
+		return self.copy()
+
+	def __reduce__(self):
+		return (SudokuGrid, (str(self.cells), self.size))
+
+	def __len__(self):
+		return self.size
+
+	def __getitem__(self, index):
+		'''grid[row, col] returns a digit, grid[row] a copy of a row as a list.'''
+		if isinstance(index, tuple):
+			row, col = index
+			return self.cells[row*self.size + col]
+		if index < 0:
+			index += self.size
+		if not (0 <= index < self.size):
+			raise IndexError('row index out of range')
+		return list(self.cells[index*self.size:(index+1)*self.size])
+
+	def __setitem__(self, index, value):
+		row, col = index
+		self.cells[row*self.size + col] = value
+
+	def __iter__(self):
+		for r in range(self.size):
+			yield list(self.cells[r*self.size:(r+1)*self.size])
+
+	def __eq__(self, other):
+		return isinstance(other, SudokuGrid) and (self.size == other.size) and (self.cells == other.cells)
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __str__(self):
+		'''Formats the grid as rows of space-separated numbers (see sudokusolver.formatPuzzle).'''
+		width = len(str(self.size))
+		return '\n'.join(' '.join(str(value).rjust(width) for value in row) for row in self)
+
+	def __repr__(self):
+		return 'SudokuGrid.fromString(%r)' % self.toString()
+
+def _gridSize(cellCount):
+	'''Returns the size of a grid of cellCount cells. Raises ValueError if cellCount is not a square.'''
+	size = int(round(cellCount ** 0.5))
+	if size*size != cellCount:
+		raise ValueError('%d cells do not make a square grid' % cellCount)
+	return size
+
+def asGrid(sudoku):
+	'''Returns sudoku as a SudokuGrid: a SudokuGrid is returned as is, a list of list or a numpy array is converted.'''
+	if isinstance(sudoku, SudokuGrid):
+		return sudoku
+	if hasattr(sudoku, 'dtype'):
+		return SudokuGrid.fromArray(sudoku)
+	return SudokuGrid.fromRows(sudoku)
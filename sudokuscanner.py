@@ -2,31 +2,262 @@
 
 '''
 Main program
+
+Each scan-solve-plot job is run as a state machine (see Job). Work which does not need the operator is overlapped with
+the slow hardware steps: the classifier is loaded and the camera is opened while the plotter resets,
+and camera frames are read and solved speculatively while the operator positions the paper.
+When enter is pressed, plotting starts from the cached result if the frame was taken after the paper last moved.
+The time spent in each stage of a job, and its moves, pen lifts, rescans and outcome are appended to the telemetry log
+(see telemetry.py); press up on the ready screen to show the rolling medians and 95th percentiles of the last jobs.
+
+Startup is kept short because brickman starts this program cold: only the plotter modules are imported before the
+plotter is reset. cv2, numpy and the image processing modules are imported, the classifier snapshot is loaded
+(see trainingdata.getKNN) and the camera is opened (see camera.py) in a background thread meanwhile. A breakdown of the startup time is written to stderr.
 '''
 
-import cv2, time
-import plotter, sudokucapture, sudokusolver
-from copy import deepcopy
+import time
+STARTUP_TIME = time.time()
+import sys
+import hardware, plotter, motionplanner, waiting, telemetry
 
-if __name__ == '__main__':
+# imported in the background by importModules
+camera = None
+sudokucapture = None
+sudokusolver = None
 
-	plotter.beep('starting')
-	plotter.reset()
-	plotter.beep('ready')
+CAMERA = None # camera.CameraSession, opened in the background at startup and kept open until the program exits
 
-	while True:
+MULTI_GRID = False # if True, all sudoku puzzles found in the camera image are solved and plotted
+SUDOKU_SIZE = 9 # rows of the sudoku grids read by the camera: 9, or 16 and 25 for larger variants (see sudokucapture.py)
+DATASET = 'sudoku_digits' # digits the classifier is trained on; grids larger than 9x9 need the digit 0, e.g. handwritten_digits
+PRINT_MODE = 'vector' # vector: draw each digit with strokes (see motionplanner.py), raster: print a 0-1 grid row by row
+GLYPH_FILE = None # JSON glyph table used in vector mode (see motionplanner.loadGlyphs), None to use the default glyphs
+SPECULATION_SETTLE_TIME = 0.3 # seconds the roller must be stopped before a frame is read speculatively
+SPECULATION_RETRY_INTERVAL = 0.5 # seconds between speculative reads when no puzzle was found or solved
+DIAGNOSIS_CACHE_SIZE = 16 # unsolvable grids whose diagnosis is kept, see diagnose
+
+DIAGNOSES = {} # fixes found by sudokusolver.diagnose for each unsolvable grid (by its bytes), see diagnose
+
+def logStartupTime(step, seconds):
+	'''Writes the time taken by a startup step to stderr.'''
+	sys.stderr.write('startup: %-20s %6.2f s\n' % (step, seconds))
+
+def timed(step, function, *args):
+	'''Calls function with args, logs the time it took as a startup step and returns its result.'''
+	start = time.time()
+	result = function(*args)
+	logStartupTime(step, time.time() - start)
+	return result
+
+def importModules():
+	'''Imports cv2, numpy and the camera, image processing and solver modules, which is slow on the EV3.'''
+	global camera, sudokucapture, sudokusolver
+	import camera, sudokucapture, sudokusolver
+
+def prepare():
+	'''Imports the image processing modules, loads the classifier and opens the camera. Runs in a background thread at startup.'''
+	global CAMERA
+	timed('import cv2/numpy', importModules)
+	sudokucapture.checkDataset(DATASET, SUDOKU_SIZE)
+	timed('load classifier', sudokucapture.loadClassifier, DATASET)
+	CAMERA = camera.CameraSession(plotter.WEBCAM_NUMBER)
+	timed('open camera', CAMERA.open)
+	logStartupTime('prepared', time.time() - STARTUP_TIME)
+
+def showSudoku(sudoku):
+	'''Shows a sudoku grid (a sudokugrid.SudokuGrid or a list of list) on the screen. Grids larger than 9x9 do not fit, only their size is shown.'''
+	plotter.SCREEN.clear()
+	if len(sudoku) > 9:
+		plotter.SCREEN.draw.text((45, 60), '%dx%d sudoku solved' % (len(sudoku), len(sudoku)))
+		plotter.SCREEN.update()
+		return
+	boxSize = int(round(len(sudoku) ** 0.5))
+	lineY = 8
+	for i in range(boxSize):
+		for l in range(boxSize):
+			row = sudoku[i*boxSize + l]
+			line = ''
+			for j in range(boxSize):
+				for k in range(boxSize):
+					line += str(row[j*boxSize + k])
+					if k < boxSize - 1:
+						line += ' '
+				if j < boxSize - 1:
+					line += ' | '
+			plotter.SCREEN.draw.text((26, lineY), line)
+			lineY += 10
+		if i < boxSize - 1:
+			plotter.SCREEN.draw.text((24, lineY), '-'*(len(line) + 1))
+			lineY += 10
+	plotter.SCREEN.update()
+
+def plotSudoku(solvedSudoku, originalSudoku, sudokuPosition, offsetY):
+	'''Plots the digits of solvedSudoku which are blank in originalSudoku, on the grid found at sudokuPosition (camera coordinates).'''
+	# calculate positions of digits
+	sudokuTopLeftX, sudokuTopLeftY = plotter.convertCameraCoordinates(sudokuPosition[0][0], sudokuPosition[0][1])
+	sudokuBottomLeftX, sudokuBottomLeftY = plotter.convertCameraCoordinates(sudokuPosition[1][0], sudokuPosition[1][1])
+	sudokuBottomRightX, sudokuBottomRightY = plotter.convertCameraCoordinates(sudokuPosition[2][0], sudokuPosition[2][1])
+	sudokuTopRightX, sudokuTopRightY = plotter.convertCameraCoordinates(sudokuPosition[3][0], sudokuPosition[3][1])
+
+	if PRINT_MODE == 'vector':
+		glyphs = motionplanner.loadGlyphs(GLYPH_FILE) if GLYPH_FILE is not None else motionplanner.DIGIT_STROKES
+		corners = [(sudokuTopLeftX, sudokuTopLeftY + offsetY), (sudokuBottomLeftX, sudokuBottomLeftY + offsetY), (sudokuBottomRightX, sudokuBottomRightY + offsetY), (sudokuTopRightX, sudokuTopRightY + offsetY)]
+		plotter.drawDigits(plotter.sudokuToDigits(solvedSudoku, originalSudoku, corners), glyphs)
+	else:
+		sudokuX = (sudokuTopLeftX + sudokuBottomLeftX) / 2.0
+		sudokuY = (sudokuTopLeftY + sudokuTopRightY) / 2.0 + offsetY
+		sudokuWidth = (sudokuTopRightX + sudokuBottomRightX - sudokuTopLeftX - sudokuBottomLeftX) / 2.0
+		sudokuHeight = (sudokuBottomLeftY + sudokuBottomRightY - sudokuTopLeftY - sudokuTopRightY) / 2.0
+		plotter.printGrid(plotter.sudokuToGrid(solvedSudoku, originalSudoku), sudokuX, sudokuY, sudokuWidth, sudokuHeight)
+
+def diagnose(sudoku, confidences):
+	'''
+	Returns the fixes of an unsolvable sudoku grid found by sudokusolver.diagnose, which can take up to
+	sudokusolver.DIAGNOSIS_TIME_LIMIT. The fixes are cached by grid, since the same misread grid is usually read again
+	from the next camera frames while the paper does not move.
+	'''
+	key = sudoku.toBytes()
+	if key not in DIAGNOSES:
+		if len(DIAGNOSES) >= DIAGNOSIS_CACHE_SIZE:
+			DIAGNOSES.clear()
+		DIAGNOSES[key] = sudokusolver.diagnose(sudoku, confidences=confidences)
+	return DIAGNOSES[key]
+
+def recognize(inputImage, processes=None, jobTelemetry=None):
+	'''
+	Reads and solves the sudoku puzzles in a camera image.
+	Returns (error, puzzles), where puzzles is a list of (solvedSudoku, originalSudoku, sudokuPosition) of each solved puzzle,
+	and error is None, or the message to show if no puzzle was found or solved.
+	The time taken by recognition and solving is added to jobTelemetry (a telemetry.JobTelemetry), if any.
+	'''
+	if jobTelemetry is None:
+		jobTelemetry = telemetry.JobTelemetry()
+	with jobTelemetry.stage('recognition'):
+		if MULTI_GRID:
+			retval, sudokus, processedImages, sudokuPositions, confidences = sudokucapture.readAll(inputImage, DATASET, SUDOKU_SIZE, returnConfidences=True)
+		else:
+			retval, sudoku, processedImage, sudokuPosition, confidence = sudokucapture.read(inputImage, DATASET, size=SUDOKU_SIZE, returnConfidences=True)
+			sudokus, sudokuPositions, confidences = [sudoku], [sudokuPosition], [confidence]
+	if not retval:
+		return ('Sudoku puzzle not detected', [])
+
+	originalSudokus = [sudoku.copy() for sudoku in sudokus]
+	with jobTelemetry.stage('solve'):
+		results = sudokusolver.solveAll(sudokus, processes)
+		for i in range(len(results)):
+			if not results[i][0]:
+				# a digit may have been misread: correct it if there is only one way to do so (see sudokusolver.diagnose)
+				fixes = diagnose(originalSudokus[i], confidences[i])
+				if len(fixes) == 1:
+					changes, solution = fixes[0]
+					for row, col, digit in changes:
+						sys.stderr.write('Corrected misread digit at row %d, column %d: %d -> %d\n' % (row + 1, col + 1, originalSudokus[i][row, col], digit))
+						originalSudokus[i][row, col] = digit
+					results[i] = (True, solution)
+	puzzles = [(results[i][1], originalSudokus[i], sudokuPositions[i]) for i in range(len(results)) if results[i][0]]
+	if len(puzzles) == 0:
+		return ('Solution not found', [])
+	return (None, puzzles)
+
+class Job(object):
+	'''
+	A scan-solve-plot job. Each state is a method which does one step and returns the name of the next state,
+	until the job is 'done'. The modules, the classifier and the camera are loaded by classifierLoader (a waiting.Wait
+	object running prepare) in the background.
+	The job is timed from the feed state (see telemetry.py), and its record is appended to the telemetry log when it is done.
+	'''
+
+	def __init__(self, classifierLoader):
+		self.classifierLoader = classifierLoader
+		self.speculation = None # Wait object of the speculative recognition thread, see speculate
+		self.positioning = False
+		self.rollerGeneration = 0 # incremented every time the roller starts moving while the paper is positioned
+		self.rollerStoppedAt = None # clock time at which the roller last stopped, None while it is moving
+		self.cached = None # (rollerGeneration, puzzles) of the last successful speculative recognition
+		self.offsetY = 0
+		self.puzzles = []
+		self.error = None # (message, text x position, beep type) shown by the fail state
+		self.telemetry = telemetry.JobTelemetry(plotter.COUNTERS, hardware.clock)
+
+	def run(self):
+		'''Runs the job until it is done. Background work of the job is always stopped at the end.'''
+		state = 'ready'
+		try:
+			while state != 'done':
+				state = getattr(self, state)()
+		except Exception as e:
+			self.telemetry.finish('failed', '%s: %s' % (type(e).__name__, e))
+			raise
+		finally:
+			self.positioning = False
+			self.waitSpeculation()
+			if self.telemetry.startTime is not None:
+				try:
+					telemetry.appendRecord(self.telemetry.record())
+				except (IOError, OSError) as e:
+					sys.stderr.write('Failed to write telemetry: %s\n' % e)
+
+	def waitSpeculation(self):
+		'''
+		Waits until the speculative recognition thread (if any) has finished. Its error, if it failed, is only written to
+		stderr, since scan then reads a frame itself.
+		'''
+		if self.speculation is None:
+			return
+		try:
+			self.speculation.join()
+		except Exception as e:
+			sys.stderr.write('Speculative recognition failed: %s: %s\n' % (type(e).__name__, e))
+		self.speculation = None
+
+	def prepared(self):
+		'''
+		Waits until classifierLoader has finished. Returns True if the camera was opened, or False if prepare failed
+		(its error is written to stderr).
+		'''
+		try:
+			self.classifierLoader.join()
+		except Exception as e:
+			sys.stderr.write('Failed to prepare the camera and classifier: %s: %s\n' % (type(e).__name__, e))
+		return CAMERA is not None
+
+	def ready(self):
 		plotter.SCREEN.clear()
-		plotter.SCREEN.draw.text((72, 50), 'Ready!')
-		plotter.SCREEN.draw.text((5, 70), 'Insert paper and press enter')
+		plotter.SCREEN.draw.text((72, 40), 'Ready!')
+		plotter.SCREEN.draw.text((5, 60), 'Insert paper and press enter')
+		plotter.SCREEN.draw.text((22, 80), 'Press up for job stats')
 		plotter.SCREEN.update()
-		plotter.waitButton(buttonType='enter')
+		waiting.waitUntil(lambda: plotter.BUTTON.enter or plotter.BUTTON.up)
+		if plotter.BUTTON.up:
+			plotter.waitButton(buttonType='up', mode='up')
+			return 'stats'
+		plotter.waitButton(buttonType='enter', mode='up')
+		return 'feed'
 
-		# feed and position paper
+	def stats(self):
+		'''Shows the rolling medians and 95th percentiles of the stage times and counters of the last jobs (see telemetry.py).'''
+		title, rows = telemetry.summaryRows(telemetry.loadRecords())
+		plotter.SCREEN.clear()
+		plotter.SCREEN.draw.text((2, 0), title)
+		plotter.SCREEN.draw.text((100, 10), 'med')
+		plotter.SCREEN.draw.text((140, 10), 'p95')
+		for i, (name, median, p95) in enumerate(rows):
+			plotter.SCREEN.draw.text((2, 20 + 9*i), name)
+			plotter.SCREEN.draw.text((100, 20 + 9*i), median)
+			plotter.SCREEN.draw.text((140, 20 + 9*i), p95)
+		plotter.SCREEN.update()
+		plotter.waitButton(buttonType='any')
+		return 'ready'
 
-		plotter.beep('ok')
-		plotter.feedPaper()
-		plotter.gotoXY(plotter.MAX_X, 300)
+	def feed(self):
+		self.telemetry.start()
+		with self.telemetry.stage('feed'):
+			plotter.beep('ok')
+			plotter.feedPaper()
+			plotter.gotoXY(plotter.MAX_X, 300)
+		return 'position'
 
+	def position(self):
 		plotter.beep('ok')
 		plotter.SCREEN.clear()
 		plotter.SCREEN.draw.text((10, 30), 'Please position the sudoku')
@@ -35,115 +266,152 @@ if __name__ == '__main__':
 		plotter.SCREEN.draw.text((12, 90), 'buttons, then press enter')
 		plotter.SCREEN.update()
 
-		cancelOperation = False
-		while True:
-			if plotter.BUTTON.left and (-plotter.ROLLER_MOTOR.position > 0):
-				plotter.ROLLER_MOTOR.run_forever(duty_cycle_sp=100)
-			elif plotter.BUTTON.right and (-plotter.ROLLER_MOTOR.position < plotter.MAX_Y):
-				plotter.ROLLER_MOTOR.run_forever(duty_cycle_sp=-100)
-			elif plotter.BUTTON.enter:
-				plotter.ROLLER_MOTOR.stop()
-				offsetY = plotter.MAX_Y + plotter.ROLLER_MOTOR.position
-				plotter.beep('ok')
-				break
-			elif plotter.BUTTON.backspace:
-				plotter.SCREEN.clear()
-				plotter.SCREEN.draw.text((30, 60), 'Operation cancelled')
-				plotter.SCREEN.update()
-				plotter.unfeedPaper()
-				plotter.beep('warning')
-				plotter.waitButton(buttonType='any')
-				cancelOperation = True
-				break
-			else:
-				plotter.ROLLER_MOTOR.stop()
-		if cancelOperation:
-			continue
-
-		# read sudoku puzzle
+		positioningStart = hardware.clock()
+		self.positioning = True
+		self.rollerStoppedAt = hardware.clock()
+		self.speculation = waiting.waitAsync(self.speculate)
+		try:
+			while True:
+				if plotter.BUTTON.left and (-plotter.ROLLER_MOTOR.position > 0):
+					self.rollerMoving(1)
+					plotter.ROLLER_MOTOR.run_forever(duty_cycle_sp=100)
+				elif plotter.BUTTON.right and (-plotter.ROLLER_MOTOR.position < plotter.MAX_Y):
+					self.rollerMoving(-1)
+					plotter.ROLLER_MOTOR.run_forever(duty_cycle_sp=-100)
+				elif plotter.BUTTON.enter:
+					self.rollerStopped()
+					self.offsetY = plotter.currentXY()[1]
+					plotter.beep('ok')
+					return 'scan'
+				elif plotter.BUTTON.backspace:
+					self.rollerStopped()
+					return 'cancel'
+				else:
+					self.rollerStopped()
+				hardware.sleep(waiting.POLL_INTERVAL)
+		finally:
+			self.positioning = False
+			self.telemetry.add('positioning', hardware.clock() - positioningStart)
+
+	def rollerMoving(self, direction):
+		'''Records that the roller moves in direction (see motionplanner.BacklashModel), which invalidates the frames read before.'''
+		plotter.ROLLER_BACKLASH_MODEL.reset(direction)
+		if self.rollerStoppedAt is not None:
+			if (self.cached is not None) and (self.cached[0] == self.rollerGeneration):
+				self.telemetry.rescanned()
+			self.rollerGeneration += 1
+			self.rollerStoppedAt = None
+
+	def rollerStopped(self):
+		plotter.ROLLER_MOTOR.stop()
+		if self.rollerStoppedAt is None:
+			self.rollerStoppedAt = hardware.clock()
+
+	def speculate(self):
+		'''
+		Reads and solves camera frames while the paper is positioned (runs in a background thread).
+		A frame is only read after the roller has been stopped for SPECULATION_SETTLE_TIME, and only used if the roller
+		did not move while it was read. Once a frame has been solved, no more frames are read until the roller moves again.
+		The camera grabber runs meanwhile, so that a new frame is available as soon as the roller has settled.
+		This thread waits with time.sleep, since hardware.sleep would advance the simulated clock of the main thread.
+		'''
+		if not self.prepared():
+			return
+		CAMERA.startGrabber()
+		try:
+			while self.positioning:
+				generation = self.rollerGeneration
+				stoppedAt = self.rollerStoppedAt
+				if (stoppedAt is None) or (hardware.clock() - stoppedAt < SPECULATION_SETTLE_TIME) or ((self.cached is not None) and (self.cached[0] == generation)):
+					time.sleep(waiting.POLL_INTERVAL)
+					continue
+				with self.telemetry.stage('speculation'):
+					retval, inputImage = CAMERA.latestFrame()
+				if not retval:
+					time.sleep(SPECULATION_RETRY_INTERVAL)
+					continue
+				if (self.rollerGeneration != generation) or (self.rollerStoppedAt is None):
+					continue
+				with self.telemetry.stage('speculation'):
+					error, puzzles = recognize(inputImage, processes=1) # no worker processes are forked from this thread
+				if error is None:
+					self.cached = (generation, puzzles)
+				else:
+					time.sleep(SPECULATION_RETRY_INTERVAL)
+		finally:
+			CAMERA.stopGrabber()
+
+	def scan(self):
+		# wait for the frame being recognized speculatively, if any
+		self.waitSpeculation()
+		if (self.cached is not None) and (self.cached[0] == self.rollerGeneration):
+			self.puzzles = self.cached[1]
+			return 'plot'
 
 		plotter.SCREEN.clear()
 		plotter.SCREEN.draw.text((65, 60), 'Scanning...')
 		plotter.SCREEN.update()
-		cam = cv2.VideoCapture(plotter.WEBCAM_NUMBER)
-		retval, inputImage = cam.read()
+		if not self.prepared():
+			self.error = ('Startup failed, see log', 20, 'error')
+			return 'fail'
+		with self.telemetry.stage('capture'):
+			retval, inputImage = CAMERA.latestFrame()
 		if not retval:
-			plotter.SCREEN.clear()
-			plotter.SCREEN.draw.text((10, 60), 'Failed to access camera #' + str(plotter.WEBCAM_NUMBER))
-			plotter.SCREEN.update()
-			plotter.unfeedPaper()
-			plotter.beep('error')
-			plotter.waitButton(buttonType='any')
-			continue
+			self.error = ('Failed to access camera #' + str(plotter.WEBCAM_NUMBER), 10, 'error')
+			return 'fail'
 
 		plotter.SCREEN.clear()
 		plotter.SCREEN.draw.text((37, 60), 'Processing image...')
 		plotter.SCREEN.update()
-		retval, sudoku, processedImage, sudokuPosition = sudokucapture.read(inputImage)
-		if not retval:
-			plotter.SCREEN.clear()
-			plotter.SCREEN.draw.text((10, 60), 'Sudoku puzzle not detected')
-			plotter.SCREEN.update()
-			plotter.unfeedPaper()
-			plotter.beep('warning')
-			plotter.waitButton(buttonType='any')
-			continue
+		error, self.puzzles = recognize(inputImage, jobTelemetry=self.telemetry)
+		if error is not None:
+			self.error = (error, 10 if error == 'Sudoku puzzle not detected' else 35, 'warning')
+			return 'fail'
+		return 'plot'
 
-		cam.release()
+	def plot(self):
+		# show first solved sudoku on screen, then plot all solved sudokus
+		showSudoku(self.puzzles[0][0])
+		with self.telemetry.stage('plot'):
+			for solvedSudoku, originalSudoku, sudokuPosition in self.puzzles:
+				plotSudoku(solvedSudoku, originalSudoku, sudokuPosition, self.offsetY)
 
-		# solve sudoku
+			plotter.unfeedPaper()
+			plotter.reset()
+		self.telemetry.finish('done')
+		plotter.beep('done')
+		return 'done'
 
-		originalSudoku = deepcopy(sudoku)
+	def cancel(self):
 		plotter.SCREEN.clear()
-		plotter.SCREEN.draw.text((65, 60), 'Solving...')
+		plotter.SCREEN.draw.text((30, 60), 'Operation cancelled')
 		plotter.SCREEN.update()
-		retval, solvedSudoku = sudokusolver.solve(sudoku)
-		if not retval:
-			plotter.SCREEN.clear()
-			plotter.SCREEN.draw.text((35, 60), 'Solution not found')
-			plotter.SCREEN.update()
-			plotter.unfeedPaper()
-			plotter.beep('warning')
-			plotter.waitButton(buttonType='any')
-			continue
-
-		# show solved sudoku on screen
+		plotter.unfeedPaper()
+		self.telemetry.finish('cancelled')
+		plotter.beep('warning')
+		plotter.waitButton(buttonType='any')
+		return 'done'
 
+	def fail(self):
+		message, textX, beepType = self.error
 		plotter.SCREEN.clear()
-		lineY = 8
-		for i in range(3):
-			for l in range(3):
-				b = i*3 + l
-				line = ''
-				for j in range(3):
-					for k in range(3):
-						c = j*3 + k
-						line += str(solvedSudoku[b][c])
-						if k < 2:
-							line += ' '
-					if j < 2:
-						line += ' | '
-				plotter.SCREEN.draw.text((26, lineY), line)
-				lineY += 10
-			if i < 2:
-				plotter.SCREEN.draw.text((24, lineY), '----------------------')
-				lineY += 10
+		plotter.SCREEN.draw.text((textX, 60), message)
 		plotter.SCREEN.update()
+		plotter.unfeedPaper()
+		self.telemetry.finish('failed', message)
+		plotter.beep(beepType)
+		plotter.waitButton(buttonType='any')
+		return 'done'
 
-		# calculate positions of digits
 
-		sudokuTopLeftX, sudokuTopLeftY = plotter.convertCameraCoordinates(sudokuPosition[0][0], sudokuPosition[0][1])
-		sudokuBottomLeftX, sudokuBottomLeftY = plotter.convertCameraCoordinates(sudokuPosition[1][0], sudokuPosition[1][1])
-		sudokuBottomRightX, sudokuBottomRightY = plotter.convertCameraCoordinates(sudokuPosition[2][0], sudokuPosition[2][1])
-		sudokuTopRightX, sudokuTopRightY = plotter.convertCameraCoordinates(sudokuPosition[3][0], sudokuPosition[3][1])
+if __name__ == '__main__':
 
-		sudokuX = (sudokuTopLeftX + sudokuBottomLeftX) / 2.0
-		sudokuY = (sudokuTopLeftY + sudokuTopRightY) / 2.0 + offsetY
-		sudokuWidth = (sudokuTopRightX + sudokuBottomRightX - sudokuTopLeftX - sudokuBottomLeftX) / 2.0
-		sudokuHeight = (sudokuBottomLeftY + sudokuBottomRightY - sudokuTopLeftY - sudokuTopRightY) / 2.0
-		
-		plotter.printGrid(plotter.sudokuToGrid(solvedSudoku, originalSudoku), sudokuX, sudokuY, sudokuWidth, sudokuHeight)
+	logStartupTime('import plotter', time.time() - STARTUP_TIME)
+	classifierLoader = waiting.waitAsync(prepare)
+	plotter.beep('starting')
+	timed('reset', plotter.reset)
+	plotter.beep('ready')
+	logStartupTime('ready', time.time() - STARTUP_TIME)
 
-		plotter.unfeedPaper()
-		plotter.reset()
-		plotter.beep('done')
+	while True:
+		Job(classifierLoader).run()
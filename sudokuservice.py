@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+
+'''
+This module runs a local HTTP service which reads and solves sudoku puzzles, so that several programs can share
+one process with warm classifiers instead of reloading the datasets on every run.
+Requests are handled by a pool of worker processes, each of which loads the classifiers once when it starts.
+
+Requests (POST, the response is a JSON object which always contains 'timings' in seconds):
+- /sudoku: the body is an encoded image (e.g. PNG or JPEG). Optional query parameters: dataset (default sudoku_digits),
+  multiGrid (1 to read all puzzles in the image), size (rows of the grids, default 9) and solve (0 to skip solving).
+  Returns 'puzzles', a list with, for each puzzle found: 'grid', 'confidence' (fraction of nearest neighbours which
+  agree with each digit, see sudokucapture.classifyGrids), 'corners', 'solved' and 'solution' (null if not solved).
+- /digits: the body is an encoded image of free-standing digits (see digitcapture.py). Optional query parameter: dataset
+  (default handwritten_digits). Returns 'digits'.
+- /solve: the body is a puzzle in any format accepted by sudokusolver.parsePuzzle. Returns 'grid', 'solved' and 'solution'.
+Errors are returned with HTTP status 400 (invalid request) or 500 (failed task, e.g. a dataset without files) and an
+'error' message.
+
+The service only listens on localhost. Use the request function (or run this module as a client) to send requests.
+'''
+
+import numpy as np
+import cv2, sys, time, json, argparse, urllib, urllib2, urlparse, multiprocessing
+import BaseHTTPServer, SocketServer
+import trainingdata, sudokucapture, digitcapture, sudokusolver
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8093
+DEFAULT_DATASETS = ['sudoku_digits', 'handwritten_digits'] # classifiers loaded by each worker when it starts
+MAX_REQUEST_SIZE = 16*1024*1024 # bytes
+
+class RequestError(Exception):
+	'''Raised by a worker task when a request cannot be processed, e.g. when the image cannot be decoded.'''
+	pass
+
+def warmUp(datasets):
+	'''Worker process initializer: loads the classifiers of datasets.'''
+	for dataset in datasets:
+		try:
+			sudokucapture.loadClassifier(dataset)
+		except IOError:
+			pass # dataset not available, requests using it will fail
+
+def decodeImage(data):
+	'''Decodes an encoded image (a string of bytes). Raises RequestError if it is not a valid image.'''
+	image = cv2.imdecode(np.frombuffer(data, np.uint8), 1)
+	if image is None:
+		raise RequestError('The request body is not a valid image')
+	return image
+
+def checkDataset(dataset):
+	if dataset not in trainingdata.DATASETS:
+		raise RequestError('Unknown dataset: ' + dataset)
+
+def readSudokuTask(data, dataset, multiGrid, solve, size=9):
+	'''Worker task for /sudoku requests.'''
+	checkDataset(dataset)
+	try:
+		sudokusolver.getLayout(size)
+		sudokucapture.checkDataset(dataset, size)
+	except ValueError as e:
+		raise RequestError(str(e))
+	timings = {}
+	start = time.time()
+	image = decodeImage(data)
+	timings['decode'] = time.time() - start
+
+	start = time.time()
+	processedImage = sudokucapture.preprocessImage(image)
+	grids = sudokucapture.findGrids(processedImage, multiGrid, size)
+	cellLists = [sudokucapture.splitCells(processedImage, grid, size)[1] for grid in grids]
+	sudokus, confidences = sudokucapture.classifyGrids(cellLists, dataset, returnConfidences=True) if len(grids) > 0 else ([], [])
+	timings['read'] = time.time() - start
+
+	start = time.time()
+	puzzles = []
+	for grid, sudoku, confidence in zip(grids, sudokus, confidences):
+		res, solution = sudokusolver.solve(sudoku) if solve else (False, None)
+		puzzles.append({
+			'grid': sudoku.rows(),
+			'confidence': np.round(confidence, 3).tolist(),
+			'corners': grid.tolist(),
+			'solved': bool(res),
+			'solution': solution.rows() if res else None
+		})
+	timings['solve'] = time.time() - start
+	return {'puzzles': puzzles, 'timings': timings}
+
+def readDigitsTask(data, dataset):
+	'''Worker task for /digits requests.'''
+	checkDataset(dataset)
+	timings = {}
+	start = time.time()
+	image = decodeImage(data)
+	timings['decode'] = time.time() - start
+	start = time.time()
+	retval, digits, digitImages = digitcapture.read(image, dataset)
+	timings['read'] = time.time() - start
+	return {'digits': [int(digit) for digit in digits], 'timings': timings}
+
+def solveTask(text):
+	'''Worker task for /solve requests.'''
+	start = time.time()
+	sudoku = sudokusolver.parsePuzzle(text)
+	if sudoku is None:
+		raise RequestError('The request body is not a sudoku puzzle')
+	res, solution = sudokusolver.solve(sudoku)
+	return {
+		'grid': sudoku,
+		'solved': bool(res),
+		'solution': [list(map(int, row)) for row in solution] if res else None,
+		'timings': {'solve': time.time() - start}
+	}
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	'''Passes each request to the server's worker pool.'''
+
+	def do_POST(self):
+		start = time.time()
+		url = urlparse.urlparse(self.path)
+		params = dict(urlparse.parse_qsl(url.query))
+		length = int(self.headers.get('Content-Length', 0))
+		if length > MAX_REQUEST_SIZE:
+			return self.respond(413, {'error': 'Request too large'})
+		body = self.rfile.read(length)
+
+		if url.path == '/sudoku':
+			try:
+				size = int(params.get('size', 9))
+			except ValueError:
+				return self.respond(400, {'error': 'Invalid size: ' + params['size']})
+			task, args = (readSudokuTask, (body, params.get('dataset', 'sudoku_digits'), params.get('multiGrid') == '1', params.get('solve') != '0', size))
+		elif url.path == '/digits':
+			task, args = (readDigitsTask, (body, params.get('dataset', 'handwritten_digits')))
+		elif url.path == '/solve':
+			task, args = (solveTask, (body,))
+		else:
+			return self.respond(404, {'error': 'Unknown request: ' + url.path})
+
+		try:
+			result = self.server.pool.apply(task, args)
+		except RequestError as e:
+			return self.respond(400, {'error': str(e)})
+		except Exception as e:
+			return self.respond(500, {'error': '%s: %s' % (type(e).__name__, e)})
+		result['timings']['total'] = time.time() - start
+		self.respond(200, result)
+
+	def respond(self, status, result):
+		body = json.dumps(result)
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		if self.server.verbose:
+			BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+class Server(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	'''HTTP server which handles each connection in a thread, and processes requests in a pool of worker processes.'''
+	daemon_threads = True
+
+	def __init__(self, port=DEFAULT_PORT, processes=None, datasets=DEFAULT_DATASETS, verbose=False):
+		BaseHTTPServer.HTTPServer.__init__(self, (DEFAULT_HOST, port), RequestHandler)
+		self.pool = multiprocessing.Pool(processes, initializer=warmUp, initargs=(datasets,))
+		self.verbose = verbose
+
+	def server_close(self):
+		BaseHTTPServer.HTTPServer.server_close(self)
+		self.pool.terminate()
+		self.pool.join()
+
+def request(path, body, port=DEFAULT_PORT, **params):
+	'''
+	Sends a request to the service (see the module description) and returns the decoded JSON response.
+	Raises RuntimeError with the service's error message if the request failed.
+	'''
+	url = 'http://%s:%d%s' % (DEFAULT_HOST, port, path)
+	if len(params) > 0:
+		url += '?' + urllib.urlencode(params)
+	try:
+		response = urllib2.urlopen(urllib2.Request(url, body, {'Content-Type': 'application/octet-stream'}))
+	except urllib2.HTTPError as e:
+		raise RuntimeError(json.loads(e.read()).get('error', str(e)))
+	return json.loads(response.read())
+
+
+if __name__ == '__main__':
+
+	parser = argparse.ArgumentParser(description='Local sudoku reading and solving service.')
+	parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+	subparsers = parser.add_subparsers(dest='command')
+	serveParser = subparsers.add_parser('serve', help='run the service')
+	serveParser.add_argument('--processes', type=int, default=None, help='worker processes (default: one per CPU core)')
+	serveParser.add_argument('--datasets', nargs='+', default=DEFAULT_DATASETS, choices=trainingdata.DATASETS)
+	serveParser.add_argument('--verbose', action='store_true')
+	readParser = subparsers.add_parser('read', help='read (and solve) the sudoku puzzles in an image file')
+	readParser.add_argument('image')
+	readParser.add_argument('--multi-grid', action='store_true')
+	readParser.add_argument('--size', type=int, default=9, help='rows of the sudoku grids (default: 9)')
+	solveParser = subparsers.add_parser('solve', help='solve the puzzles in a puzzle file (see data/testpuzzles.txt)')
+	solveParser.add_argument('puzzles')
+	args = parser.parse_args()
+
+	if args.command == 'serve':
+		server = Server(args.port, args.processes, args.datasets, args.verbose)
+		print 'Listening on http://%s:%d' % (DEFAULT_HOST, args.port)
+		try:
+			server.serve_forever()
+		except KeyboardInterrupt:
+			pass
+		finally:
+			server.server_close()
+
+	elif args.command == 'read':
+		with open(args.image, 'rb') as f:
+			result = request('/sudoku', f.read(), args.port, multiGrid=int(args.multi_grid), size=args.size)
+		for puzzle in result['puzzles']:
+			print 'Sudoku puzzle (lowest confidence %.2f):' % min(map(min, puzzle['confidence']))
+			sudokusolver.printGrid(puzzle['grid'])
+			if puzzle['solved']:
+				print 'Solution:'
+				sudokusolver.printGrid(puzzle['solution'])
+			else:
+				print 'No solution!'
+		if len(result['puzzles']) == 0:
+			print 'Sudoku puzzle not found in input image.'
+		print 'Timings: ' + ', '.join('%s %.3f s' % item for item in sorted(result['timings'].items()))
+
+	else:
+		for puzzle in sudokusolver.loadPuzzles(args.puzzles):
+			result = request('/solve', ' '.join(str(value) for row in puzzle for value in row), args.port)
+			if result['solved']:
+				sudokusolver.printGrid(result['solution'])
+			else:
+				print 'No solution!'
+			print 'Solved in %.3f s (%.3f s total)' % (result['timings']['solve'], result['timings']['total'])
+			print
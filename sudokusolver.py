@@ -2,128 +2,533 @@
 
 '''
 This module contains a solver for sudoku puzzles.
-The sudoku grid format used by this module is a list of list (9x9) of integer.
-A blank cell is denoted by 0.
+The sudoku grid format used by this module is a list of list (size x size) of integer, where size is the square of the
+box size: 9 for standard puzzles, 16 or 25 for larger variants. A blank cell is denoted by 0.
+Grids can also be sudokugrid.SudokuGrid objects, as read by sudokucapture; grids returned for them are SudokuGrids too.
+Internally, grids are flat lists of size*size digits (cell index row*size + col), with the candidate digits of each
+empty cell and the digits placed in each unit stored as bitmasks (bit d set for digit d), so that a search node is
+copied with a few flat list copies instead of a deepcopy.
 '''
 
-import sys
-from copy import deepcopy
+import numpy as np
+import re, sys, math, time, itertools, multiprocessing
+from sudokugrid import SudokuGrid
 
-def getBoxIndex(row, col):
+DEFAULT_SIZE = 9 # size of standard sudoku grids
+PUZZLE_SIZES = (4, 9, 16, 25) # grid sizes recognized by parsePuzzle
+DIAGNOSIS_MAX_SUSPECTS = 2 # maximum number of givens changed by diagnose
+DIAGNOSIS_TIME_LIMIT = 1.0 # seconds diagnose may spend on its trials before it gives up
+DIFFICULTIES = ['easy', 'medium', 'hard', 'expert'] # names of the difficulty levels returned by rate
+
+class Layout(object):
+	'''
+	Lookup tables of size x size grids (cell index row*size + col): units (the rows, then the columns, then the boxes,
+	as lists of cell indices), unitsOf (the row, column and box unit of each cell), peers (the other cells which share
+	a unit with each cell) and the intersections of lines and boxes used by _eliminateLocked.
+	Use getLayout, which builds the tables of each size once.
+	'''
+
+	def __init__(self, size):
+		boxSize = int(round(math.sqrt(size)))
+		if (boxSize < 2) or (boxSize*boxSize != size):
+			raise ValueError('Invalid sudoku size: ' + str(size))
+		self.size = size
+		self.boxSize = boxSize
+		self.cellCount = size*size
+		self.digits = range(1, size+1)
+		self.allDigits = (1 << (size+1)) - 2 # bits 1 to size
+		self.digitOf = dict((1 << d, d) for d in self.digits) # digit of a single-bit mask
+		self.units = [[r*size + c for c in range(size)] for r in range(size)]
+		self.units += [[r*size + c for r in range(size)] for c in range(size)]
+		self.units += [[r*size + c for r, c in getBoxCells(b, size)] for b in range(size)]
+		self.unitsOf = [(i//size, size + i%size, 2*size + getBoxIndex(i//size, i%size, size)) for i in range(self.cellCount)]
+		self.peers = [sorted(set(j for u in self.unitsOf[i] for j in self.units[u]) - set([i])) for i in range(self.cellCount)]
+		self.unitMatrix = np.array(self.units) # units as a numpy index array
+
+		# intersections of a line (row or column) with a box: (cells, other cells of the line, other cells of the box),
+		# and the partitions of each unit into intersections (partitionMatrix: lines first, then boxes by rows and by columns)
+		self.intersections = []
+		linePartitions = []
+		boxPartitions = [([], []) for b in range(size)]
+		for line in range(2*size):
+			lineCells = self.units[line]
+			lineIntersections = []
+			for k in range(boxSize):
+				cells = lineCells[k*boxSize:(k+1)*boxSize]
+				box = self.unitsOf[cells[0]][2] - 2*size
+				boxPartitions[box][line // size].append(len(self.intersections))
+				lineIntersections.append(len(self.intersections))
+				self.intersections.append((cells, [i for i in lineCells if i not in cells], [i for i in self.units[2*size + box] if i not in cells]))
+			linePartitions.append(lineIntersections)
+		self.intersectionMatrix = np.array([cells for cells, lineRest, boxRest in self.intersections])
+		self.partitionMatrix = np.array(linePartitions + [intersections for lines in boxPartitions for intersections in lines])
+		# position of each intersection in the flattened partitionMatrix, in the partition of its line and of its box
+		count = len(self.intersections)
+		self.linePositions = np.argsort(self.partitionMatrix.ravel()[:count])
+		self.boxPositions = count + np.argsort(self.partitionMatrix.ravel()[count:])
+
+_layouts = {}
+
+def getLayout(size=DEFAULT_SIZE):
+	'''Returns the Layout of size x size grids. Raises ValueError if size is not the square of a box size.'''
+	if size not in _layouts:
+		_layouts[size] = Layout(size)
+	return _layouts[size]
+
+def getBoxIndex(row, col, size=DEFAULT_SIZE):
 	'''Returns the box index of a cell (0-based).'''
-	return 3*(row//3) + (col//3)
+	boxSize = int(round(math.sqrt(size)))
+	return boxSize*(row//boxSize) + (col//boxSize)
 
-def getBoxCells(index):
+def getBoxCells(index, size=DEFAULT_SIZE):
 	'''Returns an array of a box's cell coordinates.'''
+	boxSize = int(round(math.sqrt(size)))
 	res = []
-	for i in range(3):
-		for j in range(3):
-			res.append((i+3*(index//3),j+3*(index%3)))
+	for i in range(boxSize):
+		for j in range(boxSize):
+			res.append((i+boxSize*(index//boxSize),j+boxSize*(index%boxSize)))
 	return res
 
+def _flatten(sudoku):
+	if isinstance(sudoku, SudokuGrid):
+		return list(sudoku.cells)
+	return [int(value) for row in sudoku for value in row]
+
+def _grid(cells, size, like=None):
+	'''Returns flat cells as a grid, of the same type as the grid like (a SudokuGrid or a list of list).'''
+	if isinstance(like, SudokuGrid):
+		return SudokuGrid(cells, size)
+	return [cells[r*size:(r+1)*size] for r in range(size)]
+
+def parsePuzzle(text, size=None):
+	'''
+	Parses a sudoku puzzle from text, in any of the formats used in data/testpuzzles*.txt: rows of space-separated
+	numbers, a single line of digits, or rows of digits with '.' for blanks and '|', '-', '+' box separators.
+	Numbers of grids larger than 9x9 can have 2 digits, so their cells must be separated (e.g. '12 . 7 16').
+	The grid size is inferred from the number of cells (see PUZZLE_SIZES) unless size is given.
+	Returns a sudoku grid, or None if text is not a puzzle (of the given size).
+	'''
+	sizes = PUZZLE_SIZES if size is None else (size,)
+	values = [0 if token == '.' else int(token) for token in re.findall(r'\d+|\.', text)]
+	if not any(len(values) == s*s for s in sizes):
+		# single digit cells do not need separators
+		values = [0 if char == '.' else int(char) for char in text if char.isdigit() or char == '.']
+	for s in sizes:
+		if (len(values) == s*s) and (max(values) <= s):
+			return _grid(values, s)
+	return None
+
+def loadPuzzles(path):
+	'''Loads sudoku puzzles from a text file, separated by blank lines (see parsePuzzle). Returns a list of sudoku grids.'''
+	with open(path) as f:
+		blocks = f.read().replace('\r', '').split('\n\n')
+	puzzles = [parsePuzzle(block) for block in blocks]
+	return [puzzle for puzzle in puzzles if puzzle is not None]
+
+def formatPuzzle(sudoku):
+	'''Formats a sudoku grid as rows of space-separated numbers (see parsePuzzle), aligned for grids larger than 9x9.'''
+	width = len(str(len(sudoku)))
+	return '\n'.join(' '.join(str(value).rjust(width) for value in row) for row in sudoku)
+
 def printGrid(sudoku):
 	'''Prints a sudoku grid.'''
-	for r in range(9):
-		print sudoku[r]
+	for row in sudoku:
+		print row
 
-def reduce(sudoku):
+def _assign(layout, cells, candidates, placed, i, digit, pending):
+	'''
+	Places digit in cell i: marks it as placed in the units of i (placed is the bitmask of the digits placed in each
+	unit), and removes it from the candidates of the peers of i. Empty cells left with a single candidate (naked singles)
+	are appended to pending. Returns False if digit is already placed in a unit of i, or if a peer is left without
+	candidates.
 	'''
-	Iteratively fills empty cells in the sudoku grid if there is only 1 digit possibility for that cell.
-	Returns False if the given sudoku grid is found to be invalid.
-	'''
-	# Processes input digits, removes that digit from the row, column, and box available digit list
-	available = [[range(1,10) for c in range(9)] for r in range(9)]
-	for r in range(9):
-		for c in range(9):
-			if sudoku[r][c] > 0:
-				if sudoku[r][c] in available[r][c]:
-					available[r][c] = []
-					for i in range(9):
-						if sudoku[r][c] in available[i][c]:
-							available[i][c].remove(sudoku[r][c])
-						if sudoku[r][c] in available[r][i]:
-							available[r][i].remove(sudoku[r][c])
-					for i,j in getBoxCells(getBoxIndex(r,c)):
-						if sudoku[r][c] in available[i][j]:
-							available[i][j].remove(sudoku[r][c])
-				else:
-					return (False,[])
-	# Finds a cell with only 1 possible digit and fills it with that digit, then repeat until no more such cells are found
+	bit = 1 << digit
+	for u in layout.unitsOf[i]:
+		if placed[u] & bit:
+			return False
+		placed[u] |= bit
+	cells[i] = digit
+	candidates[i] = 0
+	for j in layout.peers[i]:
+		mask = candidates[j]
+		if mask & bit:
+			mask ^= bit
+			candidates[j] = mask
+			if mask == 0:
+				return False
+			if mask & (mask-1) == 0:
+				pending.append(j)
+	return True
+
+def _propagate(layout, cells, candidates, placed, pending):
+	'''
+	Fills naked singles (see _assign) and hidden singles (digits which fit in only one cell of a unit), and removes
+	locked candidates (see _eliminateLocked), until there are none left.
+	Returns False if the grid is found to have no solution.
+	'''
+	digitOf = layout.digitOf
 	while True:
-		added = False
-		for r in range(9):
-			for c in range(9):
-				if (sudoku[r][c] == 0) and (len(available[r][c]) == 1):
-					added = True
-					sudoku[r][c] = available[r][c][0]
-					for i in range(9):
-						if sudoku[r][c] in available[i][c]:
-							available[i][c].remove(sudoku[r][c])
-						if sudoku[r][c] in available[r][i]:
-							available[r][i].remove(sudoku[r][c])
-					for i,j in getBoxCells(getBoxIndex(r,c)):
-						if sudoku[r][c] in available[i][j]:
-							available[i][j].remove(sudoku[r][c])
-				elif (sudoku[r][c] == 0) and (len(available[r][c]) == 0):
-					return (False, [])
-		if not added:
-			return (True, available)
+		while len(pending) > 0:
+			i = pending.pop()
+			if (cells[i] == 0) and not _assign(layout, cells, candidates, placed, i, digitOf[candidates[i]], pending):
+				return False
+		masks = np.array(candidates)
+		if not _findHiddenSingles(layout, masks, candidates, placed, pending):
+			return False
+		if len(pending) == 0:
+			eliminated = _eliminateLocked(layout, masks, candidates, pending)
+			if eliminated is None:
+				return False
+			if not eliminated:
+				return True
+
+def _findHiddenSingles(layout, masks, candidates, placed, pending):
+	'''
+	Sets the candidates of the cells which are the only place for a digit in one of their units to that digit, and
+	appends them to pending. masks is candidates as a numpy array, all units are checked at once.
+	Returns False if a digit does not fit anywhere in a unit, or if two digits only fit in the same cell.
+	'''
+	unitMasks = masks[layout.unitMatrix]
+	before = np.bitwise_or.accumulate(unitMasks, axis=1)
+	once = before[:, -1]
+	twice = np.bitwise_or.reduce(unitMasks[:, 1:] & before[:, :-1], axis=1)
+	if np.any((once | np.array(placed)) != layout.allDigits):
+		return False
+	hidden = once & ~twice
+	for u in np.flatnonzero(hidden):
+		digits = int(hidden[u])
+		for i in layout.units[u]:
+			bit = candidates[i] & digits
+			if bit != 0:
+				if bit & (bit-1) != 0:
+					return False
+				candidates[i] = bit
+				pending.append(i)
+	return True
+
+def _eliminateLocked(layout, masks, candidates, pending):
+	'''
+	Removes locked candidates: if a digit only fits in the intersection of a box and a line (row or column) within one
+	of them, it cannot be anywhere else in the other. masks is candidates as a numpy array.
+	Cells left with a single candidate are appended to pending.
+	Returns whether a candidate was removed, or None if a cell is left without candidates.
+	'''
+	# candidates of each intersection, grouped by the unit they partition
+	partitions = np.bitwise_or.reduce(masks[layout.intersectionMatrix], axis=1)[layout.partitionMatrix]
+	before = np.bitwise_or.accumulate(partitions, axis=1)
+	after = np.bitwise_or.accumulate(partitions[:, ::-1], axis=1)[:, ::-1]
+	others = np.zeros_like(partitions)
+	others[:, 1:] |= before[:, :-1]
+	others[:, :-1] |= after[:, 1:]
+	locked = (partitions & ~others).ravel()
+	others = others.ravel()
+	# digits locked in an intersection within its box are removed from the rest of its line, and vice versa
+	pointing = locked[layout.boxPositions] & others[layout.linePositions]
+	claiming = locked[layout.linePositions] & others[layout.boxPositions]
+	eliminated = False
+	for removed, outside in ((pointing, 1), (claiming, 2)):
+		for k in np.flatnonzero(removed):
+			digits = int(removed[k])
+			for j in layout.intersections[k][outside]:
+				mask = candidates[j]
+				if mask & digits:
+					mask &= ~digits
+					candidates[j] = mask
+					eliminated = True
+					if mask == 0:
+						return None
+					if mask & (mask-1) == 0:
+						pending.append(j)
+	return eliminated
+
+def _start(layout, cells):
+	'''Returns (cells, candidates, placed) of a flat grid after propagation, or None if the givens contradict each other.'''
+	start = [0]*layout.cellCount
+	candidates = [layout.allDigits]*layout.cellCount
+	placed = [0]*len(layout.units)
+	pending = []
+	for i in range(layout.cellCount):
+		digit = cells[i]
+		if digit != 0:
+			if not (0 < digit <= layout.size) or not _assign(layout, start, candidates, placed, i, digit, pending):
+				return None
+	if not _propagate(layout, start, candidates, placed, pending):
+		return None
+	return (start, candidates, placed)
+
+class _DeadlineExceeded(Exception):
+	'''Raised by _search and _countFlat when their deadline has passed.'''
+	pass
+
+def _search(layout, cells, candidates, placed, limit, solutions, deadline=None):
+	'''
+	Depth-first search from a propagated grid, branching on the empty cell with the fewest candidates, or on the cells
+	of a unit where a digit fits if there are fewer of them.
+	Appends the solutions found to solutions (as flat grids), until there are limit solutions.
+	If a deadline (time.time value) is given, _DeadlineExceeded is raised when a node is explored after it.
+	Returns the number of search nodes explored.
+	'''
+	if (deadline is not None) and (time.time() > deadline):
+		raise _DeadlineExceeded()
+	nodes = 1
+	best, bestCount = (-1, layout.size+1)
+	for i in range(layout.cellCount):
+		if cells[i] == 0:
+			count = bin(candidates[i]).count('1')
+			if count < bestCount:
+				best, bestCount = (i, count)
+				if count <= 2:
+					break
+	if best < 0:
+		solutions.append(cells)
+		return nodes
+	choices = [(best, digit) for digit in layout.digits if candidates[best] & (1 << digit)]
+	if bestCount > 2:
+		# a digit which fits in fewer cells of a unit gives fewer branches
+		for u in range(len(layout.units)):
+			for digit in layout.digits:
+				bit = 1 << digit
+				if placed[u] & bit == 0:
+					places = [i for i in layout.units[u] if candidates[i] & bit]
+					if len(places) < len(choices):
+						choices = [(i, digit) for i in places]
+	for i, digit in choices:
+		trialCells, trialCandidates, trialPlaced, pending = (list(cells), list(candidates), list(placed), [])
+		if _assign(layout, trialCells, trialCandidates, trialPlaced, i, digit, pending) and _propagate(layout, trialCells, trialCandidates, trialPlaced, pending):
+			nodes += _search(layout, trialCells, trialCandidates, trialPlaced, limit, solutions, deadline)
+			if len(solutions) >= limit:
+				return nodes
+	return nodes
+
+def _countFlat(layout, cells, limit, deadline=None):
+	'''countSolutions for a flat grid, with the deadline of _search. Returns (count, first solution as a flat grid or None).'''
+	if (deadline is not None) and (time.time() > deadline):
+		raise _DeadlineExceeded()
+	state = _start(layout, cells)
+	if state is None:
+		return (0, None)
+	solutions = []
+	_search(layout, state[0], state[1], state[2], limit, solutions, deadline)
+	return (len(solutions), solutions[0] if len(solutions) > 0 else None)
+
+def reduce(sudoku):
+	'''
+	Fills the empty cells of the sudoku grid which only have 1 possible digit, or which are the only place for a digit
+	in their row, column or box, until no more such cells are found.
+	Returns (True, available), where available lists the possible digits of each empty cell,
+	or (False, []) if the given sudoku grid is found to be invalid.
+	'''
+	layout = getLayout(len(sudoku))
+	state = _start(layout, _flatten(sudoku))
+	if state is None:
+		return (False, [])
+	cells, candidates, placed = state
+	size = layout.size
+	available = [[[] for c in range(size)] for r in range(size)]
+	for i in range(layout.cellCount):
+		r, c = divmod(i, size)
+		if isinstance(sudoku, SudokuGrid):
+			sudoku[r, c] = cells[i]
+		else:
+			sudoku[r][c] = cells[i]
+		available[r][c] = [d for d in layout.digits if candidates[i] & (1 << d)]
+	return (True, available)
 
 def isValid(sudoku):
 	'''Checks whether a sudoku grid is a valid sudoku puzzle.'''
-	if len(sudoku) == 9:
-		for r in range(9):
-			if validInput and (len(sudoku[r]) == 9):
-				for c in range(9):
-					if sudoku[r][c] not in range(10):
-						validInput = False
-						break
-			else:
-				return False
-		validReduce, reduceResult = reduce(sudoku)
-		return validReduce
-	else:
+	try:
+		layout = getLayout(len(sudoku))
+	except ValueError:
 		return False
+	for row in sudoku:
+		if (len(row) != layout.size) or any(value not in range(layout.size+1) for value in row):
+			return False
+	return _start(layout, _flatten(sudoku)) is not None
 
 def solve(sudoku):
-	'''Solves a sudoku puzzle using DFS.'''
-	# Try to reduce the puzzle
-	valid, available = reduce(sudoku)
-	if not valid:
+	'''
+	Solves a sudoku puzzle using constraint propagation and DFS. sudoku is not modified.
+	Returns (True, solution), or (False, []) if there is no solution.
+	'''
+	layout = getLayout(len(sudoku))
+	count, solution = _countFlat(layout, _flatten(sudoku), 1)
+	if count == 0:
 		return (False, [])
+	return (True, _grid(solution, layout.size, sudoku))
+
+def countSolutions(sudoku, limit=2):
+	'''
+	Counts the solutions of a sudoku puzzle, stopping at limit (e.g. limit=2 tells whether the solution is unique).
+	Returns (count, solution), where solution is the first solution found (None if there is none).
+	'''
+	layout = getLayout(len(sudoku))
+	count, solution = _countFlat(layout, _flatten(sudoku), limit)
+	if solution is not None:
+		solution = _grid(solution, layout.size, sudoku)
+	return (count, solution)
+
+def findConflicts(sudoku):
+	'''Returns the pairs of givens ((row, col) tuples) which have the same digit in the same row, column or box.'''
+	layout = getLayout(len(sudoku))
+	return [(divmod(i, layout.size), divmod(j, layout.size)) for i, j in _conflicts(layout, _flatten(sudoku))]
+
+def _conflicts(layout, cells):
+	units = [[[] for d in range(layout.size+1)] for u in layout.units]
+	for i in range(layout.cellCount):
+		if 0 < cells[i] <= layout.size: # out of range givens conflict with nothing (see diagnose)
+			for u in layout.unitsOf[i]:
+				units[u][cells[i]].append(i)
+	return sorted(set(pair for unit in units for unitCells in unit for pair in itertools.combinations(unitCells, 2)))
 
-	# Check whether the puzzle is solved already
-	solved = True
-	for r in range(9):
-		for c in range(9):
-			if sudoku[r][c] == 0:
-				solved = False
+def diagnose(sudoku, maxSuspects=DIAGNOSIS_MAX_SUSPECTS, confidences=None, timeLimit=DIAGNOSIS_TIME_LIMIT):
+	'''
+	Finds the smallest sets of givens which, removed or replaced by other digits, make sudoku consistent and uniquely
+	solvable, e.g. to correct digits misread by sudokucapture. Sets of up to maxSuspects givens are tried.
+	If some givens conflict (the same digit twice in a row, column or box), only sets which contain a given of every
+	conflicting pair are tried. Givens outside 1..size (failed reads) are in every set, so none is tried if there are
+	more than maxSuspects of them. Replacement digits must not repeat a given in the same row, column or box, and are
+	only tried for single suspects, or for sets of suspects covering conflicts or failed reads.
+	If confidences (same size as sudoku, see sudokucapture.classifyGrids) are given, fixes of the least confident givens
+	come first.
+	Returns a list of (changes, solution) fixes, where changes is a list of (row, col, digit) with the correct digit
+	of each suspect given according to solution. Returns [([], solution)] if sudoku already has a unique solution,
+	and [] if no fix was found. A badly misread grid can take hundreds of trials, so diagnose gives up after timeLimit
+	seconds (None for no limit) and also returns [] then, since the fixes found so far may not be all of them.
+	'''
+	layout = getLayout(len(sudoku))
+	size = layout.size
+	cells = _flatten(sudoku)
+	invalid = tuple(i for i in range(layout.cellCount) if not (0 <= cells[i] <= size))
+	for i in invalid:
+		cells[i] = 0
+	givens = [i for i in range(layout.cellCount) if cells[i] != 0]
+	conflicts = _conflicts(layout, cells)
+	deadline = time.time() + timeLimit if timeLimit is not None else None
+	try:
+		if (len(conflicts) == 0) and (len(invalid) == 0):
+			count, solution = _countFlat(layout, cells, 2, deadline)
+			if count == 1:
+				return [([], _grid(solution, size, sudoku))]
+
+		# number of givens of each digit in each unit, updated as suspects are removed
+		counts = [[0]*(size+1) for u in layout.units]
+		for i in givens:
+			for u in layout.unitsOf[i]:
+				counts[u][cells[i]] += 1
+
+		fixes = []
+		for suspectCount in range(max(1, len(invalid)), maxSuspects + 1):
+			for others in itertools.combinations(givens, suspectCount - len(invalid)):
+				suspects = invalid + others
+				if not all((i in suspects) or (j in suspects) for i, j in conflicts):
+					continue
+				trial = list(cells)
+				for i in suspects:
+					trial[i] = 0
+				for i in others:
+					for u in layout.unitsOf[i]:
+						counts[u][cells[i]] -= 1
+
+				count, solution = _countFlat(layout, trial, 2, deadline)
+				solutions = [solution] if count == 1 else []
+				if (count >= 2) and ((suspectCount == 1) or (len(conflicts) > 0) or (len(invalid) > 0)):
+					# replacing a suspect can only help if removing it leaves several solutions
+					options = [[d for d in layout.digits if (d != cells[i]) and all(counts[u][d] == 0 for u in layout.unitsOf[i])] for i in suspects]
+					for digits in itertools.product(*options):
+						for i, d in zip(suspects, digits):
+							trial[i] = d
+						count, solution = _countFlat(layout, trial, 2, deadline)
+						if count == 1:
+							solutions.append(solution)
+					for i in suspects:
+						trial[i] = 0
+
+				for i in others:
+					for u in layout.unitsOf[i]:
+						counts[u][cells[i]] += 1
+				for solution in solutions:
+					changes = [(i//size, i%size, solution[i]) for i in suspects]
+					fixes.append((changes, _grid(solution, size, sudoku)))
+			if len(fixes) > 0:
 				break
-	if solved:
-		return (True, sudoku)
-
-	# Finds a cell with the minimum number of possible digits
-	minLength,tryRow,tryCol = (10,0,0)
-	for r in range(9):
-		for c in range(9):
-			if (sudoku[r][c] == 0) and (len(available[r][c]) < minLength):
-				minLength, tryRow, tryCol = (len(available[r][c]), r, c)
-
-	# Recursively tries possible digits
-	for i in available[tryRow][tryCol]:
-		newSudoku = deepcopy(sudoku)
-		newSudoku[tryRow][tryCol] = i
-		res, solution = solve(newSudoku)
-		if res:
-			return (True, solution)
-	return (False, [])
+	except _DeadlineExceeded:
+		return []
+
+	if confidences is not None:
+		fixes.sort(key=lambda fix: sum(confidences[r][c] for r, c, digit in fix[0]))
+	return fixes
+
+def rate(sudoku):
+	'''
+	Rates the difficulty of a sudoku puzzle by the hardest deduction rule needed to solve it (see DIFFICULTIES):
+	0 if naked singles (cells with only 1 possible digit) are enough, 1 if hidden singles (digits which fit in only one
+	cell of a row, column or box) are needed, 2 if locked candidates are needed (see _eliminateLocked), and 3 if the
+	puzzle cannot be solved without search.
+	Returns (level, nodes), where nodes is the number of search nodes explored to solve the puzzle and prove that the
+	solution is unique (0 below level 3), or None if the puzzle has no solution.
+	'''
+	layout = getLayout(len(sudoku))
+	cells = [0]*layout.cellCount
+	candidates = [layout.allDigits]*layout.cellCount
+	placed = [0]*len(layout.units)
+	pending = []
+	for i, digit in enumerate(_flatten(sudoku)):
+		if (digit != 0) and not ((0 < digit <= layout.size) and _assign(layout, cells, candidates, placed, i, digit, pending)):
+			return None
+
+	# apply the easiest rule which makes progress, until the puzzle is solved or no rule applies
+	level = 0
+	while True:
+		while len(pending) > 0:
+			i = pending.pop()
+			if (cells[i] == 0) and not _assign(layout, cells, candidates, placed, i, layout.digitOf[candidates[i]], pending):
+				return None
+		if 0 not in cells:
+			return (level, 0)
+		masks = np.array(candidates)
+		if not _findHiddenSingles(layout, masks, candidates, placed, pending):
+			return None
+		if len(pending) > 0:
+			level = max(level, 1)
+			continue
+		eliminated = _eliminateLocked(layout, masks, candidates, pending)
+		if eliminated is None:
+			return None
+		if not eliminated:
+			break
+		level = 2
+
+	solutions = []
+	nodes = _search(layout, cells, candidates, placed, 2, solutions)
+	if len(solutions) == 0:
+		return None
+	return (3, nodes)
+
+def solveAll(sudokus, processes=None):
+	'''
+	Solves several sudoku puzzles in parallel, using one worker process per CPU core if processes is None.
+	Returns a list of (res, solution) tuples, in the same order as sudokus.
+	'''
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	processes = min(processes, len(sudokus))
+	if processes <= 1:
+		return map(solve, sudokus)
+	pool = multiprocessing.Pool(processes)
+	try:
+		return pool.map(solve, sudokus)
+	finally:
+		pool.close()
+		pool.join()
 
 
 if __name__ == '__main__':
 
 	# Input sudoku puzzle
-	print 'Input sudoku puzzle (space-separated digits, indicate blanks using 0):'
-	inputSudoku = [map(int, raw_input().split()) for r in range(9)]
+	print 'Input sudoku puzzle (rows of space-separated numbers, indicate blanks using 0):'
+	inputSudoku = [map(int, raw_input().split())]
+	while len(inputSudoku) < len(inputSudoku[0]):
+		inputSudoku.append(map(int, raw_input().split()))
 
 	# Check input validity
 	if not isValid(inputSudoku):
@@ -139,4 +544,4 @@ if __name__ == '__main__':
 		print 'Solution:'
 		printGrid(solvedSudoku)
 	else:
-		print "No solution!"
\ No newline at end of file
+		print "No solution!"
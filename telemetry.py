@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+'''
+This module records the telemetry of scan-solve-plot jobs (see sudokuscanner.Job), to find out which stage of a job is
+worth optimizing in the field, and whether a change actually made jobs shorter.
+
+For each job, JobTelemetry records the time spent in each stage (see STAGES), the number of plotter moves and pen lifts
+(see plotter.COUNTERS), the number of rescans (frames which had been solved speculatively, but had to be read again
+because the paper was moved afterwards), and the outcome of the job with the reason it failed.
+Hardware stages (HARDWARE_STAGES) are timed with the hardware clock, which is the simulated clock with the sim backend
+(see hardware.py), and the other stages with time.time. Capture, recognition and solving are timed when they keep the
+operator waiting (after enter is pressed), and the speculation stage is the time spent reading and solving frames in the
+background while the paper is positioned, so the stage times of a job may add up to more than its total time.
+
+Each job is appended as a line of compact JSON to TELEMETRY_FILE, which is rotated when it would exceed
+TELEMETRY_MAX_BYTES (the older records are kept in TELEMETRY_BACKUPS files named TELEMETRY_FILE.1, TELEMETRY_FILE.2...).
+summaryRows summarizes the last TELEMETRY_WINDOW jobs (medians and 95th percentiles) for the summary screen on the brick.
+Run this module directly to print the summary of a log, e.g. one copied from the brick.
+'''
+
+import os, sys, math, time, json, threading
+from contextlib import contextmanager
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__))
+TELEMETRY_FILE = SCRIPT_DIRECTORY + '/telemetry.jsonl'
+TELEMETRY_MAX_BYTES = 64*1024 # a job record takes about 250 bytes
+TELEMETRY_BACKUPS = 2
+TELEMETRY_WINDOW = 20 # jobs summarized by summaryRows
+STAGES = ['feed', 'positioning', 'speculation', 'capture', 'recognition', 'solve', 'plot']
+HARDWARE_STAGES = ('feed', 'positioning', 'plot')
+COUNTERS = ['moves', 'penLifts', 'rescans']
+
+class JobTelemetry(object):
+	'''
+	Telemetry of a job: stage times, counters and outcome (see the module description).
+	counters is a dict of running totals (plotter.COUNTERS), of which the increase between start and finish is recorded.
+	hardwareClock is the clock used to time the hardware stages and the total time of the job (hardware.clock).
+	Stages may be timed from several threads.
+	'''
+
+	def __init__(self, counters=None, hardwareClock=time.time):
+		self.counters = counters if counters is not None else {}
+		self.hardwareClock = hardwareClock
+		self.startTime = None # time.time at which the job started, None if it has not started
+		self.totalTime = None
+		self.stages = {} # seconds spent in each stage
+		self.rescans = 0
+		self.outcome = None # done, cancelled or failed
+		self.reason = None # reason the job failed
+		self._startClock = None
+		self._startCounters = {}
+		self._endCounters = {}
+		self._lock = threading.Lock()
+
+	def start(self):
+		'''Starts the job: its total time and counters are measured from now.'''
+		self.startTime = time.time()
+		self._startClock = self.hardwareClock()
+		self._startCounters = dict(self.counters)
+
+	@contextmanager
+	def stage(self, name):
+		'''Context manager which adds the time spent in its block to stage name.'''
+		clock = self.hardwareClock if name in HARDWARE_STAGES else time.time
+		start = clock()
+		try:
+			yield
+		finally:
+			self.add(name, clock() - start)
+
+	def add(self, name, seconds):
+		'''Adds seconds to the time spent in stage name.'''
+		with self._lock:
+			self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+	def rescanned(self):
+		'''Records that a frame which had been solved has to be read again, because the paper was moved.'''
+		with self._lock:
+			self.rescans += 1
+
+	def finish(self, outcome, reason=None):
+		'''Ends the job with outcome (done, cancelled or failed) and the reason it failed. Only the first call has an effect.'''
+		if (self.startTime is None) or (self.outcome is not None):
+			return
+		self.outcome = outcome
+		self.reason = reason
+		self.totalTime = self.hardwareClock() - self._startClock
+		self._endCounters = dict(self.counters)
+
+	def record(self):
+		'''Returns the job record written to the log. A job which has not finished is recorded as aborted.'''
+		endCounters = self._endCounters if self.outcome is not None else self.counters
+		record = {
+			'time': int(self.startTime),
+			'outcome': self.outcome if self.outcome is not None else 'aborted',
+			'total': round(self.totalTime if self.totalTime is not None else self.hardwareClock() - self._startClock, 3),
+			'stages': dict((name, round(seconds, 3)) for name, seconds in self.stages.items()),
+			'rescans': self.rescans
+		}
+		for name, total in endCounters.items():
+			record[name] = total - self._startCounters.get(name, 0)
+		if self.reason is not None:
+			record['reason'] = self.reason
+		return record
+
+def backupFile(path, index):
+	'''Returns the name of the index-th backup of log file path (the log file itself if index is 0).'''
+	return path if index == 0 else '%s.%d' % (path, index)
+
+def rotate(path=TELEMETRY_FILE):
+	'''Moves log file path to its first backup, and each backup to the next one. The oldest backup is discarded.'''
+	if TELEMETRY_BACKUPS == 0:
+		os.remove(path)
+		return
+	for index in range(TELEMETRY_BACKUPS, 0, -1):
+		if os.path.isfile(backupFile(path, index - 1)):
+			os.rename(backupFile(path, index - 1), backupFile(path, index))
+
+def appendRecord(record, path=TELEMETRY_FILE):
+	'''Appends a job record to log file path, rotating the log first if it would exceed TELEMETRY_MAX_BYTES.'''
+	line = json.dumps(record, separators=(',', ':'), sort_keys=True) + '\n'
+	if os.path.isfile(path) and (os.path.getsize(path) + len(line) > TELEMETRY_MAX_BYTES):
+		rotate(path)
+	with open(path, 'a') as logFile:
+		logFile.write(line)
+
+def loadRecords(count=TELEMETRY_WINDOW, path=TELEMETRY_FILE):
+	'''
+	Returns the last count job records of log file path and its backups, oldest first.
+	Lines which cannot be parsed (e.g. cut off by a power loss while they were written) are skipped.
+	'''
+	records = []
+	for index in range(TELEMETRY_BACKUPS + 1):
+		if (len(records) >= count) or not os.path.isfile(backupFile(path, index)):
+			break
+		fileRecords = []
+		with open(backupFile(path, index)) as logFile:
+			for line in logFile:
+				try:
+					fileRecords.append(json.loads(line))
+				except ValueError:
+					pass
+		records = fileRecords + records
+	return records[-count:] if count > 0 else []
+
+def percentile(values, p):
+	'''Returns the p-th percentile (0-100) of values by the nearest-rank method, or None if values is empty.'''
+	if len(values) == 0:
+		return None
+	values = sorted(values)
+	return values[max(int(math.ceil(p/100.0 * len(values))) - 1, 0)]
+
+def formatValue(value, unit):
+	'''Returns the text of a summary value: seconds (unit s) with 2 decimals below 10 s, or a count (unit d).'''
+	if value is None:
+		return '-'
+	if unit == 'd':
+		return '%d' % value
+	return '%.2f' % value if value < 10 else '%.1f' % value
+
+def summaryRows(records):
+	'''
+	Returns (title, rows) summarizing job records: rows contains (name, median, 95th percentile) text of the total time
+	and the counters of the completed jobs, and of the time of each stage over the jobs which reached it.
+	'''
+	done = [record for record in records if record['outcome'] == 'done']
+	title = '%d jobs, %d done' % (len(records), len(done))
+	series = [('total', 's', [record['total'] for record in done])]
+	for stage in STAGES:
+		series.append((stage, 's', [record['stages'][stage] for record in records if stage in record['stages']]))
+	for counter in COUNTERS:
+		series.append((counter, 'd', [record[counter] for record in done if counter in record]))
+	rows = []
+	for name, unit, values in series:
+		statistics = [percentile(values, 50), percentile(values, 95)]
+		rows.append(tuple([name] + [formatValue(value, unit) for value in statistics]))
+	return (title, rows)
+
+def failureReasons(records):
+	'''Returns (count, reason) of the reasons jobs in records did not complete, most frequent first.'''
+	counts = {}
+	for record in records:
+		if record['outcome'] != 'done':
+			reason = record.get('reason', record['outcome'])
+			counts[reason] = counts.get(reason, 0) + 1
+	return sorted(((count, reason) for reason, count in counts.items()), reverse=True)
+
+
+if __name__ == '__main__':
+
+	path = sys.argv[1] if len(sys.argv) > 1 else TELEMETRY_FILE
+	count = int(sys.argv[2]) if len(sys.argv) > 2 else TELEMETRY_WINDOW
+	records = loadRecords(count, path)
+	title, rows = summaryRows(records)
+	print title
+	print '%-12s %8s %8s' % ('', 'median', 'p95')
+	for name, median, p95 in rows:
+		print '%-12s %8s %8s' % (name, median, p95)
+	for reasonCount, reason in failureReasons(records):
+		print '%dx %s' % (reasonCount, reason)
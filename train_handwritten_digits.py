@@ -8,6 +8,7 @@ from the TRAINING_IMAGE_FILE image (MNIST samples, from the OpenCV 2.4.12 Python
 import numpy as np
 import cv2, os
 from opencv_functions import prepKNN
+import trainingdata
 
 SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)) # needed because ev3's brickman messes with relative paths - see https://github.com/ev3dev/ev3dev/issues/263
 
@@ -32,3 +33,8 @@ labels = np.repeat(np.arange(10), len(samples)//10)
 np.save(SAMPLES_FILE, samples)
 np.save(LABELS_FILE, labels)
 print 'Data for handwritten_digits saved.'
+
+# precompute features
+print 'Computing features...'
+trainingdata.saveFeatures('handwritten_digits', CELL_SIZE)
+print 'Features for handwritten_digits saved.'
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+'''
+This module loads training datasets and their precomputed KNN features.
+Features (deskew + preprocessing, see prepKNN) are computed offline in parallel chunks and saved next to the raw samples
+as features_[METHOD][CELL_SIZE].npy, with a .json metadata file recording what they were computed from.
+Precomputed features are only used if the metadata still matches the dataset's current samples and labels,
+otherwise the features are recomputed at load time.
+getKNN also saves a classifier snapshot (features and labels in a single snapshot_[METHOD][CELL_SIZE].npz file),
+which is validated with cheap file size and modification time checks, so that the classifier loads quickly at startup.
+Classifiers with quantized features (see quantizedknn.py) have their own snapshots, which store the quantized features.
+'''
+
+import numpy as np
+import cv2, os, sys, json, hashlib, multiprocessing
+from opencv_functions import prepKNN
+import quantizedknn
+
+SCRIPT_DIRECTORY = os.path.dirname(os.path.realpath(__file__)) # needed because ev3's brickman messes with relative paths - see https://github.com/ev3dev/ev3dev/issues/263
+
+DATASETS = ('sudoku_digits', 'handwritten_digits', 'sudoku_digits_augmented', 'handwritten_digits_augmented')
+FEATURES_VERSION = 2 # increment when prepKNN output changes, to invalidate previously saved features
+FEATURES_CHUNK_SIZE = 250 # number of samples processed per worker task
+
+_knnCache = {}
+
+def datasetFile(dataset, filename):
+	'''Returns the path of a file in the specified dataset directory.'''
+	assert dataset in DATASETS # safety check - dataset parameter will be used in file paths
+	return SCRIPT_DIRECTORY + '/data/' + dataset + '/' + filename
+
+def featuresFiles(dataset, cellSize, preprocessMethod='hog'):
+	'''Returns (featuresFile, metadataFile) paths for the specified dataset and preprocessing settings.'''
+	name = 'features_' + preprocessMethod + str(cellSize)
+	return (datasetFile(dataset, name + '.npy'), datasetFile(dataset, name + '.json'))
+
+def fileDigest(path):
+	'''Returns the SHA-1 hex digest of a file's contents.'''
+	digest = hashlib.sha1()
+	with open(path, 'rb') as f:
+		for block in iter(lambda: f.read(65536), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+def _prepChunk(args):
+	'''Worker task for computeFeatures.'''
+	samples, cellSize, preprocessMethod = args
+	return np.float32(prepKNN(samples, cellSize, preprocessMethod))
+
+def computeFeatures(samples, cellSize, preprocessMethod='hog', processes=None):
+	'''
+	Applies prepKNN to samples, split into chunks of FEATURES_CHUNK_SIZE samples which are processed in parallel.
+	If processes is None, one worker process is used per CPU core.
+	Returns a numpy float32 array of features, in the same order as samples.
+	'''
+	samples = np.float32(samples).reshape(-1, cellSize, cellSize)
+	chunks = [(samples[i:i+FEATURES_CHUNK_SIZE], cellSize, preprocessMethod) for i in range(0, len(samples), FEATURES_CHUNK_SIZE)]
+	if processes is None:
+		processes = multiprocessing.cpu_count()
+	if (processes <= 1) or (len(chunks) <= 1):
+		results = map(_prepChunk, chunks)
+	else:
+		pool = multiprocessing.Pool(min(processes, len(chunks)))
+		try:
+			results = pool.map(_prepChunk, chunks)
+		finally:
+			pool.close()
+			pool.join()
+	return np.concatenate(results)
+
+def featuresMetadata(dataset, cellSize, preprocessMethod='hog'):
+	'''Returns the metadata which identifies the current samples and labels of a dataset for the specified settings.'''
+	return {
+		'version': FEATURES_VERSION,
+		'dataset': dataset,
+		'cellSize': cellSize,
+		'preprocessMethod': preprocessMethod,
+		'samplesDigest': fileDigest(datasetFile(dataset, 'samples.npy')),
+		'labelsDigest': fileDigest(datasetFile(dataset, 'labels.npy'))
+	}
+
+def saveFeatures(dataset, cellSize, preprocessMethod='hog', processes=None):
+	'''Computes features for a dataset in parallel and saves them with their metadata. Returns the features.'''
+	assert (preprocessMethod=='simple') or (preprocessMethod=='hog')
+	featuresFile, metadataFile = featuresFiles(dataset, cellSize, preprocessMethod)
+	metadata = featuresMetadata(dataset, cellSize, preprocessMethod)
+	features = computeFeatures(np.load(datasetFile(dataset, 'samples.npy')), cellSize, preprocessMethod, processes)
+	metadata['count'] = len(features)
+	np.save(featuresFile, features)
+	with open(metadataFile, 'w') as f:
+		json.dump(metadata, f, indent=1, sort_keys=True)
+	return features
+
+def loadFeatures(dataset, cellSize, preprocessMethod='hog'):
+	'''Returns the precomputed features of a dataset, or None if they are missing or no longer valid.'''
+	featuresFile, metadataFile = featuresFiles(dataset, cellSize, preprocessMethod)
+	if not (os.path.isfile(featuresFile) and os.path.isfile(metadataFile)):
+		return None
+	try:
+		with open(metadataFile) as f:
+			metadata = json.load(f)
+	except ValueError:
+		return None
+	count = metadata.pop('count', None)
+	if metadata != featuresMetadata(dataset, cellSize, preprocessMethod):
+		return None
+	features = np.load(featuresFile)
+	if len(features) != count:
+		return None
+	return features
+
+def datasetLabels(dataset):
+	'''Returns the sorted list of the distinct labels (digits) of a dataset.'''
+	return np.unique(np.load(datasetFile(dataset, 'labels.npy')).astype(int)).tolist()
+
+def snapshotFile(dataset, cellSize, preprocessMethod='hog', quantization=None):
+	'''Returns the path of the classifier snapshot of a dataset for the specified settings.'''
+	suffix = '_' + quantization if quantization is not None else ''
+	return datasetFile(dataset, 'snapshot_' + preprocessMethod + str(cellSize) + suffix + '.npz')
+
+def datasetStamp(dataset):
+	'''
+	Returns the sizes and modification times of a dataset's samples and labels files, used to validate snapshots.
+	Snapshots are checked at every startup of sudokuscanner.py, so they are validated by this cheap stamp rather than
+	by checksums like precomputed features (see featuresMetadata), which are copied with the dataset (e.g. to the EV3,
+	changing the modification times) and only checked when a snapshot has to be created.
+	'''
+	stamp = [FEATURES_VERSION]
+	for filename in ('samples.npy', 'labels.npy'):
+		info = os.stat(datasetFile(dataset, filename))
+		stamp += [info.st_size, info.st_mtime]
+	return np.float64(stamp)
+
+def saveSnapshot(dataset, cellSize, samples, labels, preprocessMethod='hog', quantization=None):
+	'''
+	Saves the preprocessed samples and labels of a dataset in a single file, ready for trainKNN.
+	If quantization is not None, the samples are saved quantized, with their offsets and scales (see quantizedknn.quantize).
+	'''
+	path = snapshotFile(dataset, cellSize, preprocessMethod, quantization)
+	if quantization is None:
+		np.savez(path, samples=np.float32(samples).reshape(len(samples), -1), labels=labels, stamp=datasetStamp(dataset))
+	else:
+		values, offsets, scales = quantizedknn.quantize(samples, quantization)
+		np.savez(path, samples=values, offsets=offsets, scales=scales, labels=labels, stamp=datasetStamp(dataset))
+
+def loadSnapshot(dataset, cellSize, preprocessMethod='hog', quantization=None):
+	'''
+	Returns (samples, labels) from the classifier snapshot of a dataset, or None if it is missing or older than the dataset.
+	For a quantized snapshot, returns (samples, offsets, scales, labels), the arguments of quantizedknn.QuantizedKNN.
+	'''
+	path = snapshotFile(dataset, cellSize, preprocessMethod, quantization)
+	if not os.path.isfile(path):
+		return None
+	snapshot = np.load(path)
+	try:
+		if not np.array_equal(snapshot['stamp'], datasetStamp(dataset)):
+			return None
+		if quantization is None:
+			return (snapshot['samples'], snapshot['labels'])
+		return (snapshot['samples'], snapshot['offsets'], snapshot['scales'], snapshot['labels'])
+	finally:
+		snapshot.close()
+
+def loadTrainingSet(dataset, cellSize, preprocessMethod='hog'):
+	'''
+	Returns (samples, labels) of a dataset, ready for KNN training.
+	Precomputed features are used if they are valid, otherwise prepKNN is applied to the raw samples.
+	'''
+	samples = loadFeatures(dataset, cellSize, preprocessMethod)
+	if samples is None:
+		samples = prepKNN(np.load(datasetFile(dataset, 'samples.npy')), cellSize, preprocessMethod)
+	labels = np.load(datasetFile(dataset, 'labels.npy')).astype(int)
+	return (samples, labels)
+
+def trainKNN(samples, labels, quantization=None):
+	'''
+	Returns a KNN classifier trained on the specified (preprocessed) samples and labels.
+	If quantization is not None (uint8 or float16), the classifier stores quantized features (see quantizedknn.py).
+	'''
+	if quantization is not None:
+		return quantizedknn.QuantizedKNN.train(samples, labels, quantization)
+	knn = cv2.KNearest()
+	knn.train(np.float32(samples).reshape(len(samples), -1), labels)
+	return knn
+
+def getKNN(dataset, cellSize, preprocessMethod='hog', quantization=None):
+	'''
+	Returns a KNN classifier trained on a dataset. Trained classifiers are kept for the lifetime of the process.
+	The classifier snapshot is used if it is valid, otherwise it is (re)created from the training set.
+	If quantization is not None, the classifier stores quantized features (see trainKNN).
+	'''
+	key = (dataset, cellSize, preprocessMethod, quantization)
+	if key not in _knnCache:
+		snapshot = loadSnapshot(dataset, cellSize, preprocessMethod, quantization)
+		if snapshot is None:
+			trainingSet = loadTrainingSet(dataset, cellSize, preprocessMethod)
+			try:
+				saveSnapshot(dataset, cellSize, trainingSet[0], trainingSet[1], preprocessMethod, quantization)
+			except (IOError, OSError):
+				pass # the snapshot is only an optimization, e.g. the data directory may be read-only
+			_knnCache[key] = trainKNN(trainingSet[0], trainingSet[1], quantization)
+		elif quantization is None:
+			_knnCache[key] = trainKNN(*snapshot)
+		else:
+			_knnCache[key] = quantizedknn.QuantizedKNN(*snapshot)
+	return _knnCache[key]
+
+
+if __name__ == '__main__':
+
+	CELL_SIZE = 20
+
+	datasets = sys.argv[1:] if len(sys.argv) > 1 else DATASETS
+	for dataset in datasets:
+		if not os.path.isfile(datasetFile(dataset, 'samples.npy')):
+			print 'Skipping ' + dataset + ': samples not found, run its trainer program first.'
+			continue
+		print 'Computing features for ' + dataset + '...'
+		features = saveFeatures(dataset, CELL_SIZE)
+		print str(len(features)) + ' feature vectors saved to ' + featuresFiles(dataset, CELL_SIZE)[0]
+		saveSnapshot(dataset, CELL_SIZE, features, np.load(datasetFile(dataset, 'labels.npy')).astype(int))
+		print 'Classifier snapshot saved to ' + snapshotFile(dataset, CELL_SIZE)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+'''
+This module waits for hardware conditions without keeping the CPU busy.
+Conditions are checked every POLL_INTERVAL seconds, sleeping in between (see hardware.sleep).
+On the EV3, motor state changes are waited for with poll() on the motor's sysfs state attribute, which wakes up
+as soon as the state changes, with polling as a fallback.
+waitSettled detects the end of a motion from encoder readings, instead of sleeping for a fixed time.
+Every wait accepts a timeout (in seconds, None to wait forever) and returns True if the condition was met,
+or False if the timeout expired.
+Python 2 has no async/await, so waitAsync runs a wait in a background thread instead and returns a Wait object,
+so that other work (e.g. recognition and solving) can run while the hardware is moving. An exception raised in the
+background thread is raised again by Wait.join, so that it is not lost with the thread.
+'''
+
+import os, sys, select, threading
+import hardware
+
+POLL_INTERVAL = 0.01 # seconds between condition checks
+MAX_POLL_WAIT = 0.1 # seconds, maximum time to wait for a sysfs notification before reading the attribute again
+
+def waitUntil(condition, timeout=None, interval=POLL_INTERVAL):
+	'''Waits until condition() returns True, checking it every interval seconds.'''
+	start = hardware.clock()
+	while not condition():
+		if (timeout is not None) and (hardware.clock() - start >= timeout):
+			return False
+		hardware.sleep(interval)
+	return True
+
+def _stateAttributeFile(motor):
+	'''Returns the path of the sysfs state attribute of an EV3 motor, or None if it is not available.'''
+	path = getattr(motor, '_path', None)
+	if (hardware.BACKEND != 'ev3') or (path is None):
+		return None
+	stateFile = os.path.join(path, 'state')
+	if not os.path.exists(stateFile):
+		return None
+	return stateFile
+
+def waitMotorState(motor, condition, timeout=None, interval=POLL_INTERVAL):
+	'''
+	Waits until condition(state) returns True, where state is the list of state flags of the motor (e.g. ['running']).
+	Uses poll() on the motor's sysfs state attribute when available, otherwise checks motor.state every interval seconds.
+	'''
+	stateFile = _stateAttributeFile(motor)
+	if stateFile is None:
+		return waitUntil(lambda: condition(motor.state), timeout, interval)
+
+	start = hardware.clock()
+	with open(stateFile) as f:
+		poller = select.poll()
+		poller.register(f.fileno(), select.POLLPRI)
+		while True:
+			f.seek(0)
+			if condition(f.read().split()):
+				return True
+			wait = MAX_POLL_WAIT
+			if timeout is not None:
+				remaining = timeout - (hardware.clock() - start)
+				if remaining <= 0:
+					return False
+				wait = min(wait, remaining)
+			poller.poll(int(wait*1000))
+
+def waitSettled(motors, tolerance=1, window=0.05, timeout=None, interval=POLL_INTERVAL):
+	'''
+	Waits until the encoder positions of all motors have stayed within tolerance degrees for window seconds.
+	Returns False if the motors have not settled after timeout seconds (None to wait forever), True otherwise.
+	'''
+	start = hardware.clock()
+	reference = [motor.position for motor in motors]
+	referenceTime = start
+	while True:
+		hardware.sleep(interval)
+		now = hardware.clock()
+		positions = [motor.position for motor in motors]
+		if any(abs(position - previous) > tolerance for position, previous in zip(positions, reference)):
+			reference = positions
+			referenceTime = now
+		elif now - referenceTime >= window:
+			return True
+		if (timeout is not None) and (now - start >= timeout):
+			return False
+
+class Wait(object):
+	'''A wait running in a background thread, see waitAsync.'''
+
+	def __init__(self, function, args, kwargs):
+		self.result = None
+		self.error = None # sys.exc_info() of the exception raised by the wait function, None if it did not raise
+		self._thread = threading.Thread(target=self._run, args=(function, args, kwargs))
+		self._thread.daemon = True
+		self._thread.start()
+
+	def _run(self, function, args, kwargs):
+		try:
+			self.result = function(*args, **kwargs)
+		except Exception:
+			self.error = sys.exc_info()
+
+	def done(self):
+		'''Returns True if the wait has finished.'''
+		return not self._thread.is_alive()
+
+	def join(self, timeout=None):
+		'''
+		Waits until the wait has finished, or until timeout expires. Returns the result of the wait (None if not finished).
+		If the wait function raised an exception, it is raised again (by every call).
+		'''
+		self._thread.join(timeout)
+		if self.error is not None:
+			raise self.error[0], self.error[1], self.error[2]
+		return self.result
+
+def waitAsync(function, *args, **kwargs):
+	'''
+	Starts a wait function (e.g. plotter.waitMotor) with the specified arguments in a background thread.
+	Returns a Wait object, whose join method returns the result of the wait (or raises its exception).
+	'''
+	return Wait(function, args, kwargs)